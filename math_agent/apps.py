@@ -4,3 +4,6 @@ from django.apps import AppConfig
 class MathAgentConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "math_agent"
+
+    def ready(self):
+        from . import signals  # noqa: F401
@@ -0,0 +1,44 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from math_agent.models import Problem
+
+
+class Command(BaseCommand):
+    help = "Convert JSON problem_embedding lists into compact float32 embedding_vector bytes"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=500,
+                            help='Number of problems converted per transaction')
+        parser.add_argument('--keep-json', action='store_true',
+                            help='Leave the legacy JSON embedding in place after conversion')
+
+    def handle(self, *args, **options):
+        chunk_size = options['chunk_size']
+        keep_json = options['keep_json']
+
+        pending = Problem.objects.filter(embedding_vector__isnull=True, problem_embedding__isnull=False)
+        total = pending.count()
+        self.stdout.write(f"Converting {total} embeddings in chunks of {chunk_size}")
+
+        converted = 0
+        last_id = 0
+        while True:
+            chunk = list(
+                pending.filter(id__gt=last_id).order_by('id').only('id', 'problem_embedding')[:chunk_size]
+            )
+            if not chunk:
+                break
+
+            for problem in chunk:
+                problem.embedding_vector = Problem.encode_embedding(problem.problem_embedding)
+                if not keep_json:
+                    problem.problem_embedding = None
+
+            with transaction.atomic():
+                Problem.objects.bulk_update(chunk, ['embedding_vector', 'problem_embedding'])
+
+            converted += len(chunk)
+            last_id = chunk[-1].id
+            self.stdout.write(f"  {converted}/{total} converted (last id {last_id})")
+
+        self.stdout.write(self.style.SUCCESS(f"Backfilled {converted} embeddings"))
@@ -0,0 +1,37 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from math_agent.models import Problem
+from math_agent.utils.fingerprints import problem_fingerprint
+
+
+class Command(BaseCommand):
+    help = "Compute the exact-duplicate fingerprint of problems stored without one"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=2000,
+                            help='Number of problems updated per transaction')
+
+    def handle(self, *args, **options):
+        chunk_size = options['chunk_size']
+        pending = Problem.objects.filter(fingerprint='')
+        total = pending.count()
+        self.stdout.write(f"Fingerprinting {total} problems in chunks of {chunk_size}")
+
+        done = 0
+        last_id = 0
+        while True:
+            chunk = list(pending.filter(id__gt=last_id).order_by('id').only('id', 'subject', 'topic', 'question')[:chunk_size])
+            if not chunk:
+                break
+
+            for problem in chunk:
+                problem.fingerprint = problem_fingerprint(problem.question, problem.subject, problem.topic)
+
+            with transaction.atomic():
+                Problem.objects.bulk_update(chunk, ['fingerprint'])
+
+            done += len(chunk)
+            last_id = chunk[-1].id
+            self.stdout.write(f"  {done}/{total} fingerprinted (last id {last_id})")
+
+        self.stdout.write(self.style.SUCCESS(f"Fingerprinted {done} problems"))
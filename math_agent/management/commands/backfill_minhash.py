@@ -0,0 +1,68 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from math_agent.models import Problem, ProblemSimilarity
+from math_agent.utils.minhash import decode_signature, encode_signature, estimated_jaccard, minhash_signature
+
+
+class Command(BaseCommand):
+    help = "Compute MinHash signatures for unsigned problems and Jaccard estimates for their similarity edges"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=2000,
+                            help='Number of problems or edges updated per transaction')
+
+    def handle(self, *args, **options):
+        chunk_size = options['chunk_size']
+        signed = self.sign_problems(chunk_size)
+        estimated = self.estimate_edges(chunk_size)
+        self.stdout.write(self.style.SUCCESS(f"Signed {signed} problems and estimated {estimated} edges"))
+
+    def sign_problems(self, chunk_size):
+        pending = Problem.objects.filter(minhash_signature__isnull=True)
+        total = pending.count()
+        self.stdout.write(f"Signing {total} problems in chunks of {chunk_size}")
+
+        signed = 0
+        last_id = 0
+        while True:
+            chunk = list(pending.filter(id__gt=last_id).order_by('id').only('id', 'question')[:chunk_size])
+            if not chunk:
+                break
+
+            for problem in chunk:
+                problem.minhash_signature = encode_signature(minhash_signature(problem.question))
+
+            with transaction.atomic():
+                Problem.objects.bulk_update(chunk, ['minhash_signature'])
+
+            signed += len(chunk)
+            last_id = chunk[-1].id
+            self.stdout.write(f"  {signed}/{total} signed (last id {last_id})")
+        return signed
+
+    def estimate_edges(self, chunk_size):
+        """Fill edge estimates, loading only the signatures of each chunk's endpoints."""
+        pending = ProblemSimilarity.objects.filter(jaccard__isnull=True)
+        total = pending.count()
+        self.stdout.write(f"Estimating {total} similarity edges in chunks of {chunk_size}")
+
+        estimated = 0
+        last_id = 0
+        while True:
+            chunk = list(pending.filter(id__gt=last_id).order_by('id').only('id', 'src_id', 'dst_id')[:chunk_size])
+            if not chunk:
+                break
+
+            ids = {edge.src_id for edge in chunk} | {edge.dst_id for edge in chunk}
+            signatures = dict(Problem.objects.filter(id__in=ids).values_list('id', 'minhash_signature'))
+            for edge in chunk:
+                edge.jaccard = estimated_jaccard(decode_signature(signatures.get(edge.src_id)),
+                                                 decode_signature(signatures.get(edge.dst_id)))
+
+            with transaction.atomic():
+                ProblemSimilarity.objects.bulk_update(chunk, ['jaccard'])
+
+            estimated += len(chunk)
+            last_id = chunk[-1].id
+            self.stdout.write(f"  {estimated}/{total} estimated (last id {last_id})")
+        return estimated
@@ -0,0 +1,197 @@
+import io
+import json
+import random
+import time
+from contextlib import redirect_stdout, nullcontext
+from django.core.management.base import BaseCommand
+from django.test.utils import override_settings
+from math_agent.models import Batch, BatchCounter
+from math_agent.utils.batch_runner import generate_problems_traditional
+from math_agent.utils.benchmarking import scratch_database, QueryCounter, StageRecorder
+from math_agent.utils.call_llm_clients import add_llm_observer, remove_llm_observer, llm_context
+from math_agent.utils.mock_provider import mock_llm
+from math_agent.utils.smart_generator import SmartGenerationController
+
+STAGES = ['generator', 'hinter', 'checker', 'target', 'judge']
+REPORT_ORDER = ['generator', 'embed', 'hinter', 'checker', 'target', 'judge']
+TAXONOMY = {
+    "Algebra": ["Polynomials", "Inequalities", "Functional equations"],
+    "Number Theory": ["Divisibility", "Modular arithmetic", "Diophantine equations"],
+    "Combinatorics": ["Counting", "Graph theory", "Pigeonhole principle"],
+    "Analysis": ["Sequences", "Series", "Integrals"]
+}
+
+
+class Command(BaseCommand):
+    help = "Benchmark the generation pipeline offline against the mock LLM provider in a scratch database"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--valid', type=int, default=20,
+                            help='Valid problems each run must produce')
+        parser.add_argument('--mode', choices=['traditional', 'smart', 'both'], default='both',
+                            help='Generation method to benchmark')
+        parser.add_argument('--concurrency', type=int, default=None,
+                            help='Attempts in flight for smart mode (default: GENERATION_CONCURRENCY)')
+        parser.add_argument('--planning', action='store_true',
+                            help='Size smart-mode waves from the running yield instead of a fixed concurrency')
+        parser.add_argument('--overprovision', type=float, default=None,
+                            help='Attempts per expected valid problem in planning mode (default: GENERATION_OVERPROVISION)')
+        parser.add_argument('--max-attempts-per-valid', type=int, default=None,
+                            help='Attempt budget per needed valid problem (default: GENERATION_MAX_ATTEMPTS_PER_VALID)')
+        parser.add_argument('--problems-per-call', type=int, default=1,
+                            help='Problems requested per generator call')
+        parser.add_argument('--malformed-rate', type=float, default=0.0,
+                            help='Share of items in multi-problem responses the mock leaves malformed')
+        parser.add_argument('--stream', action='store_true',
+                            help='Stream generator and target responses, stopping once their fields are complete')
+        parser.add_argument('--max-completion-tokens', type=int, default=None,
+                            help='Token budget of streamed responses')
+        parser.add_argument('--max-seconds', type=float, default=None,
+                            help='Time budget of streamed responses')
+        parser.add_argument('--latency', type=float, default=0.2,
+                            help='Median mock chat latency (time to first token) in seconds')
+        parser.add_argument('--token-latency', type=float, default=0.0,
+                            help='Mock seconds per response token after the first')
+        parser.add_argument('--runaway-rate', type=float, default=0.0,
+                            help='Share of mock responses that keep writing after their JSON fields')
+        parser.add_argument('--runaway-tokens', type=int, default=2000,
+                            help='Extra tokens written by a runaway mock response')
+        parser.add_argument('--latency-sigma', type=float, default=0.5,
+                            help='Lognormal spread of mock latencies (0 for fixed latency)')
+        parser.add_argument('--embedding-latency', type=float, default=0.05,
+                            help='Median mock embedding latency in seconds')
+        parser.add_argument('--rate-limit-rate', type=float, default=0.0,
+                            help='Share of mock requests rejected with a 429')
+        parser.add_argument('--retry-after', type=float, default=None,
+                            help='Retry-After seconds sent with injected 429s')
+        parser.add_argument('--error-rate', type=float, default=0.0,
+                            help='Share of mock requests failing with a transient error')
+        parser.add_argument('--duplicate-rate', type=float, default=0.05,
+                            help='Share of generated problems repeating an earlier one')
+        parser.add_argument('--pass-rate', type=float, default=0.8,
+                            help='Share of problems the mock checker accepts')
+        parser.add_argument('--solve-rate', type=float, default=0.5,
+                            help='Share of problems the mock target solves')
+        parser.add_argument('--seed', type=int, default=None,
+                            help='Random seed for reproducible runs')
+        parser.add_argument('--json', action='store_true',
+                            help='Print one JSON object per run instead of a table')
+        parser.add_argument('--verbose', action='store_true',
+                            help="Show the pipeline's own output")
+
+    def handle(self, *args, **options):
+        if options['seed'] is not None:
+            random.seed(options['seed'])
+
+        mock = {
+            'latency': options['latency'],
+            'latency_sigma': options['latency_sigma'],
+            'token_latency': options['token_latency'],
+            'runaway_rate': options['runaway_rate'],
+            'runaway_tokens': options['runaway_tokens'],
+            'rate_limit_rate': options['rate_limit_rate'],
+            'retry_after': options['retry_after'],
+            'error_rate': options['error_rate'],
+            'duplicate_rate': options['duplicate_rate'],
+            'malformed_rate': options['malformed_rate'],
+            'pass_rate': options['pass_rate'],
+            'solve_rate': options['solve_rate'],
+            'embedding_latency': options['embedding_latency']
+        }
+        pipeline = {stage: {"provider": "mock", "model": f"mock-{stage}", "mock": mock} for stage in STAGES}
+        pipeline['generator']['problems_per_call'] = options['problems_per_call']
+        if options['stream']:
+            for stage in ('generator', 'target'):
+                pipeline[stage]['stream'] = True
+                if options['max_completion_tokens']:
+                    pipeline[stage]['max_completion_tokens'] = options['max_completion_tokens']
+                if options['max_seconds']:
+                    pipeline[stage]['max_seconds'] = options['max_seconds']
+        modes = ['traditional', 'smart'] if options['mode'] == 'both' else [options['mode']]
+
+        with override_settings(EMBEDDING_PROVIDER='mock', EMBEDDING_MODEL='mock-embedding', LLM_MOCK=mock):
+            with scratch_database():
+                for mode in modes:
+                    result = self.run_mode(mode, pipeline, options)
+                    if options['json']:
+                        self.stdout.write(json.dumps(result))
+                    else:
+                        self.report(result)
+
+    def run_mode(self, mode, pipeline, options):
+        mock_llm.reset()
+        number_of_valid_needed = options['valid']
+        batch = Batch.objects.create(
+            name=f"Benchmark_{mode}_{time.strftime('%Y%m%d_%H%M%S')}",
+            taxonomy_json=TAXONOMY,
+            pipeline=pipeline,
+            number_of_valid_needed=number_of_valid_needed
+        )
+
+        recorder = StageRecorder()
+        add_llm_observer(recorder)
+        output = nullcontext() if options['verbose'] else redirect_stdout(io.StringIO())
+        try:
+            with QueryCounter() as queries, output, llm_context(batch_id=batch.id):
+                started = time.perf_counter()
+                if mode == 'traditional':
+                    valid_count, attempt_count = generate_problems_traditional(
+                        number_of_valid_needed, pipeline, TAXONOMY, batch,
+                        max_attempts_per_valid=options['max_attempts_per_valid']
+                    )
+                    concurrency = 1
+                    outcomes = None
+                else:
+                    controller = SmartGenerationController(
+                        concurrency=options['concurrency'], planning=options['planning'],
+                        overprovision=options['overprovision'],
+                        max_attempts_per_valid=options['max_attempts_per_valid']
+                    )
+                    valid_count, attempt_count = controller.generate_problems_intelligently(
+                        number_of_valid_needed, pipeline, TAXONOMY, batch
+                    )
+                    concurrency = controller.peak_in_flight if controller.planning else controller.concurrency
+                    outcomes = dict(controller.outcomes)
+                elapsed = time.perf_counter() - started
+        finally:
+            remove_llm_observer(recorder)
+
+        batch.refresh_from_db()
+        stored = sum(batch.stats.values())
+        minutes = elapsed / 60
+        return {
+            'mode': mode if mode == 'traditional' or not options['planning'] else 'smart-planned',
+            'concurrency': concurrency,
+            'valid': valid_count,
+            'attempts': attempt_count,
+            'stored': stored,
+            'status_counts': batch.stats,
+            'outcomes': outcomes,
+            'seconds': round(elapsed, 3),
+            'valid_per_minute': round(valid_count / minutes, 2) if minutes else None,
+            'problems_per_minute': round(stored / minutes, 2) if minutes else None,
+            'queries': queries.count,
+            'queries_per_attempt': round(queries.count / max(1, attempt_count), 2),
+            'stages': recorder.summary(),
+            'stream': BatchCounter.grouped(batch.id, 'llm_stream')
+        }
+
+    def report(self, result):
+        self.stdout.write(self.style.SUCCESS(
+            f"{result['mode']} (concurrency {result['concurrency']}): {result['valid']} valid, "
+            f"{result['stored']} stored in {result['attempts']} attempts, {result['seconds']:.1f}s"
+        ))
+        self.stdout.write(
+            f"  {result['valid_per_minute']} valid/min, {result['problems_per_minute']} problems/min, "
+            f"{result['queries']} queries ({result['queries_per_attempt']}/attempt)"
+        )
+        for stage, outcomes in result['stream'].items():
+            self.stdout.write(f"  streamed {stage}: " + ", ".join(f"{count} {outcome}" for outcome, count in sorted(outcomes.items())))
+        self.stdout.write(f"  {'stage':<10} {'calls':>6} {'errors':>6} {'p50 ms':>9} {'p95 ms':>9} {'prompt tok':>11}")
+        stages = result['stages']
+        for stage in sorted(stages, key=lambda s: REPORT_ORDER.index(s) if s in REPORT_ORDER else len(REPORT_ORDER)):
+            row = stages[stage]
+            self.stdout.write(
+                f"  {stage:<10} {row['calls']:>6} {row['errors']:>6} {row['p50_ms']:>9.1f} {row['p95_ms']:>9.1f}"
+                f" {row['prompt_tokens']:>11}"
+            )
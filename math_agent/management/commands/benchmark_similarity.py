@@ -0,0 +1,246 @@
+import json
+import random
+import time
+import numpy as np
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Min, Max
+from django.test.utils import override_settings
+from math_agent.models import Batch, Problem
+from math_agent.utils.benchmarking import (
+    scratch_database, database_bytes, peak_rss_bytes, percentile, reset_dedupe_indexes
+)
+from math_agent.utils.duplicate_detection import EnhancedSimilarityChecker
+from math_agent.utils.fingerprints import FingerprintFilter, problem_fingerprint
+from math_agent.utils.minhash import MinHashLSHIndex, encode_signature, minhash_signature
+from math_agent.utils.similarity_utils import find_similar_problems, SIMILARITY_THRESHOLD
+from math_agent.utils.vector_index import VectorIndex, get_vector_index
+
+SUBJECTS = {
+    "Algebra": ["Polynomials", "Inequalities", "Functional equations"],
+    "Number Theory": ["Divisibility", "Modular arithmetic", "Diophantine equations"],
+    "Combinatorics": ["Counting", "Graph theory", "Pigeonhole principle"],
+    "Analysis": ["Sequences", "Series", "Integrals"]
+}
+WORDS = (
+    "prime lattice sequence integral polynomial matrix graph vertex chord circle triangle permutation "
+    "divisor modulus series limit function root coefficient tangent region coloring partition bound"
+).split()
+
+
+def build_vector_index(dimension):
+    """Exact in-memory search over the normalized embedding matrix."""
+    index = VectorIndex()
+    index.load()
+    return index, index.nbytes, lambda query: index.search(query['embedding'], threshold=SIMILARITY_THRESHOLD)
+
+
+def build_minhash_lsh(dimension):
+    """Banded MinHash LSH over question shingles; a search includes signing the query question."""
+    index = MinHashLSHIndex()
+    index.load()
+    return index, index.nbytes, lambda query: index.query(
+        minhash_signature(query['question']), query['subject'], query['topic']
+    )
+
+
+def build_fingerprint_bloom(dimension):
+    """Scalable Bloom filter over exact-duplicate fingerprints; a hit still costs one indexed query in the pipeline."""
+    fingerprint_filter = FingerprintFilter()
+    fingerprint_filter.load()
+    return fingerprint_filter, fingerprint_filter.nbytes, lambda query: fingerprint_filter.might_contain(
+        problem_fingerprint(query['question'], query['subject'], query['topic'])
+    )
+
+
+# Similarity backends to measure: name -> build(dimension) returning (index, memory_bytes, search(query)).
+# A query is a dict with the question, subject, topic and embedding of a candidate problem.
+SIMILARITY_BACKENDS = {
+    'vector_index': build_vector_index,
+    'minhash_lsh': build_minhash_lsh,
+    'fingerprint_bloom': build_fingerprint_bloom
+}
+
+
+class Command(BaseCommand):
+    help = ("Benchmark similarity search on synthetic problems in a scratch database and print one JSON "
+            "object per measurement")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', type=int, nargs='+', default=[10000, 100000, 1000000],
+                            help='Corpus sizes to measure, filled cumulatively (1M rows at 1536 dims needs ~6 GB RAM)')
+        parser.add_argument('--dimension', type=int, default=1536,
+                            help='Embedding dimension (text-embedding-3-small uses 1536)')
+        parser.add_argument('--queries', type=int, default=200,
+                            help='Queries timed per backend and size')
+        parser.add_argument('--backends', nargs='+', default=list(SIMILARITY_BACKENDS),
+                            choices=list(SIMILARITY_BACKENDS), help='Search backends to measure')
+        parser.add_argument('--chunk-size', type=int, default=2000,
+                            help='Rows inserted per bulk_create')
+        parser.add_argument('--seed', type=int, default=0,
+                            help='Random seed for the synthetic corpus and queries')
+        parser.add_argument('--output', default=None,
+                            help='Append results to this JSON-lines file as well as printing them')
+
+    def handle(self, *args, **options):
+        self.rng = np.random.default_rng(options['seed'])
+        random.seed(options['seed'])
+        self.dimension = options['dimension']
+        self.run_id = time.strftime('%Y%m%dT%H%M%S')
+        self.output = open(options['output'], 'a') if options['output'] else None
+
+        mock = {'embedding_latency': 0, 'embedding_dimension': self.dimension, 'rate_limit_rate': 0, 'error_rate': 0}
+        try:
+            with override_settings(EMBEDDING_PROVIDER='mock', EMBEDDING_MODEL='mock-embedding', LLM_MOCK=mock):
+                with scratch_database():
+                    self.run(sorted(options['sizes']), options)
+        finally:
+            if self.output:
+                self.output.close()
+
+    def emit(self, **result):
+        line = json.dumps({'benchmark': 'similarity', 'run_id': self.run_id, 'dimension': self.dimension, **result})
+        self.stdout.write(line)
+        if self.output:
+            self.output.write(line + "\n")
+            self.output.flush()
+
+    def run(self, sizes, options):
+        batch = Batch.objects.create(
+            name=f"Benchmark_similarity_{self.run_id}", taxonomy_json=SUBJECTS, pipeline={},
+            number_of_valid_needed=1
+        )
+        empty_bytes = database_bytes()
+        rows = 0
+        for size in sizes:
+            started = time.perf_counter()
+            self.fill(batch, size - rows, options['chunk_size'])
+            fill_seconds = time.perf_counter() - started
+            rows = max(rows, size)
+
+            db_bytes = database_bytes()
+            self.emit(
+                measurement='storage', size=rows, fill_seconds=round(fill_seconds, 3), db_bytes=db_bytes,
+                db_bytes_per_row=round((db_bytes - empty_bytes) / rows, 1) if db_bytes is not None else None
+            )
+
+            queries = self.make_queries(options['queries'])
+            for backend in options['backends']:
+                self.measure_backend(backend, rows, queries)
+            self.measure_pipeline(rows, options['queries'])
+
+    def fill(self, batch, count, chunk_size):
+        """Insert `count` synthetic problems with random unit embeddings."""
+        subjects = list(SUBJECTS)
+        while count > 0:
+            n = min(chunk_size, count)
+            vectors = self.rng.standard_normal((n, self.dimension), dtype=np.float32)
+            vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+            problems = []
+            for vector in vectors:
+                subject = random.choice(subjects)
+                topic = random.choice(SUBJECTS[subject])
+                question = self.question_text()
+                problems.append(Problem(
+                    subject=subject,
+                    topic=topic,
+                    question=question,
+                    answer=str(random.randint(1, 10**6)),
+                    hints={"0": "Consider small cases."},
+                    status=random.choice(['valid', 'solved', 'discarded']),
+                    batch=batch,
+                    embedding_vector=Problem.encode_embedding(vector),
+                    fingerprint=problem_fingerprint(question, subject, topic),
+                    minhash_signature=encode_signature(minhash_signature(question))
+                ))
+            with transaction.atomic():
+                Problem.objects.bulk_create(problems)
+            count -= n
+
+    @staticmethod
+    def question_text(words=None):
+        words = " ".join(words or random.choices(WORDS, k=40))
+        return f"Determine the {words} for n = {random.randint(2, 10**6)}."
+
+    def make_queries(self, count):
+        """
+        A third repeats of stored problems with a new number (exact duplicates after
+        normalization), a third rewordings of stored problems (one word swapped) and
+        a third new problems, so each backend's hit rate shows which kinds it catches.
+        """
+        bounds = Problem.objects.aggregate(low=Min('id'), high=Max('id'))
+        sample = random.sample(range(bounds['low'], bounds['high'] + 1), 2 * (count // 3))
+        stored = Problem.objects.filter(id__in=sample).values_list('question', 'subject', 'topic', 'embedding_vector')
+        queries = []
+        for index, (question, subject, topic, embedding_vector) in enumerate(stored):
+            words = question[len("Determine the "):question.rindex(" for n = ")].split()
+            if index % 2:
+                words[random.randrange(len(words))] = random.choice(WORDS)
+            vector = Problem.decode_embedding(embedding_vector)
+            noise = self.rng.standard_normal(self.dimension).astype(np.float32) * (0.2 / np.sqrt(self.dimension))
+            queries.append({'question': self.question_text(words), 'subject': subject, 'topic': topic,
+                            'embedding': vector + noise})
+        subjects = list(SUBJECTS)
+        while len(queries) < count:
+            subject = random.choice(subjects)
+            queries.append({'question': self.question_text(), 'subject': subject,
+                            'topic': random.choice(SUBJECTS[subject]),
+                            'embedding': self.rng.standard_normal(self.dimension).astype(np.float32)})
+        return queries
+
+    def measure_backend(self, backend, rows, queries):
+        started = time.perf_counter()
+        index, memory_bytes, search = SIMILARITY_BACKENDS[backend](self.dimension)
+        build_seconds = time.perf_counter() - started
+
+        timings, matches = [], 0
+        for query in queries:
+            started = time.perf_counter()
+            result = search(query)
+            timings.append(time.perf_counter() - started)
+            matches += bool(result)
+
+        self.emit(
+            measurement='search', backend=backend, size=rows, build_seconds=round(build_seconds, 3),
+            memory_bytes=memory_bytes, peak_rss_bytes=peak_rss_bytes(), **self.latency(timings),
+            hit_rate=round(matches / max(1, len(queries)), 3)
+        )
+        del index
+
+    def measure_pipeline(self, rows, count):
+        """Time find_similar_problems (embedding + index search) and enhanced_similarity_check per query."""
+        # The corpus was filled with bulk_create, so reload every process-wide index
+        reset_dedupe_indexes()
+        started = time.perf_counter()
+        get_vector_index()
+        load_seconds = time.perf_counter() - started
+
+        checker = EnhancedSimilarityChecker()
+        subjects = list(SUBJECTS)
+        find_timings, check_timings = [], []
+        for _ in range(count):
+            question = self.question_text()
+            subject = random.choice(subjects)
+            topic = random.choice(SUBJECTS[subject])
+
+            started = time.perf_counter()
+            similar_problems, embedding = find_similar_problems(question)
+            find_timings.append(time.perf_counter() - started)
+
+            started = time.perf_counter()
+            checker.enhanced_similarity_check(question, subject, topic, embedding, similar_problems)
+            check_timings.append(time.perf_counter() - started)
+
+        self.emit(measurement='find_similar_problems', size=rows, build_seconds=round(load_seconds, 3),
+                  peak_rss_bytes=peak_rss_bytes(), **self.latency(find_timings))
+        self.emit(measurement='enhanced_similarity_check', size=rows, **self.latency(check_timings))
+        reset_dedupe_indexes()
+
+    @staticmethod
+    def latency(timings):
+        return {
+            'queries': len(timings),
+            'p50_ms': round(percentile(timings, 50) * 1000, 3),
+            'p95_ms': round(percentile(timings, 95) * 1000, 3),
+            'mean_ms': round(float(np.mean(timings)) * 1000, 3)
+        }
@@ -0,0 +1,80 @@
+import os
+from django.core.management.base import BaseCommand, CommandError
+from math_agent.utils.export import (
+    EXPORT_COMPRESSIONS, EXPORT_FORMATS, export_file_type, export_filename, export_resume_point, export_root,
+    parse_export_filters, problem_export_queryset, write_export
+)
+
+
+class Command(BaseCommand):
+    help = "Export problems as NDJSON (optionally gzip/zstd compressed) or Parquet with constant memory"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--output', default=None,
+                            help='Output file (default: a timestamped file in EXPORT_ROOT, served at /exports/<name>)')
+        parser.add_argument('--format', choices=EXPORT_FORMATS, default=None,
+                            help='Output format (default: from the --output suffix, else ndjson)')
+        parser.add_argument('--compression', choices=[c for c in EXPORT_COMPRESSIONS if c], default=None,
+                            help='Compress NDJSON output (default: from the --output suffix, .gz or .zst)')
+        parser.add_argument('--batch', default=None, help='Only problems of this batch id')
+        parser.add_argument('--status', default=None, help='Only problems with this status')
+        parser.add_argument('--subject', default=None, help='Only problems in this subject')
+        parser.add_argument('--created-after', default=None, help='Only problems created at or after this ISO date/datetime')
+        parser.add_argument('--created-before', default=None, help='Only problems created before this ISO date/datetime')
+        parser.add_argument('--after-id', default=None, help='Only problems with a greater id')
+        parser.add_argument('--embeddings', action='store_true', help='Include each problem embedding')
+        parser.add_argument('--chunk-size', type=int, default=None,
+                            help='Rows fetched and written per chunk (default: EXPORT_CHUNK_SIZE)')
+        parser.add_argument('--resume', action='store_true',
+                            help='Continue an interrupted NDJSON export in --output after its last complete row')
+
+    def handle(self, *args, **options):
+        path = options['output']
+        try:
+            if path is None:
+                format = options['format'] or 'ndjson'
+                compression = options['compression'] or ''
+                if format == 'parquet' and compression:
+                    raise ValueError("Parquet output is compressed internally; drop --compression")
+            else:
+                # The suffix decides, so import_problems reads the file back the way it was written
+                format, compression = export_file_type(path, options['format'], options['compression'])
+        except ValueError as e:
+            raise CommandError(str(e))
+        if format == 'parquet' and options['resume']:
+            raise CommandError("Parquet output cannot be resumed; drop --resume")
+
+        try:
+            filters = parse_export_filters(options)
+        except ValueError as e:
+            raise CommandError(str(e))
+
+        if path is None:
+            if options['resume']:
+                raise CommandError("--resume needs the --output file to continue")
+            os.makedirs(export_root(), exist_ok=True)
+            path = os.path.join(export_root(), export_filename(format, compression))
+
+        append = False
+        if options['resume'] and os.path.exists(path):
+            offset, last_id = export_resume_point(path, compression)
+            with open(path, 'r+b') as f:
+                f.truncate(offset)
+            if last_id is not None:
+                filters['after_id'] = max(filters.get('after_id', 0), last_id)
+            append = True
+            self.stdout.write(f"Resuming {path} at byte {offset} after problem {last_id}")
+
+        queryset = problem_export_queryset(**filters)
+        self.stdout.write(f"Exporting problems to {path} ({format}{', ' + compression if compression else ''})")
+
+        def report(written):
+            self.stdout.write(f"  {written / 1e6:.1f} MB written", ending='\r')
+
+        written = write_export(
+            path, queryset, format=format, compression=compression, chunk_size=options['chunk_size'],
+            embeddings=options['embeddings'], append=append, progress_callback=report
+        )
+        self.stdout.write(self.style.SUCCESS(f"Wrote {written} bytes to {path}"))
+        if os.path.dirname(os.path.abspath(path)) == os.path.abspath(export_root()):
+            self.stdout.write(f"Download it with range/resume support at /exports/{os.path.basename(path)}")
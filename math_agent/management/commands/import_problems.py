@@ -0,0 +1,76 @@
+import json
+import os
+from django.core.management.base import BaseCommand, CommandError
+from math_agent.models import Problem
+from math_agent.utils.importer import IMPORT_FORMATS, import_batch, import_file_type, import_problems
+from math_agent.utils.similarity_utils import SIMILARITY_THRESHOLD
+
+
+class Command(BaseCommand):
+    help = "Bulk-import a curated problem corpus (NDJSON or CSV) so generated problems never duplicate it"
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='NDJSON (.ndjson/.jsonl, optionally .gz/.zst, e.g. an export) or CSV file')
+        parser.add_argument('--format', choices=IMPORT_FORMATS, default=None,
+                            help='File format (default: from the extension)')
+        parser.add_argument('--batch', type=int, default=None,
+                            help='Add the problems to this batch (default: an import batch for the file, reused on rerun)')
+        parser.add_argument('--status', choices=[status for status, _ in Problem.STATUS_CHOICES], default='valid',
+                            help='Status of rows that do not carry one')
+        parser.add_argument('--chunk-size', type=int, default=None,
+                            help='Rows embedded and inserted per transaction (default: IMPORT_CHUNK_SIZE)')
+        parser.add_argument('--skip-embeddings', action='store_true',
+                            help='Do not fetch embeddings for rows without an "embedding" (lexical dedupe only)')
+        parser.add_argument('--skip-links', action='store_true',
+                            help='Do not record similarity edges to the existing corpus')
+        parser.add_argument('--threshold', type=float, default=SIMILARITY_THRESHOLD,
+                            help='Cosine similarity of recorded similarity edges')
+        parser.add_argument('--json', action='store_true', help='Print the final stats as JSON')
+
+    def handle(self, *args, **options):
+        path = options['path']
+        if not os.path.isfile(path):
+            raise CommandError(f"{path} does not exist")
+        try:
+            import_file_type(path, options['format'])
+            batch = import_batch(path, options['batch'])
+        except Exception as e:
+            raise CommandError(str(e))
+
+        self.stdout.write(f"Importing {path} into batch {batch.id} ({batch.name}); rerun the same command to resume")
+
+        def report(stats):
+            self.stdout.write(
+                f"  {stats.rows} rows read, {stats.imported} imported, {stats.duplicates} duplicates, "
+                f"{stats.invalid} invalid ({stats.rows_per_second:.0f} rows/s)", ending='\r'
+            )
+
+        try:
+            stats = import_problems(
+                path, batch=batch, format=options['format'], chunk_size=options['chunk_size'],
+                default_status=options['status'], embed=not options['skip_embeddings'],
+                link_similar=not options['skip_links'], threshold=options['threshold'], progress_callback=report
+            )
+        except OSError as e:
+            raise CommandError(str(e))
+        self.stdout.write('')
+
+        for line, message in stats.errors:
+            self.stdout.write(self.style.WARNING(f"  line {line}: {message}"))
+        if stats.invalid > len(stats.errors):
+            self.stdout.write(self.style.WARNING(f"  ... and {stats.invalid - len(stats.errors)} more invalid rows"))
+
+        summary = stats.summary()
+        if options['json']:
+            self.stdout.write(json.dumps({'batch': batch.id, **summary}))
+            return
+        phases = ', '.join(f"{name} {seconds:.2f}s" for name, seconds in summary['phase_seconds'].items() if seconds)
+        self.stdout.write(
+            f"Embeddings: {stats.embedded} fetched, {stats.file_embeddings} from the file"
+            + ('' if options['skip_links'] else f"; {stats.edges} similarity edges")
+        )
+        self.stdout.write(f"Time: {summary['seconds']:.2f}s ({phases})")
+        self.stdout.write(self.style.SUCCESS(
+            f"Imported {stats.imported} of {stats.rows} rows into batch {batch.id} "
+            f"({stats.duplicates} duplicates skipped, {stats.invalid} invalid) at {summary['rows_per_second']:.0f} rows/s"
+        ))
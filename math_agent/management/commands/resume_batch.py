@@ -0,0 +1,43 @@
+from django.core.management.base import BaseCommand, CommandError
+from math_agent.models import Batch
+from math_agent.utils.batch_runner import claim_job, resume_batch, run_job, worker_name
+
+
+class Command(BaseCommand):
+    help = "Resume an interrupted batch from its generation checkpoint"
+
+    def add_arguments(self, parser):
+        parser.add_argument('batch_id', type=int, help='Batch to resume')
+        parser.add_argument('--force', action='store_true',
+                            help='Requeue the job even if it still looks like it is running')
+        parser.add_argument('--now', action='store_true',
+                            help='Run the batch in this process instead of leaving it to run_generation_worker')
+
+    def handle(self, *args, **options):
+        batch = Batch.objects.filter(id=options['batch_id']).first()
+        if batch is None:
+            raise CommandError(f"Batch {options['batch_id']} does not exist")
+
+        try:
+            job = resume_batch(batch, force=options['force'])
+        except Exception as e:
+            raise CommandError(str(e))
+
+        checkpoint = getattr(batch, 'checkpoint', None)
+        start = f"attempt {checkpoint.attempt_count}" if checkpoint else "the beginning"
+        if not options['now']:
+            self.stdout.write(self.style.SUCCESS(
+                f"Queued job {job.id} to resume batch {batch.id} from {start}; run_generation_worker will pick it up"
+            ))
+            return
+
+        job = claim_job(job.id, worker_name())
+        if job is None:
+            raise CommandError(f"Job for batch {batch.id} was claimed by another worker")
+        self.stdout.write(f"Resuming batch {batch.id} ({batch.name}) from {start}")
+        run_job(job)
+        job.refresh_from_db()
+        style = self.style.SUCCESS if job.status == 'completed' else self.style.ERROR
+        self.stdout.write(style(
+            f"Job {job.id} {job.status}: {job.valid_count} valid problems in {job.attempt_count} attempts"
+        ))
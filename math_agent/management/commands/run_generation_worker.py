@@ -0,0 +1,45 @@
+import time
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+from django.db.models import Max
+from math_agent.models import Problem
+from math_agent.utils.batch_runner import claim_next_job, run_job, worker_name
+from math_agent.utils.fingerprints import get_fingerprint_filter
+from math_agent.utils.importer import seed_imported_problems
+
+
+class Command(BaseCommand):
+    help = "Run a local worker that claims queued generation jobs and generates their batches"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--poll-interval', type=float, default=5.0,
+                            help='Seconds to wait between polls when the queue is empty')
+        parser.add_argument('--once', action='store_true',
+                            help='Process every queued job and exit instead of polling forever')
+
+    def handle(self, *args, **options):
+        worker = worker_name()
+        seeded_up_to = Problem.objects.aggregate(last=Max('id'))['last'] or 0
+        fingerprints = get_fingerprint_filter()
+        self.stdout.write(f"Generation worker {worker} started ({len(fingerprints)} problem fingerprints loaded)")
+
+        while True:
+            close_old_connections()
+            job = claim_next_job(worker)
+            if job is None:
+                if options['once']:
+                    break
+                time.sleep(options['poll_interval'])
+                continue
+
+            self.stdout.write(f"Claimed job {job.id} for batch {job.batch_id} ({job.batch.name})")
+            # Problems bulk-imported by import_problems since the last job bypassed this process's indexes
+            seeded_up_to = seed_imported_problems(seeded_up_to)
+            run_job(job)
+            job.refresh_from_db()
+            style = self.style.SUCCESS if job.status == 'completed' else self.style.ERROR
+            self.stdout.write(style(
+                f"Job {job.id} {job.status}: {job.valid_count} valid problems in {job.attempt_count} attempts"
+            ))
+
+        self.stdout.write("Generation worker stopped")
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-18 17:14
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("math_agent", "0003_remove_batch_discarded_count_and_more"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="problem",
+            name="embedding_vector",
+            field=models.BinaryField(blank=True, null=True),
+        ),
+    ]
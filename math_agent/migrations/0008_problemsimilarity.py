@@ -0,0 +1,79 @@
+# Generated by Django 5.2.18 on 2026-10-18 17:21
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def copy_similar_problems(apps, schema_editor):
+    """Turn the JSON similar_problems backlinks into similarity edges."""
+    Problem = apps.get_model("math_agent", "Problem")
+    ProblemSimilarity = apps.get_model("math_agent", "ProblemSimilarity")
+    existing_ids = set(Problem.objects.values_list("id", flat=True))
+
+    edges = []
+    rows = Problem.objects.exclude(similar_problems={}).values_list("id", "similar_problems")
+    for problem_id, similar_problems in rows.iterator(chunk_size=2000):
+        for sim_id, score in (similar_problems or {}).items():
+            sim_id = int(sim_id)
+            if sim_id == problem_id or sim_id not in existing_ids:
+                continue
+            edges.append(ProblemSimilarity(src_id=problem_id, dst_id=sim_id, score=score))
+            edges.append(ProblemSimilarity(src_id=sim_id, dst_id=problem_id, score=score))
+        if len(edges) >= 5000:
+            ProblemSimilarity.objects.bulk_create(edges, ignore_conflicts=True)
+            edges = []
+    ProblemSimilarity.objects.bulk_create(edges, ignore_conflicts=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("math_agent", "0007_cachedembedding"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="ProblemSimilarity",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("score", models.FloatField()),
+                (
+                    "dst",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="+",
+                        to="math_agent.problem",
+                    ),
+                ),
+                (
+                    "src",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="similarities",
+                        to="math_agent.problem",
+                    ),
+                ),
+            ],
+            options={
+                "indexes": [
+                    models.Index(
+                        fields=["src", "-score"], name="problem_similarity_src_score"
+                    )
+                ],
+                "constraints": [
+                    models.UniqueConstraint(
+                        fields=("src", "dst"), name="unique_problem_similarity"
+                    )
+                ],
+            },
+        ),
+        migrations.RunPython(copy_similar_problems, migrations.RunPython.noop),
+    ]
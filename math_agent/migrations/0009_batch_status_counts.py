@@ -0,0 +1,52 @@
+# Generated by Django 5.2.18 on 2026-10-18 17:23
+
+from django.db import migrations, models
+
+
+def count_problems(apps, schema_editor):
+    """Fill the new counters from the problems table with one grouped query."""
+    Batch = apps.get_model("math_agent", "Batch")
+    batches = Batch.objects.annotate(
+        n_discarded=models.Count(
+            "problems__id", filter=models.Q(problems__status="discarded")
+        ),
+        n_solved=models.Count(
+            "problems__id", filter=models.Q(problems__status="solved")
+        ),
+        n_valid=models.Count("problems__id", filter=models.Q(problems__status="valid")),
+    )
+    updated = []
+    for batch in batches.iterator(chunk_size=2000):
+        batch.discarded_count = batch.n_discarded
+        batch.solved_count = batch.n_solved
+        batch.valid_count = batch.n_valid
+        updated.append(batch)
+    Batch.objects.bulk_update(
+        updated, ["discarded_count", "solved_count", "valid_count"], batch_size=1000
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("math_agent", "0008_problemsimilarity"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="batch",
+            name="discarded_count",
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name="batch",
+            name="solved_count",
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name="batch",
+            name="valid_count",
+            field=models.IntegerField(default=0),
+        ),
+        migrations.RunPython(count_problems, migrations.RunPython.noop),
+    ]
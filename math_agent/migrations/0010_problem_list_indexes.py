@@ -0,0 +1,36 @@
+# Generated by Django 5.2.18 on 2026-10-18 17:24
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("math_agent", "0009_batch_status_counts"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="problem",
+            index=models.Index(
+                fields=["batch", "status", "created_at", "id"],
+                name="problem_batch_status_created",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="problem",
+            index=models.Index(
+                fields=["batch", "created_at", "id"], name="problem_batch_created"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="problem",
+            index=models.Index(
+                fields=["status", "created_at", "id"], name="problem_status_created"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="problem",
+            index=models.Index(fields=["created_at", "id"], name="problem_created"),
+        ),
+    ]
@@ -0,0 +1,89 @@
+# Generated by Django 5.2.18 on 2026-10-18 17:29
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("math_agent", "0010_problem_list_indexes"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="StageTrace",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("attempt", models.IntegerField()),
+                (
+                    "stage",
+                    models.CharField(
+                        choices=[
+                            ("generator", "Generate"),
+                            ("embed", "Embed"),
+                            ("similarity", "Similarity"),
+                            ("hinter", "Hints"),
+                            ("checker", "Checker"),
+                            ("target", "Target"),
+                            ("judge", "Judge"),
+                            ("db_write", "DB write"),
+                        ],
+                        max_length=20,
+                    ),
+                ),
+                ("elapsed_ms", models.FloatField()),
+                ("provider", models.CharField(blank=True, default="", max_length=50)),
+                ("model", models.CharField(blank=True, default="", max_length=100)),
+                ("prompt_tokens", models.IntegerField(blank=True, null=True)),
+                ("completion_tokens", models.IntegerField(blank=True, null=True)),
+                ("retries", models.IntegerField(default=0)),
+                (
+                    "outcome",
+                    models.CharField(
+                        choices=[
+                            ("ok", "OK"),
+                            ("cached", "Cached"),
+                            ("error", "Error"),
+                        ],
+                        default="ok",
+                        max_length=20,
+                    ),
+                ),
+                ("created_at", models.DateTimeField(auto_now_add=True)),
+                (
+                    "batch",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="stage_traces",
+                        to="math_agent.batch",
+                    ),
+                ),
+                (
+                    "problem",
+                    models.ForeignKey(
+                        blank=True,
+                        null=True,
+                        on_delete=django.db.models.deletion.SET_NULL,
+                        related_name="stage_traces",
+                        to="math_agent.problem",
+                    ),
+                ),
+            ],
+            options={
+                "indexes": [
+                    models.Index(
+                        fields=["batch", "stage"], name="stage_trace_batch_stage"
+                    )
+                ],
+            },
+        ),
+    ]
@@ -0,0 +1,25 @@
+# Generated by Django 5.2.18 on 2026-10-18 17:34
+
+from django.db import migrations, models
+
+# Existing problems and edges are filled by `python manage.py backfill_minhash`,
+# which uses the current hashing code and bounded memory.
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("math_agent", "0011_stagetrace"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="problem",
+            name="minhash_signature",
+            field=models.BinaryField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name="problemsimilarity",
+            name="jaccard",
+            field=models.FloatField(blank=True, null=True),
+        ),
+    ]
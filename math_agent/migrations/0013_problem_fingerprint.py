@@ -0,0 +1,26 @@
+# Generated by Django 5.2.18 on 2026-10-18 17:37
+
+from django.db import migrations, models
+
+# Existing problems are fingerprinted by `python manage.py backfill_fingerprints`,
+# which uses the current normalization code and bounded memory.
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("math_agent", "0012_problem_minhash_signature"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="problem",
+            name="fingerprint",
+            field=models.CharField(
+                blank=True, default="", editable=False, max_length=32
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="problem",
+            index=models.Index(fields=["fingerprint"], name="problem_fingerprint"),
+        ),
+    ]
@@ -0,0 +1,71 @@
+# Generated by Django 5.2.18 on 2026-10-18 17:45
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("math_agent", "0013_problem_fingerprint"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="BatchEvent",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "kind",
+                    models.CharField(
+                        choices=[
+                            ("started", "Started"),
+                            ("attempt", "Attempt"),
+                            ("completed", "Completed"),
+                            ("failed", "Failed"),
+                        ],
+                        max_length=20,
+                    ),
+                ),
+                ("attempt", models.IntegerField(blank=True, null=True)),
+                ("stage", models.CharField(blank=True, default="", max_length=20)),
+                ("status", models.CharField(blank=True, default="", max_length=20)),
+                ("reason", models.TextField(blank=True, default="")),
+                ("valid_count", models.IntegerField(default=0)),
+                ("solved_count", models.IntegerField(default=0)),
+                ("discarded_count", models.IntegerField(default=0)),
+                ("created_at", models.DateTimeField(auto_now_add=True)),
+                (
+                    "batch",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="events",
+                        to="math_agent.batch",
+                    ),
+                ),
+                (
+                    "problem",
+                    models.ForeignKey(
+                        blank=True,
+                        null=True,
+                        on_delete=django.db.models.deletion.SET_NULL,
+                        related_name="+",
+                        to="math_agent.problem",
+                    ),
+                ),
+            ],
+            options={
+                "indexes": [
+                    models.Index(fields=["batch", "id"], name="batch_event_batch_id")
+                ],
+            },
+        ),
+    ]
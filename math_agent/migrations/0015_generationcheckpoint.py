@@ -0,0 +1,45 @@
+# Generated by Django 5.2.18 on 2026-10-18 17:48
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("math_agent", "0014_batchevent"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="GenerationCheckpoint",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("method", models.CharField(default="traditional", max_length=20)),
+                ("attempt_count", models.IntegerField(default=0)),
+                ("completed_count", models.IntegerField(default=0)),
+                ("consecutive_failures", models.IntegerField(default=0)),
+                ("variation_intensity", models.FloatField(default=1.0)),
+                ("outcomes", models.JSONField(default=dict)),
+                ("generation_stats", models.JSONField(default=dict)),
+                ("resume_count", models.IntegerField(default=0)),
+                ("updated_at", models.DateTimeField(auto_now=True)),
+                (
+                    "batch",
+                    models.OneToOneField(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="checkpoint",
+                        to="math_agent.batch",
+                    ),
+                ),
+            ],
+        ),
+    ]
@@ -1,5 +1,6 @@
-from django.db import models
+from django.db import models, transaction, IntegrityError
 from django.core.validators import MinValueValidator
+import numpy as np
 
 # Create your models here.
 
@@ -8,12 +9,70 @@ class Batch(models.Model):
     taxonomy_json = models.JSONField()
     pipeline = models.JSONField()  # Dictionary of dictionaries for generator, hinter, checker, target, judge
     number_of_valid_needed = models.IntegerField(validators=[MinValueValidator(1)])
+    # Denormalized problem counts, bumped in the same transaction that stores each problem
+    discarded_count = models.IntegerField(default=0)
+    solved_count = models.IntegerField(default=0)
+    valid_count = models.IntegerField(default=0)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    STATUS_COUNT_FIELDS = {
+        'discarded': 'discarded_count',
+        'solved': 'solved_count',
+        'valid': 'valid_count'
+    }
+
     def __str__(self):
         return f"{self.name} - Created: {self.created_at}"
 
+    @property
+    def stats(self):
+        """Problem counts per status, read from the denormalized counters."""
+        return {status: getattr(self, field) for status, field in self.STATUS_COUNT_FIELDS.items()}
+
+    @staticmethod
+    def status_counts(prefix=''):
+        """
+        Conditional Count expressions giving the problem count of every status.
+
+        Args:
+            prefix (str): Lookup path to the problems, e.g. 'problems__' when annotating batches
+
+        Returns:
+            dict: {status: Count(...)} usable in a single aggregate() or annotate() call
+        """
+        return {
+            status: models.Count(f'{prefix}id', filter=models.Q(**{f'{prefix}status': status}))
+            for status in Batch.STATUS_COUNT_FIELDS
+        }
+
+    @classmethod
+    def record_problem(cls, batch_id, status):
+        """Atomically bump the counter for a newly stored problem's status."""
+        field = cls.STATUS_COUNT_FIELDS[status]
+        cls.objects.filter(pk=batch_id).update(**{field: models.F(field) + 1})
+
+    @classmethod
+    def record_problems(cls, batch_id, counts):
+        """Bump several status counters at once, e.g. after a bulk insert ({status: number})."""
+        updates = {cls.STATUS_COUNT_FIELDS[status]: models.F(cls.STATUS_COUNT_FIELDS[status]) + number
+                   for status, number in counts.items() if number}
+        if updates:
+            cls.objects.filter(pk=batch_id).update(**updates)
+
+    @property
+    def is_import(self):
+        """True for batches filled by the import_problems command rather than the generation pipeline."""
+        return isinstance(self.pipeline, dict) and self.pipeline.get('source') == 'import'
+
+    def recount_problems(self):
+        """Recompute the denormalized counters from the problems table in one query."""
+        counts = self.problems.aggregate(**self.status_counts())
+        for status, field in self.STATUS_COUNT_FIELDS.items():
+            setattr(self, field, counts[status])
+        self.save(update_fields=list(self.STATUS_COUNT_FIELDS.values()))
+        return counts
+
     class Meta:
         verbose_name_plural = "Batches"
 
@@ -34,12 +93,250 @@ class Problem(models.Model):
     batch = models.ForeignKey(Batch, on_delete=models.CASCADE, related_name='problems')
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
-    problem_embedding = models.JSONField(null=True, blank=True)
+    problem_embedding = models.JSONField(null=True, blank=True)  # Legacy list-of-floats storage
+    embedding_vector = models.BinaryField(null=True, blank=True, editable=False)  # Little-endian float32 bytes
     similar_problems = models.JSONField(default=dict, blank=True)
+    fingerprint = models.CharField(max_length=32, blank=True, default='', editable=False)  # MD5 of subject, topic and normalized question
+    minhash_signature = models.BinaryField(null=True, blank=True, editable=False)  # Little-endian uint32 MinHash slots
+
+    EMBEDDING_DTYPE = np.dtype('<f4')
 
     def __str__(self):
         return f"{self.subject} - {self.topic} - {self.status}"
 
+    @classmethod
+    def encode_embedding(cls, embedding):
+        """Pack an embedding into the bytes stored in embedding_vector."""
+        return np.asarray(embedding, dtype=cls.EMBEDDING_DTYPE).tobytes()
+
+    @classmethod
+    def decode_embedding(cls, embedding_vector, problem_embedding=None):
+        """Read an embedding from either storage format (binary is a zero-copy view)."""
+        if embedding_vector is not None:
+            return np.frombuffer(embedding_vector, dtype=cls.EMBEDDING_DTYPE)
+        if problem_embedding is not None:
+            return np.asarray(problem_embedding, dtype=cls.EMBEDDING_DTYPE)
+        return None
+
+    @property
+    def embedding(self):
+        """The problem embedding as a float32 numpy array, whichever format the row uses."""
+        return self.decode_embedding(self.embedding_vector, self.problem_embedding)
+
+    @embedding.setter
+    def embedding(self, value):
+        self.embedding_vector = None if value is None else self.encode_embedding(value)
+        self.problem_embedding = None
+
     class Meta:
         verbose_name_plural = "Problems"
         ordering = ['-created_at']
+        # Back the (created_at, id) keyset pagination of the problem list views
+        indexes = [
+            models.Index(fields=['batch', 'status', 'created_at', 'id'], name='problem_batch_status_created'),
+            models.Index(fields=['batch', 'created_at', 'id'], name='problem_batch_created'),
+            models.Index(fields=['status', 'created_at', 'id'], name='problem_status_created'),
+            models.Index(fields=['created_at', 'id'], name='problem_created'),
+            models.Index(fields=['fingerprint'], name='problem_fingerprint')
+        ]
+
+class GenerationJob(models.Model):
+    STATUS_CHOICES = [
+        ('queued', 'Queued'),
+        ('running', 'Running'),
+        ('completed', 'Completed'),
+        ('failed', 'Failed')
+    ]
+
+    batch = models.OneToOneField(Batch, on_delete=models.CASCADE, related_name='job')
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='queued', db_index=True)
+    attempt_count = models.IntegerField(default=0)
+    valid_count = models.IntegerField(default=0)
+    worker = models.CharField(max_length=255, blank=True)
+    error = models.TextField(null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"Job for {self.batch.name} - {self.status}"
+
+    class Meta:
+        ordering = ['created_at']
+
+class BatchCounter(models.Model):
+    """Named per-batch counter (e.g. LLM cache hits) that can be bumped atomically from any worker."""
+    batch = models.ForeignKey(Batch, on_delete=models.CASCADE, related_name='counters')
+    name = models.CharField(max_length=100)
+    value = models.IntegerField(default=0)
+
+    def __str__(self):
+        return f"{self.batch_id} - {self.name}: {self.value}"
+
+    @classmethod
+    def increment(cls, batch_id, name, amount=1):
+        if cls.objects.filter(batch_id=batch_id, name=name).update(value=models.F('value') + amount):
+            return
+        try:
+            with transaction.atomic():
+                cls.objects.create(batch_id=batch_id, name=name, value=amount)
+        except IntegrityError:
+            # Another worker created the row first
+            cls.objects.filter(batch_id=batch_id, name=name).update(value=models.F('value') + amount)
+
+    @classmethod
+    def for_batch(cls, batch_id):
+        """All counters of a batch as a {name: value} dict."""
+        return dict(cls.objects.filter(batch_id=batch_id).values_list('name', 'value'))
+
+    @classmethod
+    def grouped(cls, batch_id, prefix):
+        """Counters named '<prefix>.<group>.<key>' as {group: {key: value}}."""
+        groups = {}
+        for name, value in cls.objects.filter(batch_id=batch_id, name__startswith=f"{prefix}.").values_list('name', 'value'):
+            group, _, key = name[len(prefix) + 1:].rpartition('.')
+            groups.setdefault(group, {})[key] = value
+        return groups
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['batch', 'name'], name='unique_batch_counter')
+        ]
+
+class CachedEmbedding(models.Model):
+    """Durable embedding cache keyed by embedding model and the hash of the normalized text."""
+    model = models.CharField(max_length=100)
+    text_hash = models.CharField(max_length=64)
+    vector = models.BinaryField()  # Little-endian float32 bytes, same encoding as Problem.embedding_vector
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"{self.model} - {self.text_hash}"
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['model', 'text_hash'], name='unique_cached_embedding')
+        ]
+
+class ProblemSimilarity(models.Model):
+    """Directed similarity edge between two problems; each pair is stored in both directions."""
+    src = models.ForeignKey(Problem, on_delete=models.CASCADE, related_name='similarities')
+    dst = models.ForeignKey(Problem, on_delete=models.CASCADE, related_name='+')
+    score = models.FloatField()
+    jaccard = models.FloatField(null=True, blank=True)  # MinHash estimate of question word-bigram overlap
+
+    def __str__(self):
+        return f"{self.src_id} -> {self.dst_id}: {self.score:.3f}"
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['src', 'dst'], name='unique_problem_similarity')
+        ]
+        indexes = [
+            models.Index(fields=['src', '-score'], name='problem_similarity_src_score')
+        ]
+
+class StageTrace(models.Model):
+    """Wall time, tokens and retries of one pipeline stage within one generation attempt."""
+    STAGE_CHOICES = [
+        ('generator', 'Generate'),
+        ('embed', 'Embed'),
+        ('similarity', 'Similarity'),
+        ('hinter', 'Hints'),
+        ('checker', 'Checker'),
+        ('target', 'Target'),
+        ('judge', 'Judge'),
+        ('db_write', 'DB write')
+    ]
+    OUTCOME_CHOICES = [
+        ('ok', 'OK'),
+        ('cached', 'Cached'),
+        ('error', 'Error')
+    ]
+
+    batch = models.ForeignKey(Batch, on_delete=models.CASCADE, related_name='stage_traces')
+    problem = models.ForeignKey(Problem, on_delete=models.SET_NULL, null=True, blank=True, related_name='stage_traces')
+    attempt = models.IntegerField()
+    stage = models.CharField(max_length=20, choices=STAGE_CHOICES)
+    elapsed_ms = models.FloatField()
+    provider = models.CharField(max_length=50, blank=True, default='')
+    model = models.CharField(max_length=100, blank=True, default='')
+    prompt_tokens = models.IntegerField(null=True, blank=True)
+    completion_tokens = models.IntegerField(null=True, blank=True)
+    retries = models.IntegerField(default=0)
+    outcome = models.CharField(max_length=20, choices=OUTCOME_CHOICES, default='ok')
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"{self.batch_id} #{self.attempt} {self.stage}: {self.elapsed_ms:.0f} ms ({self.outcome})"
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['batch', 'stage'], name='stage_trace_batch_stage')
+        ]
+
+class BatchEvent(models.Model):
+    """Append-only progress log of a batch: one row per finished attempt plus job start and end."""
+    KIND_CHOICES = [
+        ('started', 'Started'),
+        ('attempt', 'Attempt'),
+        ('completed', 'Completed'),
+        ('failed', 'Failed')
+    ]
+    TERMINAL_KINDS = ('completed', 'failed')
+
+    batch = models.ForeignKey(Batch, on_delete=models.CASCADE, related_name='events')
+    kind = models.CharField(max_length=20, choices=KIND_CHOICES)
+    attempt = models.IntegerField(null=True, blank=True)
+    stage = models.CharField(max_length=20, blank=True, default='')  # Last stage the attempt reached
+    status = models.CharField(max_length=20, blank=True, default='')  # duplicate, discarded, solved, valid, cancelled or error
+    reason = models.TextField(blank=True, default='')
+    problem = models.ForeignKey(Problem, on_delete=models.SET_NULL, null=True, blank=True, related_name='+')
+    # Batch counts right after the event, so readers never have to count problems
+    valid_count = models.IntegerField(default=0)
+    solved_count = models.IntegerField(default=0)
+    discarded_count = models.IntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"{self.batch_id} #{self.id} {self.kind} {self.status}"
+
+    def as_dict(self):
+        return {
+            'id': self.id,
+            'kind': self.kind,
+            'attempt': self.attempt,
+            'stage': self.stage,
+            'status': self.status,
+            'reason': self.reason,
+            'problem_id': self.problem_id,
+            'valid': self.valid_count,
+            'solved': self.solved_count,
+            'discarded': self.discarded_count,
+            'created_at': self.created_at.isoformat()
+        }
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['batch', 'id'], name='batch_event_batch_id')
+        ]
+
+class GenerationCheckpoint(models.Model):
+    """
+    Generation controller state of a batch, saved after every attempt so an
+    interrupted batch can resume without losing its attempt history.
+    """
+    batch = models.OneToOneField(Batch, on_delete=models.CASCADE, related_name='checkpoint')
+    method = models.CharField(max_length=20, default='traditional')  # traditional or smart
+    attempt_count = models.IntegerField(default=0)
+    completed_count = models.IntegerField(default=0)
+    consecutive_failures = models.IntegerField(default=0)
+    variation_intensity = models.FloatField(default=1.0)
+    outcomes = models.JSONField(default=dict)  # attempt status -> count
+    generation_stats = models.JSONField(default=dict)  # "subject|topic" -> attempts/successes/duplicates
+    resume_count = models.IntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"Checkpoint for {self.batch.name} at attempt {self.attempt_count}"
@@ -0,0 +1,44 @@
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+from .models import Problem
+from .utils.vector_index import peek_vector_index
+from .utils.fingerprints import peek_fingerprint_filter
+from .utils.minhash import decode_signature, peek_minhash_index
+
+
+@receiver(post_save, sender=Problem)
+def index_problem_embedding(sender, instance, created, **kwargs):
+    """Keep the in-memory vector index in step with newly stored embeddings."""
+    index = peek_vector_index()
+    if index is not None:
+        index.add(instance.id, instance.embedding)
+
+
+@receiver(post_save, sender=Problem)
+def index_problem_minhash(sender, instance, created, **kwargs):
+    """Keep the in-memory MinHash LSH index in step with stored signatures."""
+    index = peek_minhash_index()
+    if index is not None:
+        index.add(instance.id, instance.subject, instance.topic, decode_signature(instance.minhash_signature))
+
+
+@receiver(post_save, sender=Problem)
+def index_problem_fingerprint(sender, instance, created, **kwargs):
+    """Add stored fingerprints to the Bloom filter; deleted ones are left to the database check."""
+    fingerprint_filter = peek_fingerprint_filter()
+    if fingerprint_filter is not None:
+        fingerprint_filter.add(instance.fingerprint)
+
+
+@receiver(post_delete, sender=Problem)
+def unindex_problem_embedding(sender, instance, **kwargs):
+    index = peek_vector_index()
+    if index is not None:
+        index.remove(instance.id)
+
+
+@receiver(post_delete, sender=Problem)
+def unindex_problem_minhash(sender, instance, **kwargs):
+    index = peek_minhash_index()
+    if index is not None:
+        index.remove(instance.id)
@@ -1,3 +1,499 @@
-from django.test import TestCase
+import json
+import os
+import tempfile
+from datetime import timedelta
+from unittest import mock
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+from .models import Batch, BatchCounter, BatchEvent, CachedEmbedding, GenerationJob, Problem, ProblemSimilarity
+from .utils.batch_runner import claim_next_job, generate_problems_traditional
+from .utils.answer_equivalence import compare_answers, normalize_answer, parse_answer
+from .utils.call_llm_clients import (
+    acall_llm, add_llm_observer, call_llm, llm_context, remove_llm_observer, safe_json_parse
+)
+from .utils.fingerprints import FingerprintFilter, problem_fingerprint
+from .utils.importer import import_problems
+from .utils.judge import judge_solution
+from .utils.similarity_utils import afetch_embedding, fetch_embeddings
+from .utils.streaming import IncrementalJSONObject, StreamBudgetExceeded, StreamReader
+from .utils.system_messages import GENERATOR_MESSAGE
+from .utils.vector_index import reset_vector_index
 
-# Create your tests here.
+
+class CompareAnswersTests(SimpleTestCase):
+    """
+    compare_answers decides the judge stage without an LLM, and a certain
+    False stores the problem as "target failed", so every branch is pinned
+    down here: True (same value), False (certainly different) and None
+    (the judge LLM decides).
+    """
+
+    EQUAL = [
+        # Integers, rationals and decimals
+        ('1/2', '0.5'),
+        ('3.0', '3'),
+        ('\\frac{1}{2}', '0.5'),
+        ('$\\dfrac{1}{2}$', '0.5'),
+        ('2^{10}', '1024'),
+        ('3 \\cdot 4', '12'),
+        # Radicals
+        ('\\frac{\\sqrt2}{2}', '1/\\sqrt2'),
+        ('2\\sqrt{2}', '\\sqrt{8}'),
+        ('sqrt(12)', '2\\sqrt{3}'),
+        # Formatting that never changes the value
+        ('\\boxed{5}', '5'),
+        ('The answer is 7', '7'),
+        ('x=5.', '5'),
+        # Thousands separators
+        ('1,000', '1000'),
+        ('1,000,000', '10^6'),
+        ('1,234.5', '1234.5'),
+        # "x =" is stripped whichever variable is named
+        ('x = 3', '3'),
+        ('y=3', 'x=3'),
+        # Intervals
+        ('(-\\infty, 3)', '(-inf, 3)'),
+        ('[1/2, 1]', '[0.5, 1]'),
+        # Sets ignore order, lists with the same order are equal
+        ('{1, 2}', '{2, 1}'),
+        ('\\{1, 2\\}', '{2, 1}'),
+        ('{0.5, 1}', '{1/2, 1}'),
+        ('0.5, 1', '1/2, 1'),
+        ('1,2', '1, 2'),
+        ('(1, 2, 3)', '(1, 2, 3)'),
+    ]
+
+    DIFFERENT = [
+        ('3', '4'),
+        ('-3', '3'),
+        ('\\sqrt{2}', '\\sqrt{3}'),
+        # Rounding cannot explain a difference above one unit in the last decimal place
+        ('0.5', '2/3'),
+        ('0.68', '2/3'),
+        ('\\sqrt2', '2.5'),
+        # A thousands separator is a number, not the list (1, 0)
+        ('1,000', '1'),
+        ('x = 3', '4'),
+        # Intervals with different endpoints
+        ('[1, 2]', '[1, 3]'),
+        ('(-\\infty, 3)', '(-\\infty, 4)'),
+        # Sets and lists with different members
+        ('{1, 2}', '{1, 3}'),
+        ('{1, 2}', '{1, 2, 3}'),
+        ('1, 2', '1, 3'),
+    ]
+
+    UNDECIDED = [
+        # Decimals within rounding tolerance of the exact value
+        ('0.67', '2/3'),
+        ('0.6667', '2/3'),
+        ('0.7', '2/3'),
+        ('1.414', '\\sqrt2'),
+        ('1.5', '\\sqrt2'),
+        # Decimal comma vs list, and space-separated digits
+        ('1,5', '1.5'),
+        ('1 000', '1000'),
+        # Several equations are not stripped
+        ('a=1, b=2', '1, 2'),
+        # Same endpoints, different brackets
+        ('[1, 2]', '(1, 2)'),
+        ('[1, 2)', '(1, 2]'),
+        # Rounded endpoints or members
+        ('[0.33, 1]', '[1/3, 1]'),
+        ('{0.33, 1}', '{1/3, 1}'),
+        # A set vs a list, and a list in another order (solutions vs tuples)
+        ('{1, 2}', '1, 2'),
+        ('1, 2', '2, 1'),
+        ('(1, 2, 3)', '(3, 2, 1)'),
+        # Not numeric, or empty
+        ('abc', 'abd'),
+        ('x^2 + 1', 'x^2 + 2'),
+        ('', '1'),
+        ('1', None),
+    ]
+
+    def assert_verdict(self, cases, expected):
+        for candidate, reference in cases:
+            with self.subTest(candidate=candidate, reference=reference):
+                self.assertIs(compare_answers(candidate, reference), expected)
+                # The verdict must not depend on which side is the reference
+                self.assertIs(compare_answers(reference, candidate), expected)
+
+    def test_equal(self):
+        self.assert_verdict(self.EQUAL, True)
+
+    def test_different(self):
+        self.assert_verdict(self.DIFFERENT, False)
+
+    def test_undecided(self):
+        self.assert_verdict(self.UNDECIDED, None)
+
+    def test_normalize_answer(self):
+        cases = [
+            ('\\boxed{\\text{5}}', '5'),
+            ('\\( x = 3 \\)', '3'),
+            ('Final answer: 12.', '12'),
+            ('1,000,000', '1000000'),
+            ('1, 000', '1, 000'),
+            ('90^\\circ', '90'),
+        ]
+        for text, expected in cases:
+            with self.subTest(text=text):
+                self.assertEqual(normalize_answer(text), expected)
+
+    def test_parse_answer_kinds(self):
+        cases = [('1/2', 'number'), ('[1, 2)', 'interval'), ('{1, 2}', 'set'), ('1, 2', 'list'),
+                 ('(1, 2, 3)', 'list'), ('x + 1', None)]
+        for text, kind in cases:
+            with self.subTest(text=text):
+                parsed = parse_answer(normalize_answer(text))
+                self.assertEqual(parsed.kind if parsed else None, kind)
+
+
+class JudgeSolutionTests(TestCase):
+    def setUp(self):
+        self.batch = Batch.objects.create(name='judge', taxonomy_json={}, pipeline={}, number_of_valid_needed=1)
+        self.config = {'provider': 'mock', 'model': 'mock-judge'}
+
+    def judge(self, target_solution, true_answer):
+        with llm_context(batch_id=self.batch.id), mock.patch('math_agent.utils.judge.call_llm') as call_llm:
+            call_llm.return_value = {'valid': True, 'reason': 'equivalent'}
+            verdict = judge_solution(target_solution, true_answer, self.config)
+        return verdict, call_llm.called
+
+    def test_local_equal_skips_the_llm(self):
+        self.assertEqual(self.judge('1/2', '0.5'), (True, False))
+        self.assertEqual(BatchCounter.for_batch(self.batch.id), {'judge.local.equal': 1})
+
+    def test_local_different_skips_the_llm(self):
+        self.assertEqual(self.judge('3', '4'), (False, False))
+        self.assertEqual(BatchCounter.for_batch(self.batch.id), {'judge.local.different': 1})
+
+    def test_undecided_calls_the_llm(self):
+        self.assertEqual(self.judge('0.67', '2/3'), (True, True))
+        self.assertEqual(BatchCounter.for_batch(self.batch.id), {'judge.llm.called': 1})
+
+    def test_counters_accumulate(self):
+        for target_solution, true_answer in [('1/2', '0.5'), ('5', '5'), ('3', '4'), ('1,5', '1.5')]:
+            self.judge(target_solution, true_answer)
+        self.assertEqual(BatchCounter.grouped(self.batch.id, 'judge'),
+                         {'local': {'equal': 2, 'different': 1}, 'llm': {'called': 1}})
+
+
+class IncrementalJSONObjectTests(SimpleTestCase):
+    """
+    The incremental parser decides when a paid streamed response is cut off,
+    so every response is fed split at each character offset and must end up
+    with the same fields as parsing the whole text with safe_json_parse.
+    """
+
+    RESPONSES = {
+        'escaped quotes': '{"problem": "He said \\"stop\\" twice", "answer": "\\"4\\""}',
+        'braces in strings': '{"problem": "Find {x | x > 0} and }{ ][", "answer": "}", "hints": {"0": "{"}}',
+        'nested values': '{"hints": {"0": "a", "1": {"x": [1, {"y": [2, 3]}]}}, "answer": [1, [2, 3]], "problem": "p"}',
+        'bare literals': '{"a": 12, "b": -3.5e2, "c": true, "d": false, "e": null, "answer": 42}',
+        'literal before brace': '{"problem": "p", "answer": null}',
+        'number before brace': '{"problem": "p", "answer": 1024}',
+        'json fence': '```json\n{"problem": "p", "answer": "5", "hints": {"0": "h"}}\n```',
+        'latex': '{"problem": "Compute \\sqrt{2} \\cdot \\pi + \\alpha_{1}", "answer": "\\frac12 \\leq 3"}',
+        'whitespace': '  {\n  "problem" :  "p" ,\n  "answer":\t7 ,\n "hints" : [ ]\n}\n',
+        'empty': '{}',
+    }
+
+    def feed_split(self, text, offset):
+        parser = IncrementalJSONObject()
+        parser.feed(text[:offset])
+        parser.feed(text[offset:])
+        return parser
+
+    def test_every_split_matches_whole_parse(self):
+        for name, text in self.RESPONSES.items():
+            expected = safe_json_parse(text)
+            for offset in range(len(text) + 1):
+                with self.subTest(response=name, offset=offset):
+                    parser = self.feed_split(text, offset)
+                    self.assertTrue(parser.complete)
+                    self.assertFalse(parser.malformed)
+                    self.assertEqual(parser.fields, expected)
+
+    def test_prefixes_only_hold_finished_values(self):
+        for name, text in self.RESPONSES.items():
+            expected = safe_json_parse(text)
+            parser = IncrementalJSONObject()
+            for char in text:
+                with self.subTest(response=name, prefix=parser.text + char):
+                    fields = parser.feed(char)
+                    # A field appears only once its value is complete, and never changes afterwards
+                    for key, value in fields.items():
+                        self.assertEqual(value, expected[key])
+            self.assertEqual(parser.fields, expected)
+
+    def test_text_after_closing_brace_is_ignored(self):
+        parser = IncrementalJSONObject()
+        parser.feed('{"answer": 1} {"answer": 2}')
+        self.assertTrue(parser.complete)
+        self.assertEqual(parser.fields, {'answer': 1})
+
+
+class StreamReaderTests(SimpleTestCase):
+    CASES = [
+        # (response, required fields, offset just past the last required value, or None to read to the end)
+        ('{"answer": "4", "hints": {"0": "long hint"}}', ['answer'], '{"answer": "4"'),
+        ('{"problem": "x = \\"y\\"", "answer": "}", "hints": {}}', ['problem', 'answer'], '{"problem": "x = \\"y\\"", "answer": "}"'),
+        ('{"hints": {"0": "a", "1": [1, 2]}, "answer": 5, "extra": "..."}', ['hints', 'answer'], '{"hints": {"0": "a", "1": [1, 2]}, "answer": 5,'),
+        ('```json\n{"answer": true, "reason": "r"}', ['answer'], '```json\n{"answer": true,'),
+        ('{"problem": "\\frac{1}{2}", "answer": "\\sqrt{2}", "z": 0}', ['answer'], '{"problem": "\\frac{1}{2}", "answer": "\\sqrt{2}"'),
+        # Missing or empty required fields never stop the stream early
+        ('{"problem": "p", "hints": {}}', ['answer'], None),
+        ('{"answer": "", "problem": "p"}', ['answer'], None),
+    ]
+
+    def test_stops_exactly_when_required_fields_complete(self):
+        for text, required, stop_prefix in self.CASES:
+            with self.subTest(response=text, required=required):
+                expected = safe_json_parse(text)
+                reader = StreamReader(required)
+                stopped_at = None
+                for index, char in enumerate(text):
+                    if reader.feed(char):
+                        stopped_at = index + 1
+                        break
+                if stop_prefix is None:
+                    self.assertEqual(stopped_at, len(text.rstrip()))
+                    self.assertFalse(reader.stopped_early)
+                    self.assertEqual(reader.result(), expected)
+                else:
+                    self.assertEqual(text[:stopped_at], stop_prefix)
+                    self.assertTrue(reader.stopped_early)
+                    result = reader.result()
+                    for name in required:
+                        self.assertEqual(result[name], expected[name])
+
+    def test_no_required_fields_reads_the_whole_object(self):
+        reader = StreamReader()
+        text = '{"answer": 1, "b": [2]}'
+        self.assertFalse(any(reader.feed(char) for char in text[:-1]))
+        self.assertTrue(reader.feed(text[-1]))
+        self.assertFalse(reader.stopped_early)
+        self.assertEqual(reader.result(), {'answer': 1, 'b': [2]})
+
+    def test_token_budget(self):
+        reader = StreamReader(['answer'], max_tokens=10)
+        with self.assertRaises(StreamBudgetExceeded):
+            reader.feed('{"problem": "' + 'x' * 100)
+
+    def test_time_budget(self):
+        reader = StreamReader(['answer'], max_seconds=5, started=0)
+        with mock.patch('math_agent.utils.streaming.time.monotonic', return_value=10):
+            with self.assertRaises(StreamBudgetExceeded):
+                reader.feed('{"problem": "p"')
+
+
+class ProblemDetailViewTests(TestCase):
+    def setUp(self):
+        batch = Batch.objects.create(name='detail', taxonomy_json={}, pipeline={}, number_of_valid_needed=1)
+        problems = [
+            Problem(batch=batch, subject='Algebra', topic='Linear', question=f"Solve {i}x = {i + 1}.",
+                    answer=f"{i + 1}/{i}", hints={}, status='valid')
+            for i in range(1, 7)
+        ]
+        self.problem, *neighbours = Problem.objects.bulk_create(problems)
+        ProblemSimilarity.objects.bulk_create([
+            ProblemSimilarity(src=self.problem, dst=neighbour, score=0.9 - i / 100, jaccard=0.5)
+            for i, neighbour in enumerate(neighbours)
+        ])
+
+    def test_neighbours_render_in_one_join(self):
+        # Problem, its batch and the neighbour edges joined to their problems
+        with self.assertNumQueries(3):
+            response = self.client.get(reverse('math_agent:problem_detail', args=[self.problem.id]))
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, 'Estimated Jaccard', count=5)
+
+
+class FingerprintFilterTests(TestCase):
+    def setUp(self):
+        self.batch = Batch.objects.create(name='fingerprints', taxonomy_json={}, pipeline={}, number_of_valid_needed=1)
+
+    def store(self, question):
+        # bulk_create fires no post_save, like a problem stored by another process
+        problem = Problem(batch=self.batch, subject='Algebra', topic='Linear', question=question, answer='1',
+                          hints={}, status='valid', fingerprint=problem_fingerprint(question, 'Algebra', 'Linear'))
+        Problem.objects.bulk_create([problem])
+        return problem.fingerprint
+
+    def test_miss_catches_up_on_rows_stored_elsewhere(self):
+        self.store('Solve x + 1 = 2.')
+        fingerprint_filter = FingerprintFilter()
+        fingerprint_filter.load()
+        self.assertEqual(len(fingerprint_filter), 1)
+
+        fingerprint = self.store('Find the area of a circle of radius 3.')
+        self.assertFalse(fingerprint_filter.might_contain(fingerprint))
+        self.assertTrue(fingerprint_filter.contains(fingerprint))
+        self.assertEqual(len(fingerprint_filter), 2)
+
+    def test_true_miss_costs_one_range_query(self):
+        fingerprint_filter = FingerprintFilter()
+        fingerprint_filter.load()
+        with self.assertNumQueries(1):
+            self.assertFalse(fingerprint_filter.contains(problem_fingerprint('Solve x = 1.', 'Algebra', 'Linear')))
+
+
+@override_settings(LLM_MOCK={'latency': 0, 'embedding_latency': 0, 'embedding_dimension': 8})
+class MockProviderClientTests(TestCase):
+    CONFIG = {'provider': 'mock', 'model': 'mock-generator'}
+    MESSAGES = [{'role': 'system', 'content': GENERATOR_MESSAGE}, {'role': 'user', 'content': 'Algebra, Linear'}]
+
+    def setUp(self):
+        self.batch = Batch.objects.create(name='clients', taxonomy_json={}, pipeline={}, number_of_valid_needed=1)
+        self.events = []
+        observer = lambda **event: self.events.append(event)
+        add_llm_observer(observer)
+        self.addCleanup(remove_llm_observer, observer)
+
+    async def test_acall_llm(self):
+        response = await acall_llm(self.CONFIG, self.MESSAGES, stage='generator')
+        self.assertEqual(set(response), {'problem', 'answer', 'hints'})
+        [event] = self.events
+        self.assertEqual((event['stage'], event['cached'], event['error']), ('generator', False, None))
+        self.assertEqual(event['completion_tokens'], 300)
+
+    async def test_acall_llm_streams_until_required_fields(self):
+        config = {**self.CONFIG, 'stream': True}
+        with llm_context(batch_id=self.batch.id):
+            response = await acall_llm(config, self.MESSAGES, stage='generator', required_fields=['problem'])
+        self.assertIn('problem', response)
+        counters = await BatchCounter.objects.filter(batch=self.batch).values_list('name', 'value').afirst()
+        self.assertEqual(counters, ('llm_stream.generator.early_stop', 1))
+
+    def test_call_llm_runs_database_work_on_the_calling_thread(self):
+        # The counter is written inside this test's transaction, so the sync wrapper must not switch connections
+        with llm_context(batch_id=self.batch.id):
+            response = call_llm({**self.CONFIG, 'stream': True}, self.MESSAGES, stage='generator',
+                                required_fields=['problem'])
+        self.assertIn('problem', response)
+        self.assertEqual(BatchCounter.for_batch(self.batch.id), {'llm_stream.generator.early_stop': 1})
+        self.assertEqual(len(self.events), 1)
+
+    def test_call_llm_wraps_provider_errors(self):
+        with self.assertRaisesMessage(Exception, 'Error calling LLM: Unsupported provider: nope'):
+            call_llm({'provider': 'nope', 'model': 'x'}, self.MESSAGES)
+        self.assertIsInstance(self.events[0]['error'], ValueError)
+
+    @override_settings(EMBEDDING_PROVIDER='mock', EMBEDDING_MODEL='mock-embedding')
+    async def test_afetch_embedding(self):
+        vector = await afetch_embedding('Solve  x + 1 = 2.')
+        self.assertEqual(len(vector), 8)
+        self.assertEqual(await CachedEmbedding.objects.filter(model='mock-embedding').acount(), 1)
+        # The cache stores float32, so the second lookup matches to float32 precision
+        cached = await afetch_embedding('Solve x + 1 = 2.')
+        for a, b in zip(cached, vector):
+            self.assertAlmostEqual(a, b, places=6)
+        self.assertEqual([event['cached'] for event in self.events], [False, True])
+
+    @override_settings(EMBEDDING_PROVIDER='mock', EMBEDDING_MODEL='mock-embedding')
+    def test_fetch_embeddings_matches_async(self):
+        first, second = fetch_embeddings(['a b c', 'd e f'])
+        self.assertEqual(len(first), 8)
+        self.assertNotEqual(first, second)
+        self.assertEqual(CachedEmbedding.objects.filter(model='mock-embedding').count(), 2)
+
+
+class ImportProblemsTests(TestCase):
+    ROWS = [
+        {'subject': 'Algebra', 'topic': 'Linear', 'question': 'Solve 2x = 4.', 'answer': '2'},
+        {'subject': 'Algebra', 'topic': 'Linear', 'question': 'Solve 3x = 6.', 'answer': '2'},
+        {'subject': 'Algebra', 'topic': 'Linear', 'question': 'Solve 2x = 4.', 'answer': '2'},
+    ]
+
+    def setUp(self):
+        f = tempfile.NamedTemporaryFile('w', suffix='.ndjson', delete=False)
+        with f:
+            f.write(''.join(json.dumps(row) + '\n' for row in self.ROWS))
+        self.addCleanup(os.remove, f.name)
+        self.path = f.name
+        # Linking loads the process-wide vector index; keep it from leaking between tests
+        reset_vector_index()
+        self.addCleanup(reset_vector_index)
+
+    def test_problems_differing_in_constants_are_kept(self):
+        stats = import_problems(self.path, embed=False, chunk_size=2)
+        self.assertEqual((stats.imported, stats.duplicates), (2, 1))
+        self.assertEqual(sorted(Problem.objects.values_list('question', flat=True)), ['Solve 2x = 4.', 'Solve 3x = 6.'])
+
+    def test_rerun_skips_stored_problems(self):
+        import_problems(self.path, embed=False)
+        stats = import_problems(self.path, embed=False)
+        self.assertEqual((stats.imported, stats.duplicates), (0, 3))
+        self.assertEqual(Problem.objects.count(), 2)
+
+    def test_similarity_edges_are_written_by_default(self):
+        with mock.patch('math_agent.utils.importer.fetch_embeddings', side_effect=lambda texts: [[1.0] * 8 for _ in texts]):
+            stats = import_problems(self.path)
+        # The two kept problems embed identically, so they are linked in both directions
+        self.assertEqual(stats.edges, 2)
+        self.assertEqual(ProblemSimilarity.objects.count(), 2)
+
+
+@override_settings(GENERATION_JOB_STALE_AFTER=600)
+class ClaimNextJobTests(TestCase):
+    def job(self, status, heartbeat_age=0, worker='dead:1'):
+        batch = Batch.objects.create(name=status, taxonomy_json={}, pipeline={}, number_of_valid_needed=1)
+        job = GenerationJob.objects.create(batch=batch, status=status, worker=worker)
+        GenerationJob.objects.filter(id=job.id).update(updated_at=timezone.now() - timedelta(seconds=heartbeat_age))
+        return job
+
+    def test_queued_job_first(self):
+        self.job('running', heartbeat_age=3600)
+        queued = self.job('queued', heartbeat_age=3600, worker='')
+        claimed = claim_next_job('live:2')
+        self.assertEqual((claimed.id, claimed.worker), (queued.id, 'live:2'))
+        # The claim refreshes the heartbeat, so the job is not immediately stale
+        self.assertLess((timezone.now() - claimed.updated_at).total_seconds(), 60)
+
+    def test_reclaims_job_without_heartbeat(self):
+        stale = self.job('running', heartbeat_age=601)
+        claimed = claim_next_job('live:2')
+        self.assertEqual((claimed.id, claimed.status, claimed.worker), (stale.id, 'running', 'live:2'))
+        self.assertIsNone(claim_next_job('live:3'))
+
+    def test_leaves_live_job_alone(self):
+        self.job('running', heartbeat_age=599)
+        self.assertIsNone(claim_next_job('live:2'))
+
+
+class TraditionalGenerationTests(TestCase):
+    def test_attempt_budget_stops_a_generator_that_only_repeats(self):
+        batch = Batch.objects.create(name='repeats', taxonomy_json={'Algebra': ['Linear']},
+                                     pipeline={'generator': {}}, number_of_valid_needed=2)
+        with mock.patch('math_agent.utils.batch_runner.EnhancedSimilarityChecker'), \
+                mock.patch('math_agent.utils.batch_runner.run_traditional_attempt', return_value='duplicate') as attempt:
+            with self.assertRaisesMessage(Exception, 'attempt budget of 6 spent with 0/2 valid problems'):
+                generate_problems_traditional(2, batch.pipeline, batch.taxonomy_json, batch, max_attempts_per_valid=3)
+        self.assertEqual(attempt.call_count, 6)
+
+
+@override_settings(BATCH_EVENT_POLL_INTERVAL=0.01, BATCH_EVENT_STREAM_TIMEOUT=0.05)
+class BatchEventStreamViewTests(TestCase):
+    def setUp(self):
+        self.batch = Batch.objects.create(name='events', taxonomy_json={}, pipeline={}, number_of_valid_needed=1)
+        GenerationJob.objects.create(batch=self.batch, status='running')
+        self.events = [BatchEvent.objects.create(batch=self.batch, kind=kind, attempt=attempt)
+                       for kind, attempt in (('started', None), ('attempt', 1), ('attempt', 2))]
+
+    def read(self, **headers):
+        response = self.client.get(reverse('math_agent:batch_events', args=[self.batch.id]), headers=headers)
+        return b''.join(response.streaming_content).decode()
+
+    def test_running_batch_stream_closes_after_the_window(self):
+        body = self.read()
+        self.assertTrue(body.startswith('retry: 1000\n\n'))
+        self.assertEqual(body.count('id: '), 3)
+        self.assertIn(': keepalive', body)
+
+    def test_reconnect_resumes_after_last_event_id(self):
+        body = self.read(**{'Last-Event-ID': str(self.events[1].id)})
+        self.assertEqual(body.count('id: '), 1)
+        self.assertIn(f"id: {self.events[2].id}\n", body)
@@ -7,7 +7,13 @@ urlpatterns = [
     path('', views.BatchListView.as_view(), name='batch_list'),
     path('generate/', views.GenerateView.as_view(), name='generate'),
     path('batch/<int:pk>/', views.BatchDetailView.as_view(), name='batch_detail'),
+    path('batch/<int:pk>/progress/', views.BatchProgressView.as_view(), name='batch_progress'),
+    path('batch/<int:pk>/resume/', views.ResumeBatchView.as_view(), name='batch_resume'),
+    path('batch/<int:pk>/events/', views.BatchEventStreamView.as_view(), name='batch_events'),
+    path('batch/<int:pk>/performance/', views.BatchPerformanceView.as_view(), name='batch_performance'),
     path('batch/<int:batch_id>/problems/', views.ProblemListView.as_view(), name='problems'),
     path('problem/<int:pk>/', views.ProblemDetailView.as_view(), name='problem_detail'),
     path('problems/', views.AllProblemsView.as_view(), name='all_problems'),
+    path('export/problems/', views.ProblemExportView.as_view(), name='export_problems'),
+    path('exports/<str:name>', views.ExportFileView.as_view(), name='export_file'),
 ] 
\ No newline at end of file
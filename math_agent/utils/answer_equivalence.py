@@ -0,0 +1,418 @@
+import math
+import re
+from fractions import Fraction
+
+# Answers whose numbers carry this many digits are left to the judge LLM
+MAX_DIGITS = 60
+# Largest radicand factored into its square-free form
+MAX_RADICAND = 10**12
+MAX_EXPONENT = 64
+
+_INFINITY = 'inf'
+_LATEX_REPLACEMENTS = [
+    (r'\\[dt]frac', r'\\frac'),
+    (r'\\left|\\right|\\displaystyle', ''),
+    (r'\\[,;:! ]|~', ''),
+    (r'\\cdot|\\times|×|·', '*'),
+    (r'\\div|÷', '/'),
+    (r'\\infty|∞|\\infinity', _INFINITY),
+    (r'√', r'\\sqrt'),
+    (r'[−–]', '-'),
+    (r'\\\{', '{'),
+    (r'\\\}', '}'),
+    (r'\^\{?\\circ\}?|°', '')
+]
+
+
+def normalize_answer(text):
+    """
+    Strip formatting that never changes an answer's value: math delimiters,
+    \\boxed / \\text wrappers, LaTeX spacing and sizing commands, a leading
+    "x =" and a trailing period.
+
+    Returns:
+        str: Lowercased answer with whitespace collapsed
+    """
+    text = str(text or '').strip()
+    text = re.sub(r'^\\\[(.*)\\\]$', r'\1', text, flags=re.S)
+    text = re.sub(r'\\\(|\\\)|\$', '', text)
+    # Unwrap \boxed{...}, \text{...} and friends (innermost first)
+    wrapper = re.compile(r'\\(?:boxed|text|textbf|mathrm|mathbf|operatorname)\s*\{([^{}]*)\}')
+    while wrapper.search(text):
+        text = wrapper.sub(r'\1', text)
+    for pattern, replacement in _LATEX_REPLACEMENTS:
+        text = re.sub(pattern, replacement, text)
+    text = re.sub(r'\s+', ' ', text).strip().lower()
+    text = re.sub(r'^(?:the )?(?:final )?answer(?: is)?\s*:?\s*', '', text)
+    if text.count('=') == 1:
+        text = re.sub(r'^[a-z]\s*=\s*', '', text)
+    text = text.rstrip('.').strip()
+    # 1,000,000 -> 1000000 (commas followed by a space separate list items instead)
+    if re.fullmatch(r'-?\d{1,3}(,\d{3})+(\.\d+)?', text):
+        text = text.replace(',', '')
+    return text
+
+
+class Surd:
+    """Exact number of the form sum(c_i * sqrt(r_i)) with rational c_i and distinct square-free r_i."""
+
+    def __init__(self, terms=None):
+        self.terms = {radicand: coef for radicand, coef in (terms or {}).items() if coef}
+
+    @classmethod
+    def rational(cls, value):
+        return cls({1: Fraction(value)})
+
+    @classmethod
+    def sqrt(cls, value):
+        """Square root of a non-negative rational, as c * sqrt(r) with r square-free."""
+        if not value.is_rational or value.rational_value < 0:
+            raise ValueError("Only square roots of non-negative rationals are supported")
+        rational = value.rational_value
+        # sqrt(p/q) = sqrt(p*q) / q
+        outside, radicand = _split_square(rational.numerator * rational.denominator)
+        return cls({radicand: Fraction(outside, rational.denominator)})
+
+    @property
+    def is_rational(self):
+        return set(self.terms) <= {1}
+
+    @property
+    def rational_value(self):
+        return self.terms.get(1, Fraction(0))
+
+    def __add__(self, other):
+        terms = dict(self.terms)
+        for radicand, coef in other.terms.items():
+            terms[radicand] = terms.get(radicand, 0) + coef
+        return Surd(terms)
+
+    def __neg__(self):
+        return Surd({radicand: -coef for radicand, coef in self.terms.items()})
+
+    def __sub__(self, other):
+        return self + (-other)
+
+    def __mul__(self, other):
+        terms = {}
+        for r1, c1 in self.terms.items():
+            for r2, c2 in other.terms.items():
+                # r1 and r2 are square-free, so sqrt(r1 * r2) = g * sqrt((r1 / g) * (r2 / g))
+                g = math.gcd(r1, r2)
+                radicand = (r1 // g) * (r2 // g)
+                terms[radicand] = terms.get(radicand, 0) + c1 * c2 * g
+        return Surd(terms)
+
+    def __truediv__(self, other):
+        if len(other.terms) != 1:
+            raise ValueError("Only division by a single term is supported")
+        (radicand, coef), = other.terms.items()
+        # 1 / (c * sqrt(r)) = sqrt(r) / (c * r)
+        return self * Surd({radicand: 1 / (coef * radicand)})
+
+    def __pow__(self, exponent):
+        if not exponent.is_rational or exponent.rational_value.denominator != 1:
+            raise ValueError("Only integer exponents are supported")
+        power = exponent.rational_value.numerator
+        if abs(power) > MAX_EXPONENT:
+            raise ValueError("Exponent too large")
+        result = Surd.rational(1)
+        for _ in range(abs(power)):
+            result = result * self
+        return Surd.rational(1) / result if power < 0 else result
+
+    def __eq__(self, other):
+        return isinstance(other, Surd) and self.terms == other.terms
+
+    def __hash__(self):
+        return hash(frozenset(self.terms.items()))
+
+    def __float__(self):
+        return float(sum(float(coef) * math.sqrt(radicand) for radicand, coef in self.terms.items()))
+
+
+def _split_square(n):
+    """n = outside**2 * radicand with radicand square-free."""
+    if n == 0:
+        return 0, 1
+    if n > MAX_RADICAND:
+        raise ValueError("Radicand too large")
+    outside, radicand, factor = 1, 1, 2
+    while factor * factor <= n:
+        while n % (factor * factor) == 0:
+            n //= factor * factor
+            outside *= factor
+        if n % factor == 0:
+            n //= factor
+            radicand *= factor
+        factor += 1
+    return outside, radicand * n
+
+
+_TOKEN = re.compile(r'\d+\.\d*|\.\d+|\d+|\\frac|\\sqrt|sqrt|inf|[-+*/^(){}\[\]]')
+
+
+class _NumberParser:
+    """Recursive-descent parser for numeric answers: + - * / ^, parentheses, \\frac, \\sqrt and implicit products."""
+
+    def __init__(self, text):
+        if re.search(r'[\d.]\s+[\d.]', text):
+            raise ValueError("Digits separated by spaces")
+        compact = text.replace(' ', '')
+        self.tokens = _TOKEN.findall(compact)
+        if ''.join(self.tokens) != compact:
+            raise ValueError("Unsupported characters")
+        self.pos = 0
+        self.decimal_places = None  # fewest digits after the point of any decimal literal
+
+    def parse(self):
+        value = self.expression()
+        if self.pos != len(self.tokens):
+            raise ValueError("Trailing input")
+        return value
+
+    def peek(self):
+        return self.tokens[self.pos] if self.pos < len(self.tokens) else None
+
+    def take(self, expected=None):
+        token = self.peek()
+        if token is None or (expected is not None and token != expected):
+            raise ValueError(f"Expected {expected or 'more input'}")
+        self.pos += 1
+        return token
+
+    def expression(self):
+        value = self.term()
+        while self.peek() in ('+', '-'):
+            value = value + self.term() if self.take() == '+' else value - self.term()
+        return value
+
+    def term(self):
+        value = self.unary()
+        while True:
+            token = self.peek()
+            if token == '*':
+                self.take()
+                value = value * self.unary()
+            elif token == '/':
+                self.take()
+                value = value / self.unary()
+            elif token is not None and (token[0].isdigit() or token[0] == '.'
+                                        or token in ('\\frac', '\\sqrt', 'sqrt', '(')):
+                value = value * self.power()
+            else:
+                return value
+
+    def unary(self):
+        if self.peek() == '-':
+            self.take()
+            return -self.unary()
+        if self.peek() == '+':
+            self.take()
+            return self.unary()
+        return self.power()
+
+    def power(self):
+        value = self.atom()
+        if self.peek() == '^':
+            self.take()
+            value = value ** self.unary()
+        return value
+
+    def group(self):
+        """A {...} group, or a single digit as in \\frac12 and \\sqrt2."""
+        if self.peek() == '{':
+            self.take()
+            value = self.expression()
+            self.take('}')
+            return value
+        token = self.take()
+        if not token.isdigit():
+            raise ValueError("Expected a group")
+        # \frac123 means \frac{1}{2}3: give back all but the first digit
+        if len(token) > 1:
+            self.tokens[self.pos:self.pos] = [token[1:]]
+        return Surd.rational(int(token[0]))
+
+    def atom(self):
+        token = self.take()
+        if token[0].isdigit() or token[0] == '.':
+            if len(token) > MAX_DIGITS:
+                raise ValueError("Number too long")
+            if '.' in token:
+                places = len(token.split('.')[1])
+                self.decimal_places = places if self.decimal_places is None else min(self.decimal_places, places)
+            return Surd.rational(Fraction(token))
+        if token == '\\frac':
+            numerator = self.group()
+            return numerator / self.group()
+        if token == '\\sqrt':
+            if self.peek() == '[':
+                raise ValueError("Only square roots are supported")
+            return Surd.sqrt(self.group())
+        if token == 'sqrt':
+            self.take('(')
+            value = self.expression()
+            self.take(')')
+            return Surd.sqrt(value)
+        if token in ('(', '{'):
+            value = self.expression()
+            self.take(')' if token == '(' else '}')
+            return value
+        raise ValueError(f"Unexpected {token}")
+
+
+class ParsedAnswer:
+    """
+    Canonical form of an answer.
+
+    kind is 'number' (value: Surd), 'interval' (value: (left_closed, low, high,
+    right_closed)), 'set' (value: frozenset of Surd) or 'list' (value: tuple of
+    Surd). decimal_places is set when a decimal literal was involved, since a
+    rounded decimal may still be an acceptable answer.
+    """
+
+    def __init__(self, kind, value, decimal_places=None):
+        self.kind = kind
+        self.value = value
+        self.decimal_places = decimal_places
+
+
+def _parse_number(text):
+    parser = _NumberParser(text)
+    return parser.parse(), parser.decimal_places
+
+
+def _merge_places(places):
+    places = [p for p in places if p is not None]
+    return min(places) if places else None
+
+
+def _split_top_level(text):
+    """Split on commas outside (), [] and {}."""
+    parts, depth, current = [], 0, ''
+    for char in text:
+        if char in '([{':
+            depth += 1
+        elif char in ')]}':
+            depth -= 1
+        if char == ',' and depth == 0:
+            parts.append(current)
+            current = ''
+        else:
+            current += char
+    parts.append(current)
+    return [part.strip() for part in parts]
+
+
+def _is_wrapped(text, opening, closing):
+    """True when the first character opens a bracket that only closes at the last character."""
+    if len(text) < 2 or text[0] not in opening or text[-1] not in closing:
+        return False
+    depth = 0
+    for index, char in enumerate(text):
+        if char in '([{':
+            depth += 1
+        elif char in ')]}':
+            depth -= 1
+            if depth == 0 and index != len(text) - 1:
+                return False
+    return depth == 0
+
+
+def _parse_endpoint(text):
+    compact = text.replace(' ', '')
+    if compact in (_INFINITY, '+' + _INFINITY, 'oo', '+oo'):
+        return _INFINITY, None
+    if compact in ('-' + _INFINITY, '-oo'):
+        return '-' + _INFINITY, None
+    return _parse_number(text)
+
+
+def parse_answer(text):
+    """
+    Canonicalize a normalized answer.
+
+    Returns:
+        ParsedAnswer or None: None when the answer is not one of the supported shapes
+    """
+    try:
+        if _is_wrapped(text, '{', '}'):
+            items = [_parse_number(item) for item in _split_top_level(text[1:-1]) if item]
+            return ParsedAnswer('set', frozenset(value for value, _ in items), _merge_places(p for _, p in items))
+
+        parts = _split_top_level(text)
+        if _is_wrapped(text, '([', ')]'):
+            inner = _split_top_level(text[1:-1])
+            if len(inner) == 2:
+                (low, low_places), (high, high_places) = _parse_endpoint(inner[0]), _parse_endpoint(inner[1])
+                return ParsedAnswer('interval', (text[0] == '[', low, high, text[-1] == ']'),
+                                    _merge_places([low_places, high_places]))
+            if len(inner) > 2:
+                parts = inner
+
+        if len(parts) == 1:
+            value, places = _parse_number(text)
+            return ParsedAnswer('number', value, places)
+
+        items = [_parse_number(part) for part in parts]
+        return ParsedAnswer('list', tuple(value for value, _ in items), _merge_places(p for _, p in items))
+    except (ValueError, ZeroDivisionError, IndexError, RecursionError):
+        return None
+
+
+def _numbers_differ(a, b, decimal_places):
+    """True when two unequal numbers cannot be the same value rounded to decimal_places."""
+    if decimal_places is None:
+        return True
+    return abs(float(a) - float(b)) > 10 ** -decimal_places
+
+
+def compare_answers(candidate, reference):
+    """
+    Decide locally whether two final answers are equivalent.
+
+    Handles integers, rationals and decimals, simple radicals (sums of rational
+    multiples of square roots), intervals, sets and comma-separated lists,
+    whatever their LaTeX formatting.
+
+    Args:
+        candidate (str): Answer given by the target model
+        reference (str): The problem's answer
+
+    Returns:
+        bool or None: True or False when the answers are certainly equal or
+        different, None when the judge LLM has to decide
+    """
+    a, b = normalize_answer(candidate), normalize_answer(reference)
+    if not a or not b:
+        return None
+    if a == b:
+        return True
+
+    parsed_a, parsed_b = parse_answer(a), parse_answer(b)
+    if parsed_a is None or parsed_b is None or parsed_a.kind != parsed_b.kind:
+        return None
+    if parsed_a.value == parsed_b.value:
+        return True
+    decimal_places = _merge_places([parsed_a.decimal_places, parsed_b.decimal_places])
+
+    if parsed_a.kind == 'number':
+        return False if _numbers_differ(parsed_a.value, parsed_b.value, decimal_places) else None
+
+    if decimal_places is not None:
+        # Rounded members or endpoints: leave the comparison to the judge
+        return None
+
+    if parsed_a.kind == 'interval':
+        left_a, low_a, high_a, right_a = parsed_a.value
+        left_b, low_b, high_b, right_b = parsed_b.value
+        if (low_a, high_a) == (low_b, high_b):
+            # Same endpoints, different brackets: "(1, 2)" may be meant as a point
+            return None
+        return False
+
+    if parsed_a.kind == 'list' and set(parsed_a.value) == set(parsed_b.value):
+        # Same values in a different order: fine for solution lists, not for tuples
+        return None
+    return False
@@ -0,0 +1,328 @@
+import json
+import logging
+import os
+import random
+import socket
+import threading
+import traceback
+from collections import Counter
+from datetime import timedelta
+from django.conf import settings
+from django.db import close_old_connections, connection
+from django.utils import timezone
+from ..models import GenerationJob
+from .generator import GeneratedProblemQueue
+from .cascade import screen_problem
+from .duplicate_detection import EnhancedSimilarityChecker
+from .target import test_with_target
+from .judge import judge_solution
+from .smart_generator import SmartGenerationController
+from .call_llm_clients import llm_context
+from .problem_store import save_problem
+from .tracing import attempt_trace
+from .events import record_batch_event
+from .checkpoints import load_checkpoint, save_checkpoint, stored_valid_count
+
+logger = logging.getLogger(__name__)
+
+SMART_GENERATION_THRESHOLD = 10  # Batches larger than this use SmartGenerationController
+
+
+def run_batch(batch, progress_callback=None):
+    """
+    Generate problems for a batch, choosing the generation method by batch size.
+
+    Returns:
+        tuple: (valid_count, attempt_count)
+    """
+    number_of_valid_needed = batch.number_of_valid_needed
+    with llm_context(batch_id=batch.id):
+        if number_of_valid_needed > SMART_GENERATION_THRESHOLD:
+            print(f"Using SMART generation for {number_of_valid_needed} problems")
+            controller = SmartGenerationController()
+            return controller.generate_problems_intelligently(
+                number_of_valid_needed, batch.pipeline, batch.taxonomy_json, batch,
+                progress_callback=progress_callback
+            )
+
+        print(f"Using TRADITIONAL generation for {number_of_valid_needed} problems")
+        return generate_problems_traditional(
+            number_of_valid_needed, batch.pipeline, batch.taxonomy_json, batch,
+            progress_callback=progress_callback
+        )
+
+
+def generate_problems_traditional(number_of_valid_needed, pipeline, taxonomy_file, batch, progress_callback=None,
+                                  max_attempts_per_valid=None):
+    """
+    Generate problems one attempt at a time with random topic selection.
+
+    Args:
+        number_of_valid_needed (int): Number of valid problems to produce
+        pipeline (dict): Provider/model configuration for each pipeline stage
+        taxonomy_file (dict): Mapping of subject to list of topics
+        batch (Batch): Batch the generated problems belong to
+        progress_callback (callable, optional): Called as progress_callback(attempt_count, valid_count)
+        max_attempts_per_valid (int, optional): Attempt budget per valid problem still needed
+            (default: GENERATION_MAX_ATTEMPTS_PER_VALID)
+
+    The attempt count and outcomes are checkpointed after every attempt; a batch
+    with a checkpoint resumes from it and from the valid problems it already stored.
+    Duplicates store nothing, so a generator that keeps repeating itself would
+    loop forever; once the attempt budget is spent an exception is raised and
+    the job is marked failed (resume_batch can continue it with a fresh budget).
+
+    Returns:
+        tuple: (valid_count, attempt_count)
+    """
+    valid_count = 0
+    attempt_count = 0
+    outcomes = Counter()
+    checkpoint = load_checkpoint(batch)
+    if checkpoint is not None:
+        valid_count = stored_valid_count(batch)
+        attempt_count = checkpoint.attempt_count
+        outcomes.update(checkpoint.outcomes)
+        print(f"Resuming from attempt {attempt_count} with {valid_count}/{number_of_valid_needed} valid problems")
+    max_attempts_per_valid = max_attempts_per_valid or getattr(settings, 'GENERATION_MAX_ATTEMPTS_PER_VALID', 15)
+    # A resumed batch gets a fresh budget for what it still needs
+    max_attempts = attempt_count + max(0, number_of_valid_needed - valid_count) * max_attempts_per_valid
+    similarity_checker = EnhancedSimilarityChecker()
+    problem_queue = GeneratedProblemQueue(pipeline['generator'], lambda: random_taxonomy(taxonomy_file))
+    
+    while valid_count < number_of_valid_needed:
+        if attempt_count >= max_attempts:
+            raise Exception(
+                f"Error generating problems: attempt budget of {max_attempts} spent with "
+                f"{valid_count}/{number_of_valid_needed} valid problems ({dict(outcomes)})"
+            )
+        attempt_count += 1
+        if progress_callback:
+            progress_callback(attempt_count, valid_count)
+        print(f"\nAttempt {attempt_count}")
+        print("=" * 50)
+        
+        with attempt_trace(batch.id, attempt_count) as trace:
+            status = run_traditional_attempt(pipeline, taxonomy_file, batch, similarity_checker, problem_queue)
+            trace.finish(status)
+        outcomes[status] += 1
+        save_checkpoint(
+            batch.id, 'traditional', attempt_count=attempt_count, completed_count=attempt_count,
+            outcomes=dict(outcomes)
+        )
+        
+        if status == 'valid':
+            valid_count += 1
+            print(f"\nValid problem count: {valid_count}/{number_of_valid_needed}")
+
+    if progress_callback:
+        progress_callback(attempt_count, valid_count)
+    return valid_count, attempt_count
+
+
+def random_taxonomy(taxonomy_file):
+    """Pick a random (subject, topic) entry from the taxonomy."""
+    subject = random.choice(list(taxonomy_file.keys()))
+    return subject, random.choice(taxonomy_file[subject])
+
+
+def run_traditional_attempt(pipeline, taxonomy_file, batch, similarity_checker, problem_queue):
+    """
+    Run one generate -> screen -> target -> judge attempt on a random topic and store its problem.
+
+    The problem comes from `problem_queue`, which only calls the generator when
+    no problem from an earlier multi-problem call is left.
+
+    Returns:
+        str: 'duplicate' (nothing stored) or the stored problem's status ('discarded', 'solved' or 'valid')
+    """
+    # Randomly select subject and topic from taxonomy
+    subject, topic = random_taxonomy(taxonomy_file)
+    
+    # Generate problem, then screen it cheapest filter first
+    if not len(problem_queue):
+        print(f"Calling generator for {subject} - {topic}...")
+    subject, topic, question, answer, hints = problem_queue.next(subject, topic)
+    print(f"Generator result ({subject} - {topic}):\nQuestion: {question}\nAnswer: {answer}\nHints: {json.dumps(hints, indent=2)}")
+    
+    print("\nScreening (fingerprint, lexical, embedding, checker)...")
+    screened = screen_problem(similarity_checker, batch, subject, topic, question, answer, hints, pipeline['checker'])
+    embedding, similar_problems = screened.embedding, screened.similar_problems
+    print(f"Similar: {similar_problems}")
+    
+    if screened.is_duplicate:
+        print(f"Rejected as duplicate at {screened.rejected_by}: {screened.reason}")
+        return 'duplicate'
+    
+    if screened.rejected_by:
+        print(f"Rejection reason: {screened.reason}")
+        # Create discarded problem and link it to its neighbours
+        save_problem(
+            batch, subject, topic, question, answer, hints, 'discarded', embedding, similar_problems,
+            rejection_reason=screened.reason
+        )
+        return 'discarded'
+    
+    print("Checker result: Valid")
+    hints = screened.hints
+
+    # Test with target
+    print("\nCalling target...")
+    target_result = test_with_target(question, pipeline['target'])
+    print(f"Target result:\n{target_result}")
+    
+    # Judge the solution
+    print("\nCalling judge...")
+    is_solved = judge_solution(target_result, answer, pipeline['judge'])
+    print(f"Judge result: {'Solved' if is_solved else 'Not Solved'}")
+    
+    # Create problem with appropriate status
+    status = 'solved' if is_solved else 'valid'
+    save_problem(batch, subject, topic, question, answer, hints, status, embedding, similar_problems)
+    return status
+
+
+def worker_name():
+    """Identify this worker process in claimed jobs."""
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+def job_stale_after():
+    """Seconds a running job may go without a heartbeat before another worker reclaims it."""
+    return getattr(settings, 'GENERATION_JOB_STALE_AFTER', 600)
+
+
+def claim_next_job(worker):
+    """
+    Atomically move the oldest queued job to running and return it.
+
+    If nothing is queued, a running job whose worker has not sent a heartbeat
+    for GENERATION_JOB_STALE_AFTER seconds (the worker died) is reclaimed and
+    continues from its checkpoint. The status-guarded UPDATEs make claiming
+    safe when several workers poll the same database: only one of them can
+    flip a given job out of 'queued' or take over a given stale job.
+
+    Returns:
+        GenerationJob or None: The claimed job, or None if there is nothing to run
+    """
+    while True:
+        job_id = GenerationJob.objects.filter(status='queued').order_by('created_at', 'id').values_list('id', flat=True).first()
+        if job_id is None:
+            return claim_stale_job(worker)
+        job = claim_job(job_id, worker)
+        if job is not None:
+            return job
+
+
+def claim_job(job_id, worker):
+    """Move one queued job to running, or return None if another worker claimed it first."""
+    now = timezone.now()
+    claimed = GenerationJob.objects.filter(id=job_id, status='queued').update(
+        status='running', worker=worker, started_at=now, updated_at=now
+    )
+    if claimed:
+        return GenerationJob.objects.select_related('batch').get(id=job_id)
+    return None
+
+
+def claim_stale_job(worker):
+    """Take over the oldest running job whose heartbeat stopped, or return None."""
+    while True:
+        cutoff = timezone.now() - timedelta(seconds=job_stale_after())
+        stale = (GenerationJob.objects.filter(status='running', updated_at__lt=cutoff)
+                 .order_by('updated_at', 'id').values_list('id', 'worker').first())
+        if stale is None:
+            return None
+        job_id, dead_worker = stale
+        now = timezone.now()
+        # Guarded on the old worker and heartbeat, so only one worker takes the job over
+        claimed = GenerationJob.objects.filter(id=job_id, status='running', worker=dead_worker,
+                                               updated_at__lt=cutoff).update(
+            worker=worker, started_at=now, updated_at=now
+        )
+        if claimed:
+            logger.warning(f"Reclaimed job {job_id} from {dead_worker or 'an unknown worker'} (no heartbeat since {cutoff})")
+            return GenerationJob.objects.select_related('batch').get(id=job_id)
+
+
+def job_heartbeat(job, stop):
+    """Touch the job's updated_at until `stop` is set, so slow attempts do not look like a dead worker."""
+    interval = max(1.0, job_stale_after() / 4)
+    try:
+        while not stop.wait(interval):
+            GenerationJob.objects.filter(id=job.id, status='running', worker=job.worker).update(
+                updated_at=timezone.now()
+            )
+    finally:
+        connection.close()
+
+
+def run_job(job):
+    """Run a claimed job to completion, recording progress and the final status."""
+    def report_progress(attempt_count, valid_count):
+        GenerationJob.objects.filter(id=job.id).update(
+            attempt_count=attempt_count, valid_count=valid_count, updated_at=timezone.now()
+        )
+
+    record_batch_event(job.batch_id, 'started')
+    stop_heartbeat = threading.Event()
+    heartbeat = threading.Thread(target=job_heartbeat, args=(job, stop_heartbeat), name=f'job-{job.id}-heartbeat',
+                                 daemon=True)
+    heartbeat.start()
+    try:
+        valid_count, attempt_count = run_batch(job.batch, progress_callback=report_progress)
+        GenerationJob.objects.filter(id=job.id).update(
+            status='completed', attempt_count=attempt_count, valid_count=valid_count,
+            finished_at=timezone.now()
+        )
+        record_batch_event(job.batch_id, 'completed', attempt=attempt_count)
+        logger.info(f"Job {job.id} completed: {valid_count} valid problems in {attempt_count} attempts")
+    except Exception as e:
+        logger.error(f"Job {job.id} failed: {e}")
+        GenerationJob.objects.filter(id=job.id).update(
+            status='failed', error=f"{e}\n{traceback.format_exc()}", finished_at=timezone.now()
+        )
+        record_batch_event(job.batch_id, 'failed', reason=str(e))
+    finally:
+        stop_heartbeat.set()
+        heartbeat.join()
+        close_old_connections()
+
+
+def resume_batch(batch, force=False):
+    """
+    Requeue an interrupted or short batch so a worker continues it from its checkpoint.
+
+    A failed job, a job that finished short of its quota (attempt budget spent)
+    and a running job whose worker stopped reporting progress for
+    GENERATION_JOB_STALE_AFTER seconds are put back in the queue; `force`
+    requeues a running job regardless.
+
+    Args:
+        batch (Batch): Batch to resume
+        force (bool): Requeue even if the job still looks alive
+
+    Returns:
+        GenerationJob: The queued job
+    """
+    if batch.is_import:
+        raise Exception(f"Error resuming batch {batch.id}: it was imported; rerun import_problems to continue it")
+    valid_count = stored_valid_count(batch)
+    if valid_count >= batch.number_of_valid_needed:
+        raise Exception(f"Error resuming batch {batch.id}: it already has {valid_count}/{batch.number_of_valid_needed} valid problems")
+
+    job = GenerationJob.objects.filter(batch_id=batch.id).first()
+    if job is None:
+        return GenerationJob.objects.create(batch=batch)
+    if job.status == 'queued':
+        return job
+    if job.status == 'running' and not force:
+        if (timezone.now() - job.updated_at).total_seconds() < job_stale_after():
+            raise Exception(f"Error resuming batch {batch.id}: it is still running on {job.worker or 'a worker'}")
+
+    GenerationJob.objects.filter(id=job.id).update(
+        status='queued', worker='', error=None, started_at=None, finished_at=None, updated_at=timezone.now()
+    )
+    job.refresh_from_db()
+    logger.info(f"Requeued job {job.id} to resume batch {batch.id} at {valid_count}/{batch.number_of_valid_needed} valid")
+    return job
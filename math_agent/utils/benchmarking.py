@@ -0,0 +1,159 @@
+import os
+import resource
+import sys
+import tempfile
+import threading
+from collections import defaultdict
+from contextlib import contextmanager
+import numpy as np
+from django.db import connection, connections
+from django.db.backends.signals import connection_created
+from .fingerprints import reset_fingerprint_filter
+from .minhash import reset_minhash_index
+from .vector_index import reset_vector_index
+
+
+def reset_dedupe_indexes():
+    """Forget the process-wide vector index, MinHash LSH index and fingerprint filter."""
+    reset_vector_index()
+    reset_minhash_index()
+    reset_fingerprint_filter()
+
+
+@contextmanager
+def scratch_database(path=None, keep=False):
+    """
+    Run the block against a freshly migrated scratch copy of the default database.
+
+    SQLite scratch databases live in a file (a temporary one unless `path` is
+    given) so worker threads share them. The real database is restored and the
+    scratch one dropped afterwards unless `keep` is set. The process-wide dedupe
+    indexes are reset on the way in and out, so neither database's problems
+    leak into the other's duplicate checks.
+
+    Yields:
+        str: Name of the scratch database
+    """
+    settings_dict = connection.settings_dict
+    old_name = settings_dict['NAME']
+    old_test_name = settings_dict['TEST'].get('NAME')
+    if connection.vendor == 'sqlite':
+        if path is None:
+            fd, path = tempfile.mkstemp(prefix='math_agent_bench_', suffix='.sqlite3')
+            os.close(fd)
+        settings_dict['TEST']['NAME'] = str(path)
+    elif path:
+        settings_dict['TEST']['NAME'] = str(path)
+
+    reset_dedupe_indexes()
+    try:
+        name = connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False, keepdb=keep)
+        try:
+            yield name
+        finally:
+            connections.close_all()
+            connection.creation.destroy_test_db(old_name, verbosity=0, keepdb=keep)
+    finally:
+        settings_dict['TEST']['NAME'] = old_test_name
+        reset_dedupe_indexes()
+
+
+class QueryCounter:
+    """
+    Count SQL statements executed on any thread while the block is active.
+
+    Each thread has its own connection, so the counting execute wrapper is
+    installed on every connection opened inside the block as well as on the
+    ones already open.
+    """
+
+    def __init__(self):
+        self.count = 0
+        self._lock = threading.Lock()
+        self._wrapped = []
+
+    def __call__(self, execute, sql, params, many, context):
+        with self._lock:
+            self.count += 1
+        return execute(sql, params, many, context)
+
+    def _install(self, sender=None, connection=None, **kwargs):
+        if self not in connection.execute_wrappers:
+            connection.execute_wrappers.append(self)
+            self._wrapped.append(connection)
+
+    def __enter__(self):
+        for conn in connections.all(initialized_only=True):
+            self._install(connection=conn)
+        connection_created.connect(self._install)
+        return self
+
+    def __exit__(self, *exc):
+        connection_created.disconnect(self._install)
+        for conn in self._wrapped:
+            if self in conn.execute_wrappers:
+                conn.execute_wrappers.remove(self)
+        self._wrapped = []
+
+
+def percentile(values, q):
+    """q-th percentile of a list of numbers, or None when it is empty."""
+    return float(np.percentile(values, q)) if values else None
+
+
+class StageRecorder:
+    """LLM observer collecting per-stage wall times and prompt tokens (see add_llm_observer)."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.timings = defaultdict(list)
+        self.errors = defaultdict(int)
+        self.cached = defaultdict(int)
+        self.prompt_tokens = defaultdict(int)
+
+    def __call__(self, stage, provider, model, elapsed, cached, error, prompt_tokens=None, **kwargs):
+        stage = stage or provider
+        with self._lock:
+            self.timings[stage].append(elapsed)
+            self.prompt_tokens[stage] += prompt_tokens or 0
+            if error is not None:
+                self.errors[stage] += 1
+            if cached:
+                self.cached[stage] += 1
+
+    def summary(self):
+        """
+        Returns:
+            dict: {stage: {"calls", "errors", "cached", "prompt_tokens", "p50_ms", "p95_ms", "mean_ms"}}
+        """
+        with self._lock:
+            result = {}
+            for stage, timings in self.timings.items():
+                result[stage] = {
+                    'calls': len(timings),
+                    'errors': self.errors[stage],
+                    'cached': self.cached[stage],
+                    'prompt_tokens': self.prompt_tokens[stage],
+                    'p50_ms': round(percentile(timings, 50) * 1000, 2),
+                    'p95_ms': round(percentile(timings, 95) * 1000, 2),
+                    'mean_ms': round(float(np.mean(timings)) * 1000, 2)
+                }
+            return result
+
+
+def database_bytes():
+    """Size of the default database in bytes (SQLite only; None for other backends)."""
+    if connection.vendor != 'sqlite':
+        return None
+    with connection.cursor() as cursor:
+        cursor.execute("PRAGMA page_count")
+        page_count = cursor.fetchone()[0]
+        cursor.execute("PRAGMA page_size")
+        page_size = cursor.fetchone()[0]
+    return page_count * page_size
+
+
+def peak_rss_bytes():
+    """Peak resident set size of this process so far."""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == 'darwin' else peak * 1024  # Linux reports kilobytes
@@ -1,8 +1,22 @@
 import openai
 import google.generativeai as genai
+from google.api_core import exceptions as google_exceptions
+from asgiref.sync import sync_to_async
 from django.conf import settings
+from contextlib import contextmanager
+from .llm_cache import cache_key, get_llm_cache
+from .mock_provider import mock_llm, mock_options
+from .streaming import StreamReader, StreamBudgetExceeded
+import asyncio
+import concurrent.futures
+import contextvars
 import json
+import queue
+import random
 import re
+import threading
+import time
+import weakref
 
 def safe_json_parse(raw_text):
     """Parse JSON from model response, handling common formatting issues."""
@@ -24,47 +38,668 @@ def safe_json_parse(raw_text):
         print("Offending text:\n", raw_text[e.pos-50:e.pos+50])
         raise ValueError(f"Model output is not valid JSON: {e}")
 
-def call_llm(pipeline_config, messages):
+class RateLimitError(Exception):
+    """A provider rejected a request for exceeding its quota (HTTP 429)."""
+
+    def __init__(self, message, retry_after=None):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class TransientProviderError(Exception):
+    """A provider failed in a way that is worth retrying (e.g. an HTTP 5xx)."""
+
+
+def retry_delay(error):
+    """
+    Classify a provider error for the scheduler.
+
+    Returns:
+        tuple: (retryable, is_rate_limit, retry_after_seconds or None)
+    """
+    if isinstance(error, RateLimitError):
+        return True, True, error.retry_after
+    if isinstance(error, TransientProviderError):
+        return True, False, None
+    if isinstance(error, openai.RateLimitError):
+        headers = getattr(error.response, 'headers', None) or {}
+        retry_after = None
+        try:
+            if headers.get('retry-after-ms'):
+                retry_after = float(headers['retry-after-ms']) / 1000
+            elif headers.get('retry-after'):
+                retry_after = float(headers['retry-after'])
+        except ValueError:
+            retry_after = None
+        return True, True, retry_after
+    if isinstance(error, (google_exceptions.ResourceExhausted, google_exceptions.TooManyRequests)):
+        return True, True, None
+    if isinstance(error, (openai.APIConnectionError, openai.InternalServerError,
+                          google_exceptions.ServiceUnavailable, google_exceptions.InternalServerError,
+                          google_exceptions.DeadlineExceeded)):
+        return True, False, None
+    return False, False, None
+
+
+def estimate_tokens(messages):
+    """Rough prompt token count (about four characters per token)."""
+    return sum(len(msg.get("content") or "") for msg in messages) // 4 + 1
+
+
+def response_tokens(response):
+    """Total tokens billed for a provider response, if the provider reported them."""
+    usage = getattr(response, 'usage', None)
+    if usage is not None and getattr(usage, 'total_tokens', None) is not None:
+        return usage.total_tokens
+    usage_metadata = getattr(response, 'usage_metadata', None)
+    if usage_metadata is not None and getattr(usage_metadata, 'total_token_count', None):
+        return usage_metadata.total_token_count
+    return None
+
+
+def response_usage(response):
+    """(prompt_tokens, completion_tokens) reported by a provider response, None where unknown."""
+    usage = getattr(response, 'usage', None)
+    if usage is not None:
+        completion = getattr(usage, 'completion_tokens', None)
+        return getattr(usage, 'prompt_tokens', None), completion
+    usage_metadata = getattr(response, 'usage_metadata', None)
+    if usage_metadata is not None:
+        return (getattr(usage_metadata, 'prompt_token_count', None),
+                getattr(usage_metadata, 'candidates_token_count', None))
+    return None, None
+
+
+class TokenBucket:
+    """
+    Token bucket refilled continuously at `per_minute * scale` units per minute.
+
+    `reserve` always deducts the requested amount and returns how long the
+    caller must wait before using it, so concurrent callers queue up in order
+    instead of all waking at once.
+    """
+
+    def __init__(self, per_minute):
+        self.per_minute = per_minute
+        self.available = float(per_minute)
+        self.updated = time.monotonic()
+
+    def _refill(self, now, scale):
+        rate = self.per_minute * scale / 60.0
+        self.available = min(self.per_minute, self.available + (now - self.updated) * rate)
+        self.updated = now
+
+    def reserve(self, amount, now, scale):
+        self._refill(now, scale)
+        self.available -= amount
+        if self.available >= 0:
+            return 0.0
+        return -self.available / (self.per_minute * scale / 60.0)
+
+    def refund(self, amount):
+        self.available = min(self.per_minute, self.available + amount)
+
+
+class ProviderLimiter:
+    """
+    Requests-per-minute and tokens-per-minute budget for one (provider, model).
+
+    The budget adapts AIMD-style: every 429 multiplies the usable share of the
+    quota down and pauses the limiter for the Retry-After period, and every
+    success adds a little back. Throughput therefore settles just under the
+    real quota instead of oscillating between bursts and failures.
+    """
+
+    MIN_SCALE = 0.1
+    DECREASE_FACTOR = 0.7
+    INCREASE_STEP = 0.02
+
+    def __init__(self, rpm=None, tpm=None):
+        self.requests = TokenBucket(rpm) if rpm else None
+        self.tokens = TokenBucket(tpm) if tpm else None
+        self.scale = 1.0
+        self.blocked_until = 0.0
+        self.lock = threading.Lock()
+
+    def reserve(self, tokens):
+        """Reserve budget for one request and return the seconds to wait before sending it."""
+        with self.lock:
+            now = time.monotonic()
+            wait = max(0.0, self.blocked_until - now)
+            if self.requests:
+                wait = max(wait, self.requests.reserve(1, now, self.scale))
+            if self.tokens:
+                wait = max(wait, self.tokens.reserve(min(tokens, self.tokens.per_minute), now, self.scale))
+            return wait
+
+    def record_success(self, estimated_tokens, actual_tokens):
+        with self.lock:
+            self.scale = min(1.0, self.scale + self.INCREASE_STEP)
+            if self.tokens and actual_tokens is not None:
+                # Settle the reservation against what the provider actually billed
+                self.tokens.refund(estimated_tokens - actual_tokens)
+
+    def record_rate_limit(self, retry_after):
+        with self.lock:
+            self.scale = max(self.MIN_SCALE, self.scale * self.DECREASE_FACTOR)
+            if retry_after:
+                self.blocked_until = max(self.blocked_until, time.monotonic() + retry_after)
+
+
+def record_request_stats(stats, retries, response):
+    """Accumulate retries and token usage of one provider request into a stats dict."""
+    if stats is None:
+        return
+    prompt_tokens, completion_tokens = response_usage(response)
+    stats['retries'] = stats.get('retries', 0) + retries
+    for key, value in (('prompt_tokens', prompt_tokens), ('completion_tokens', completion_tokens)):
+        if value is not None:
+            stats[key] = stats.get(key, 0) + value
+
+
+class RateLimitScheduler:
+    """
+    Sends provider requests through per-(provider, model) limiters and retries
+    rate-limited or transient failures with jittered exponential backoff.
+    """
+
+    def __init__(self):
+        self._limiters = {}
+        self._lock = threading.Lock()
+
+    def limiter(self, provider, model):
+        key = (provider, model)
+        limiter = self._limiters.get(key)
+        if limiter is None:
+            with self._lock:
+                limiter = self._limiters.get(key)
+                if limiter is None:
+                    limits = getattr(settings, 'LLM_RATE_LIMITS', {})
+                    config = limits.get(f"{provider}:{model}") or limits.get(provider) or {}
+                    limiter = ProviderLimiter(rpm=config.get('rpm'), tpm=config.get('tpm'))
+                    self._limiters[key] = limiter
+        return limiter
+
+    @staticmethod
+    def backoff(attempt):
+        """Full-jitter exponential backoff delay for the given retry number."""
+        base = getattr(settings, 'LLM_RETRY_BASE_DELAY', 1.0)
+        cap = getattr(settings, 'LLM_RETRY_MAX_DELAY', 60.0)
+        return random.uniform(0, min(cap, base * (2 ** attempt)))
+
+    def _after_failure(self, limiter, error, attempt):
+        """Return the delay before the next retry, or None if the error should propagate."""
+        retryable, is_rate_limit, retry_after = retry_delay(error)
+        if not retryable or attempt >= getattr(settings, 'LLM_MAX_RETRIES', 6):
+            return None
+        if is_rate_limit:
+            limiter.record_rate_limit(retry_after)
+        delay = retry_after if retry_after is not None else self.backoff(attempt)
+        print(f"LLM request failed ({type(error).__name__}), retry {attempt + 1} in {delay:.1f}s")
+        return delay
+
+    async def arun(self, provider, model, estimated_tokens, request, stats=None):
+        """
+        Await `request()` within the (provider, model) budget, retrying on 429s and transient errors.
+
+        If a `stats` dict is given, its "retries" entry counts the retries and
+        "prompt_tokens" / "completion_tokens" hold the usage of the final response.
+        """
+        limiter = self.limiter(provider, model)
+        attempt = 0
+        while True:
+            wait = limiter.reserve(estimated_tokens)
+            if wait:
+                await asyncio.sleep(wait)
+            try:
+                response = await request()
+            except Exception as e:
+                delay = self._after_failure(limiter, e, attempt)
+                if delay is None:
+                    if stats is not None:
+                        stats['retries'] = stats.get('retries', 0) + attempt
+                    raise
+                await asyncio.sleep(delay)
+                attempt += 1
+                continue
+            limiter.record_success(estimated_tokens, response_tokens(response))
+            record_request_stats(stats, attempt, response)
+            return response
+
+
+rate_limiter = RateLimitScheduler()
+
+
+def request_tokens(pipeline_config, messages):
+    """Tokens to reserve for a chat request: the prompt plus the expected completion."""
+    return estimate_tokens(messages) + pipeline_config.get('expected_completion_tokens', 1000)
+
+# Long-lived clients, one per provider and API key. Each OpenAI client owns an
+# HTTP connection pool with keep-alive, so reusing it skips TLS/connection setup.
+# Synchronous callers share the async clients of the LLM loop (see run_sync).
+_clients = {}
+_async_clients = weakref.WeakKeyDictionary()  # event loop -> {key: client}
+_clients_lock = threading.Lock()
+_gemini_api_key = None
+
+
+def get_async_openai_client(api_key=None):
+    """
+    Return the pooled AsyncOpenAI client for an API key.
+
+    Async HTTP connections are bound to the event loop that opened them, so
+    clients are pooled per running loop.
+    """
+    api_key = api_key or settings.OPENAI_API_KEY
+    loop = asyncio.get_running_loop()
+    key = ('openai', api_key)
+    with _clients_lock:
+        loop_clients = _async_clients.setdefault(loop, {})
+        client = loop_clients.get(key)
+        if client is None:
+            client = openai.AsyncOpenAI(api_key=api_key, max_retries=0)
+            loop_clients[key] = client
+    return client
+
+
+def get_gemini_model(model, api_key=None):
+    """Return a cached GenerativeModel, configuring the Gemini SDK only when the API key changes."""
+    global _gemini_api_key
+    api_key = api_key or settings.GOOGLE_API_KEY
+    key = ('google', api_key, model)
+    model_instance = _clients.get(key)
+    if model_instance is None:
+        with _clients_lock:
+            model_instance = _clients.get(key)
+            if model_instance is None:
+                if _gemini_api_key != api_key:
+                    # genai.configure is process-global and rebuilds the SDK's transport
+                    genai.configure(api_key=api_key)
+                    _gemini_api_key = api_key
+                    for cached in [k for k in _clients if k[0] == 'google']:
+                        del _clients[cached]
+                model_instance = genai.GenerativeModel(model)
+                _clients[key] = model_instance
+    return model_instance
+
+
+def gemini_prompt(messages):
+    """Convert messages to a single prompt for Gemini."""
+    return "\n".join([msg["content"] for msg in messages])
+
+
+_llm_context = contextvars.ContextVar('llm_context', default={})
+
+
+@contextmanager
+def llm_context(**values):
+    """
+    Attach values (e.g. batch_id) to every call_llm made inside the block.
+
+    Context variables do not follow work onto other threads, so code that
+    fans out to a thread pool must enter the context inside each task.
+    """
+    token = _llm_context.set({**_llm_context.get(), **values})
+    try:
+        yield
+    finally:
+        _llm_context.reset(token)
+
+
+def current_llm_context():
+    return _llm_context.get()
+
+
+_llm_observers = []
+
+
+def add_llm_observer(observer):
+    """
+    Register a callable notified after every LLM and embedding request.
+
+    Observers are called on the requesting thread with keyword arguments
+    stage, provider, model, elapsed (seconds), cached (bool) and error
+    (the exception, or None on success), plus retries, prompt_tokens and
+    completion_tokens when known. Accept **kwargs to stay compatible.
+    """
+    _llm_observers.append(observer)
+
+
+def remove_llm_observer(observer):
+    if observer in _llm_observers:
+        _llm_observers.remove(observer)
+
+
+def notify_llm_observers(**event):
+    for observer in list(_llm_observers):
+        observer(**event)
+
+
+_loop = None
+_loop_lock = threading.Lock()
+_blocking_calls = contextvars.ContextVar('llm_blocking_calls', default=None)
+
+
+def get_llm_loop():
+    """Return the process-wide event loop that runs provider requests for synchronous callers."""
+    global _loop
+    if _loop is None:
+        with _loop_lock:
+            if _loop is None:
+                loop = asyncio.new_event_loop()
+                threading.Thread(target=loop.run_forever, name='llm-loop', daemon=True).start()
+                _loop = loop
+    return _loop
+
+
+def run_sync(coroutine_function, *args, **kwargs):
+    """
+    Run one of the async entry points from synchronous code and return its result.
+
+    The coroutine runs on the shared LLM loop, so threads reuse the same pooled
+    async clients and rate limiters. Blocking work it hands to run_blocking
+    (ORM queries, cache reads, observers) runs back on the calling thread, so
+    database connections, transactions and context variables behave as if the
+    call were synchronous.
+    """
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        pass
+    else:
+        raise RuntimeError("Synchronous LLM calls cannot be made from a running event loop; await the async API")
+
+    calls = queue.SimpleQueue()
+    token = _blocking_calls.set(calls)
+    try:
+        # The task copies this context, so llm_context values and the call queue follow it onto the loop
+        future = asyncio.run_coroutine_threadsafe(coroutine_function(*args, **kwargs), get_llm_loop())
+    finally:
+        _blocking_calls.reset(token)
+    future.add_done_callback(lambda _: calls.put(None))
+
+    while (call := calls.get()) is not None:
+        call_future, function, call_args, call_kwargs = call
+        if call_future.set_running_or_notify_cancel():
+            try:
+                call_future.set_result(function(*call_args, **call_kwargs))
+            except BaseException as e:
+                call_future.set_exception(e)
+    return future.result()
+
+
+async def run_blocking(function, *args, **kwargs):
+    """
+    Call blocking code from the async core.
+
+    Under run_sync it runs on the waiting caller's thread; from native asyncio
+    code it goes through sync_to_async.
+    """
+    calls = _blocking_calls.get()
+    if calls is None:
+        return await sync_to_async(function)(*args, **kwargs)
+    future = concurrent.futures.Future()
+    calls.put((future, function, args, kwargs))
+    return await asyncio.wrap_future(future)
+
+
+async def anotify_llm_observers(**event):
+    if _llm_observers:
+        await run_blocking(notify_llm_observers, **event)
+
+
+def record_cache_event(stage, hit):
+    """Count a response cache hit or miss against the batch in the current llm_context."""
+    batch_id = current_llm_context().get('batch_id')
+    if batch_id is None:
+        return
+    from ..models import BatchCounter
+    BatchCounter.increment(batch_id, f"llm_cache.{stage}.{'hits' if hit else 'misses'}")
+
+
+def cached_response(pipeline_config, provider, model, temperature, messages, stage):
+    """
+    Look up a response in the opt-in cache (enabled per stage with "cache": true).
+
+    Returns:
+        tuple: (cache or None, key or None, cached raw response or None)
+    """
+    if not pipeline_config.get('cache'):
+        return None, None, None
+    cache = get_llm_cache()
+    key = cache_key(provider, model, temperature, messages)
+    raw_response = cache.get(key)
+    record_cache_event(stage or provider, raw_response is not None)
+    return cache, key, raw_response
+
+
+async def acomplete(provider, model, temperature, messages, tokens, mock=None, stats=None):
+    """
+    Send one chat request through the rate limiter and return the raw response text.
+
+    `mock` holds the stage's pipeline config when provider is "mock", which
+    answers offline with the latency and failures configured there. `stats`
+    collects retries and token usage (see RateLimitScheduler.arun).
+    """
+    if provider == 'openai':
+        client = get_async_openai_client()
+        response = await rate_limiter.arun(provider, model, tokens, lambda: client.chat.completions.create(
+            model=model,
+            messages=messages,
+            temperature=temperature
+        ), stats=stats)
+        return response.choices[0].message.content.strip()
+
+    elif provider == 'google':
+        model_instance = get_gemini_model(model)
+        prompt = gemini_prompt(messages)
+        response = await rate_limiter.arun(
+            provider, model, tokens, lambda: model_instance.generate_content_async(prompt), stats=stats
+        )
+        return response.text.strip()
+
+    elif provider == 'mock':
+        options = mock_options(mock)
+        response = await rate_limiter.arun(provider, model, tokens, lambda: mock_llm.acomplete(messages, options),
+                                           stats=stats)
+        return response.text
+
+    raise ValueError(f"Unsupported provider: {provider}")
+
+
+def record_stream_event(stage, outcome):
+    """Count how a streamed response ended ('early_stop', 'complete' or 'budget') against the current batch."""
+    batch_id = current_llm_context().get('batch_id')
+    if batch_id is None:
+        return
+    from ..models import BatchCounter
+    BatchCounter.increment(batch_id, f"llm_stream.{stage}.{outcome}")
+
+
+def stream_budget(pipeline_config):
+    """(max_completion_tokens, max_seconds) for a streaming stage; None means unlimited."""
+    return (
+        pipeline_config.get('max_completion_tokens', getattr(settings, 'LLM_STREAM_MAX_COMPLETION_TOKENS', None)),
+        pipeline_config.get('max_seconds', getattr(settings, 'LLM_STREAM_MAX_SECONDS', None))
+    )
+
+
+async def _aopenai_text(stream, stats):
+    async for chunk in stream:
+        if getattr(chunk, 'usage', None) is not None:
+            record_request_stats(stats, 0, chunk)
+        if chunk.choices and chunk.choices[0].delta.content:
+            yield chunk.choices[0].delta.content
+
+
+async def _agemini_text(response, stats):
+    async for chunk in response:
+        try:
+            yield chunk.text
+        except ValueError:
+            continue
+    record_request_stats(stats, 0, response)
+
+
+async def _amock_text(stream, stats):
+    async for chunk in stream:
+        yield chunk
+    record_request_stats(stats, 0, stream)
+
+
+async def astream_chunks(provider, model, temperature, messages, tokens, timeout=None, mock=None, stats=None):
+    """
+    Open a streaming chat request through the rate limiter.
+
+    Only opening the stream is retried; errors while reading it propagate.
+    Token usage is added to `stats` if the provider reports it at the end.
+
+    Returns:
+        tuple: (async iterator of text chunks, callable returning an awaitable that closes the stream)
+    """
+    if provider == 'openai':
+        client = get_async_openai_client()
+        stream = await rate_limiter.arun(provider, model, tokens, lambda: client.chat.completions.create(
+            model=model,
+            messages=messages,
+            temperature=temperature,
+            stream=True,
+            stream_options={"include_usage": True},
+            **({'timeout': timeout} if timeout else {})
+        ), stats=stats)
+        return _aopenai_text(stream, stats), stream.close
+
+    elif provider == 'google':
+        model_instance = get_gemini_model(model)
+        prompt = gemini_prompt(messages)
+        request_options = {'timeout': timeout} if timeout else None
+        response = await rate_limiter.arun(provider, model, tokens, lambda: model_instance.generate_content_async(
+            prompt, stream=True, request_options=request_options
+        ), stats=stats)
+        chunks = _agemini_text(response, stats)
+        return chunks, chunks.aclose
+
+    elif provider == 'mock':
+        options = mock_options(mock)
+        stream = await rate_limiter.arun(provider, model, tokens, lambda: mock_llm.astream(messages, options),
+                                         stats=stats)
+
+        async def close():
+            stream.close()
+        return _amock_text(stream, stats), close
+
+    raise ValueError(f"Unsupported provider: {provider}")
+
+
+def settle_stream_stats(stats, reader, messages):
+    """Fill in token usage the provider did not report because the stream was cut short."""
+    if stats is None:
+        return
+    if stats.get('completion_tokens') is None:
+        stats['completion_tokens'] = reader.tokens
+    if stats.get('prompt_tokens') is None:
+        stats['prompt_tokens'] = estimate_tokens(messages)
+
+
+async def astream_json(pipeline_config, provider, model, temperature, messages, required_fields, stage=None,
+                       stats=None):
+    """
+    Stream a chat response and parse it as it arrives.
+
+    Reading stops as soon as every field in `required_fields` is complete,
+    and StreamBudgetExceeded is raised once the stage's max_completion_tokens
+    or max_seconds budget runs out first (see stream_budget).
+
+    Returns:
+        tuple: (parsed response dict, raw text to cache)
+    """
+    max_tokens, max_seconds = stream_budget(pipeline_config)
+    reader = StreamReader(required_fields, max_tokens=max_tokens, max_seconds=max_seconds)
+    chunks, close = await astream_chunks(
+        provider, model, temperature, messages, request_tokens(pipeline_config, messages), timeout=max_seconds,
+        mock=pipeline_config, stats=stats
+    )
+    try:
+        async for chunk in chunks:
+            if reader.feed(chunk):
+                break
+    except StreamBudgetExceeded:
+        await run_blocking(record_stream_event, stage or provider, 'budget')
+        raise
+    finally:
+        await close()
+        settle_stream_stats(stats, reader, messages)
+    await run_blocking(record_stream_event, stage or provider, 'early_stop' if reader.stopped_early else 'complete')
+    result = reader.result()
+    return result, json.dumps(result) if reader.stopped_early else reader.text
+
+
+def call_llm(pipeline_config, messages, stage=None, required_fields=None):
     """
     Make a call to the specified LLM provider and model.
+
+    Synchronous wrapper around acall_llm (see run_sync); args and return value are the same.
+    """
+    return run_sync(acall_llm, pipeline_config, messages, stage=stage, required_fields=required_fields)
+
+
+async def acall_llm(pipeline_config, messages, stage=None, required_fields=None):
+    """
+    Make a call to the specified LLM provider and model using the pooled async provider clients.
     
     Args:
         pipeline_config (dict): Configuration containing provider and model information
-            Example: {"provider": "openai", "model": "o3-mini"}
+            Example: {"provider": "openai", "model": "o3-mini", "cache": true}
         messages (list): List of message dictionaries with 'role' and 'content'
+        stage (str, optional): Pipeline stage making the call, used for cache statistics
+        required_fields (list, optional): Response fields the caller needs. With "stream": true in
+            the config, the response is streamed and reading stops once these are complete, or fails
+            once "max_completion_tokens" / "max_seconds" run out first.
         
     Returns:
         dict: The parsed JSON response from the model
     """
+    started = time.perf_counter()
+    cached = False
+    error = None
+    stats = {}
     try:
         provider = pipeline_config['provider'].lower()
         model = pipeline_config['model']
-        
-        if provider == 'openai':
-            client = openai.OpenAI(api_key=settings.OPENAI_API_KEY)
-            response = client.chat.completions.create(
-                model=model,
-                messages=messages,
-                temperature=1.0
+        temperature = pipeline_config.get('temperature', 1.0)
+
+        cache, key, raw_response = None, None, None
+        if pipeline_config.get('cache'):
+            cache, key, raw_response = await run_blocking(
+                cached_response, pipeline_config, provider, model, temperature, messages, stage
+            )
+        if raw_response is not None:
+            cached = True
+            return safe_json_parse(raw_response)
+
+        if pipeline_config.get('stream'):
+            result, raw_response = await astream_json(
+                pipeline_config, provider, model, temperature, messages, required_fields, stage=stage, stats=stats
             )
-            raw_response = response.choices[0].message.content.strip()
-            
-        elif provider == 'google':
-            genai.configure(api_key=settings.GOOGLE_API_KEY)
-            model_instance = genai.GenerativeModel(model)
-            # Convert messages to a single prompt for Gemini
-            prompt = "\n".join([msg["content"] for msg in messages])
-            response = model_instance.generate_content(prompt)
-            raw_response = response.text.strip()
-            
         else:
-            raise ValueError(f"Unsupported provider: {provider}")
-        
-        # Parse the response through safe_json_parse
-        return safe_json_parse(raw_response)
-            
+            raw_response = await acomplete(
+                provider, model, temperature, messages, request_tokens(pipeline_config, messages),
+                mock=pipeline_config, stats=stats
+            )
+            # Parse the response through safe_json_parse
+            result = safe_json_parse(raw_response)
+
+        if cache:
+            await run_blocking(cache.set, key, raw_response)
+        return result
+
     except Exception as e:
+        error = e
         raise Exception(f"Error calling LLM: {str(e)}")
+    finally:
+        await anotify_llm_observers(stage=stage, provider=pipeline_config.get('provider'),
+                                    model=pipeline_config.get('model'), elapsed=time.perf_counter() - started,
+                                    cached=cached, error=error, **stats)
 
 # Example usage:
 if __name__ == "__main__":
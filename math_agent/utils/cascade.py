@@ -0,0 +1,97 @@
+import logging
+from .checker import check_problem
+from .similarity_utils import find_similar_problems
+from .tracing import note_rejection, trace_span
+
+logger = logging.getLogger(__name__)
+
+# Filters in the order they run: local checks first, then the paid embedding and checker calls
+CASCADE_STAGES = ['fingerprint', 'lexical', 'embedding', 'checker']
+DUPLICATE_STAGES = ('fingerprint', 'lexical', 'embedding')
+
+
+class CascadeResult:
+    """Outcome of screening one generated problem."""
+
+    def __init__(self, hints):
+        self.rejected_by = None
+        self.reason = ''
+        self.hints = hints
+        self.embedding = None
+        self.similar_problems = {}
+
+    @property
+    def is_duplicate(self):
+        return self.rejected_by in DUPLICATE_STAGES
+
+
+def record_rejection(batch_id, stage):
+    """Count a cascade rejection against the batch as BatchCounter 'cascade.<stage>.rejected'."""
+    from ..models import BatchCounter
+    BatchCounter.increment(batch_id, f"cascade.{stage}.rejected")
+
+
+def screen_problem(similarity_checker, batch, subject, topic, question, answer, hints, checker_config,
+                   checkpoint=None):
+    """
+    Run a generated problem through the rejection cascade, cheapest filter first.
+
+    1. fingerprint: exact template duplicate (local hash lookup)
+    2. lexical: reworded near-duplicate in the same subject/topic (local MinHash LSH lookup)
+    3. embedding: embedding similarity scan against the corpus (embedding API call)
+    4. checker: LLM validity check
+
+    The first filter that rejects stops the cascade, so later (paid) stages
+    never run for that problem, and the rejection is counted per stage.
+
+    Args:
+        similarity_checker (EnhancedSimilarityChecker): Holds the fingerprint and lexical stores
+        batch (Batch): Batch the rejection counters belong to
+        subject (str): Problem subject
+        topic (str): Problem topic
+        question (str): Generated question
+        answer (str): Generated answer
+        hints (dict): Generated hints
+        checker_config (dict): Pipeline config of the checker stage
+        checkpoint (callable, optional): Called before each paid stage; may raise to abandon the attempt
+
+    Returns:
+        CascadeResult: rejected_by is None when the problem passed every filter
+    """
+    result = CascadeResult(hints)
+
+    def reject(stage, reason):
+        result.rejected_by = stage
+        result.reason = reason
+        record_rejection(batch.id, stage)
+        note_rejection(stage, reason)
+        logger.info(f"Cascade rejected problem at {stage}: {reason}")
+        return result
+
+    with trace_span('similarity'):
+        is_exact, _ = similarity_checker.is_exact_duplicate(question, subject, topic)
+        is_close, jaccard = (False, 0.0) if is_exact else similarity_checker.is_lexical_duplicate(
+            question, subject, topic
+        )
+    if is_exact:
+        return reject('fingerprint', "Exact duplicate of an earlier problem")
+    if is_close:
+        return reject('lexical', f"Near-identical wording to an earlier problem (estimated Jaccard {jaccard:.2f})")
+
+    if checkpoint:
+        checkpoint()
+    result.similar_problems, result.embedding = find_similar_problems(question)
+    is_duplicate, dup_type, similarity_score = similarity_checker.embedding_duplicate(result.similar_problems)
+    if is_duplicate:
+        return reject('embedding', f"Duplicate detected: {dup_type} (similarity: {similarity_score:.3f})")
+    if dup_type == "unique":
+        similarity_checker.cache_problem(question, subject, topic)
+
+    if checkpoint:
+        checkpoint()
+    is_valid, rejection_reason, corrected_hints = check_problem(question, answer, hints, checker_config)
+    if not is_valid:
+        return reject('checker', rejection_reason)
+    if corrected_hints:
+        result.hints = corrected_hints
+    return result
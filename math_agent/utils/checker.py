@@ -30,7 +30,7 @@ def check_problem(question, answer, hints, pipeline_config):
             {"role": "user", "content": json.dumps(input_data)}
         ]
         
-        data = call_llm(pipeline_config, messages)
+        data = call_llm(pipeline_config, messages, stage='checker')
         
         # Extract validation result
         is_valid = data.get('valid', False)
@@ -0,0 +1,59 @@
+import logging
+from collections import Counter
+from django.db.models import Count, F
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+
+def load_checkpoint(batch):
+    """
+    Return the batch's GenerationCheckpoint, or None for a batch that never ran.
+
+    Loading a checkpoint counts as a resume, so `resume_count` is bumped.
+    """
+    from ..models import GenerationCheckpoint
+
+    checkpoint = GenerationCheckpoint.objects.filter(batch_id=batch.id).first()
+    if checkpoint is not None:
+        GenerationCheckpoint.objects.filter(id=checkpoint.id).update(resume_count=F('resume_count') + 1)
+        checkpoint.resume_count += 1
+    return checkpoint
+
+
+def save_checkpoint(batch_id, method, **state):
+    """
+    Write the controller state of a batch (one UPDATE, or an INSERT the first time).
+
+    Args:
+        batch_id (int): Batch being generated
+        method (str): 'traditional' or 'smart'
+        **state: GenerationCheckpoint fields (attempt_count, outcomes, generation_stats, ...)
+    """
+    from ..models import GenerationCheckpoint
+
+    try:
+        updated = GenerationCheckpoint.objects.filter(batch_id=batch_id).update(
+            method=method, updated_at=timezone.now(), **state
+        )
+        if not updated:
+            GenerationCheckpoint.objects.create(batch_id=batch_id, method=method, **state)
+    except Exception as e:
+        # A missed checkpoint only costs attempts on resume; never fail generation over it
+        logger.warning(f"Could not checkpoint batch {batch_id}: {e}")
+
+
+def stored_valid_count(batch):
+    """Valid problems already stored for the batch, read from its counter rather than the in-memory object."""
+    from ..models import Batch
+
+    return Batch.objects.filter(id=batch.id).values_list('valid_count', flat=True).first() or 0
+
+
+def stored_topic_distribution(batch):
+    """Counter of "subject|topic" over the batch's solved and valid problems (one GROUP BY)."""
+    from ..models import Problem
+
+    rows = (Problem.objects.filter(batch_id=batch.id, status__in=['solved', 'valid'])
+            .values('subject', 'topic').annotate(count=Count('id')))
+    return Counter({f"{row['subject']}|{row['topic']}": row['count'] for row in rows})
@@ -1,7 +1,8 @@
 from .similarity_utils import SIMILARITY_THRESHOLD
-from django.core.cache import cache
-import hashlib
-import re
+from .minhash import LEXICAL_THRESHOLD, MinHashLSHIndex, get_minhash_index, minhash_signature
+from .fingerprints import get_fingerprint_filter, normalize_text, problem_fingerprint
+import itertools
+import threading
 import logging
 
 logger = logging.getLogger(__name__)
@@ -9,46 +10,92 @@ logger = logging.getLogger(__name__)
 class EnhancedSimilarityChecker:
     def __init__(self):
         self.similarity_threshold = SIMILARITY_THRESHOLD
-        self.cache_timeout = 30 * 24 * 3600  # 30 days
+        self.lexical_threshold = LEXICAL_THRESHOLD  # Estimated Jaccard similarity of question word bigrams
+        # Problems this checker has passed but that may not be stored (and so in the shared stores) yet
+        self._pending = MinHashLSHIndex()
+        self._pending_ids = itertools.count(-1, -1)
+        self._pending_fingerprints = set()
+        self._pending_lock = threading.Lock()
+        # Preload the Bloom filter so the first attempt does not pay for it
+        self.fingerprints = get_fingerprint_filter()
         
     def create_problem_fingerprint(self, question, subject, topic):
         """Create a fingerprint for exact duplicate detection"""
-        # Normalize the text
-        normalized = self.normalize_text(question)
-        fingerprint_input = f"{subject}|{topic}|{normalized}"
-        return hashlib.md5(fingerprint_input.encode()).hexdigest()
+        return problem_fingerprint(question, subject, topic)
     
     def normalize_text(self, text):
         """Normalize text for better comparison"""
-        if not text:
-            return ""
+        return normalize_text(text)
+    
+    def is_exact_duplicate(self, question, subject, topic):
+        """
+        Check if this is an exact duplicate of a stored or just-cached problem.
         
-        # Convert to lowercase
-        normalized = text.lower()
+        The Bloom filter answers most (negative) lookups in memory, after catching
+        up on problems other processes stored since its last refresh (one
+        primary-key range query that is usually empty); only possible matches are
+        confirmed against the indexed Problem.fingerprint column.
+        """
+        from ..models import Problem
         
-        # Replace numbers with placeholder
-        normalized = re.sub(r'-?\d+\.?\d*', '[NUM]', normalized)
+        fingerprint = self.create_problem_fingerprint(question, subject, topic)
+        with self._pending_lock:
+            if fingerprint in self._pending_fingerprints:
+                return True, fingerprint
         
-        # Remove extra whitespace
-        normalized = re.sub(r'\s+', ' ', normalized).strip()
+        if not self.fingerprints.contains(fingerprint):
+            return False, fingerprint
         
-        return normalized
+        return Problem.objects.filter(fingerprint=fingerprint).exists(), fingerprint
     
-    def is_exact_duplicate(self, question, subject, topic):
-        """Check if this is an exact duplicate using cache"""
+    def cache_problem(self, question, subject, topic):
+        """Remember a problem that passed the duplicate checks until it is stored"""
         fingerprint = self.create_problem_fingerprint(question, subject, topic)
-        cache_key = f"exact_duplicate_{fingerprint}"
+        with self._pending_lock:
+            self._pending_fingerprints.add(fingerprint)
+        self._pending.add(next(self._pending_ids), subject, topic, minhash_signature(question))
+    
+    def lexical_matches(self, question, subject, topic):
+        """
+        Look up near-duplicate wordings in the MinHash LSH index of stored problems
+        and in the problems this checker has cached but not stored yet.
         
-        if cache.get(cache_key):
-            return True, fingerprint
+        Returns:
+            dict: {problem_id: estimated_jaccard, ...}; ids of unstored problems are negative
+        """
+        signature = minhash_signature(question)
+        matches = self._pending.query(signature, subject, topic, self.lexical_threshold)
+        matches.update(get_minhash_index().query(signature, subject, topic, self.lexical_threshold))
+        return matches
+    
+    def is_lexical_duplicate(self, question, subject, topic):
+        """
+        Check for reworded near-duplicates in the same subject and topic, locally and without an embedding call.
         
-        return False, fingerprint
+        Returns:
+            tuple: (is_duplicate, best_estimated_jaccard)
+        """
+        matches = self.lexical_matches(question, subject, topic)
+        best = max(matches.values(), default=0.0)
+        return best >= self.lexical_threshold, best
     
-    def cache_problem(self, question, subject, topic):
-        """Cache problem to prevent future exact duplicates"""
-        _, fingerprint = self.is_exact_duplicate(question, subject, topic)
-        cache_key = f"exact_duplicate_{fingerprint}"
-        cache.set(cache_key, True, self.cache_timeout)
+    def embedding_duplicate(self, existing_similar_problems):
+        """
+        Judge the neighbours found by the embedding search.
+        
+        Returns:
+            tuple: (is_duplicate, duplicate_type, max_similarity)
+        """
+        if existing_similar_problems:
+            max_similarity = max(existing_similar_problems.values())
+            
+            # Check if any similarity is above a stricter threshold for rejection
+            if max_similarity > 0.9:  # Very high similarity
+                return True, "very_similar", max_similarity
+            elif max_similarity > 0.8:  # High similarity
+                logger.warning(f"High similarity detected: {max_similarity:.3f}")
+                return False, "high_similarity", max_similarity
+        return False, "unique", 0.0
     
     def enhanced_similarity_check(self, question, subject, topic, embedding, existing_similar_problems):
         """Enhanced similarity check that works with your existing system"""
@@ -59,15 +106,9 @@ class EnhancedSimilarityChecker:
             return True, "exact_duplicate", 1.0, {}
         
         # 2. If your existing system found similar problems, analyze them
-        if existing_similar_problems:
-            max_similarity = max(existing_similar_problems.values())
-            
-            # Check if any similarity is above a stricter threshold for rejection
-            if max_similarity > 0.9:  # Very high similarity
-                return True, "very_similar", max_similarity, existing_similar_problems
-            elif max_similarity > 0.8:  # High similarity
-                logger.warning(f"High similarity detected: {max_similarity:.3f}")
-                return False, "high_similarity", max_similarity, existing_similar_problems
+        is_duplicate, dup_type, max_similarity = self.embedding_duplicate(existing_similar_problems)
+        if dup_type != "unique":
+            return is_duplicate, dup_type, max_similarity, existing_similar_problems
         
         # 3. Cache this problem for future checks
         self.cache_problem(question, subject, topic)
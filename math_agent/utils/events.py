@@ -0,0 +1,45 @@
+import json
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+def record_batch_event(batch_id, kind, **fields):
+    """
+    Append a BatchEvent carrying the batch's current status counts.
+
+    The counts are read from the denormalized Batch counters, so writing an
+    event costs one indexed read and one insert, and streaming it costs nothing
+    extra. Progress reporting must never fail generation, so errors are logged.
+
+    Returns:
+        BatchEvent or None
+    """
+    from ..models import Batch, BatchEvent
+
+    try:
+        counts = Batch.objects.filter(id=batch_id).values('valid_count', 'solved_count', 'discarded_count').first()
+        return BatchEvent.objects.create(batch_id=batch_id, kind=kind, **(counts or {}), **fields)
+    except Exception as e:
+        logger.warning(f"Could not record {kind} event for batch {batch_id}: {e}")
+        return None
+
+
+def record_attempt_event(trace):
+    """Append the 'attempt' event of a finished AttemptTrace."""
+    return record_batch_event(
+        trace.batch_id, 'attempt', attempt=trace.attempt, stage=trace.stage_reached, status=trace.status,
+        reason=trace.reason or '', problem_id=trace.problem_id
+    )
+
+
+def events_after(batch_id, last_id, limit=200):
+    """Events of a batch with id greater than last_id, oldest first (an index range scan on (batch, id))."""
+    from ..models import BatchEvent
+
+    return list(BatchEvent.objects.filter(batch_id=batch_id, id__gt=last_id).order_by('id')[:limit])
+
+
+def format_sse(event):
+    """Encode an event as a server-sent event; the id lets EventSource resume with Last-Event-ID."""
+    return f"id: {event.id}\nevent: {event.kind}\ndata: {json.dumps(event.as_dict())}\n\n"
@@ -0,0 +1,443 @@
+import gzip
+import json
+import os
+import re
+import zlib
+from datetime import datetime, time as dt_time
+from itertools import islice
+from django.conf import settings
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+
+EXPORT_FORMATS = ('ndjson', 'parquet')
+EXPORT_COMPRESSIONS = ('', 'gzip', 'zstd')
+EXPORT_FIELDS = [
+    'id', 'batch_id', 'batch__name', 'subject', 'topic', 'question', 'answer', 'hints', 'status',
+    'rejection_reason', 'created_at'
+]
+EMBEDDING_FIELDS = ['embedding_vector', 'problem_embedding']
+FILE_EXTENSIONS = {'ndjson': '.ndjson', 'parquet': '.parquet', 'gzip': '.gz', 'zstd': '.zst'}
+# Suffixes read back by file_type_from_name (export_problems --output and import_problems)
+SUFFIX_FORMATS = {'.ndjson': 'ndjson', '.jsonl': 'ndjson', '.json': 'ndjson', '.csv': 'csv', '.parquet': 'parquet'}
+SUFFIX_COMPRESSIONS = {'.gz': 'gzip', '.zst': 'zstd'}
+CONTENT_TYPES = {
+    '.ndjson': 'application/x-ndjson',
+    '.gz': 'application/gzip',
+    '.zst': 'application/zstd',
+    '.parquet': 'application/vnd.apache.parquet'
+}
+
+
+def export_chunk_size():
+    return getattr(settings, 'EXPORT_CHUNK_SIZE', 2000)
+
+
+def _parse_moment(value, name):
+    """Parse an ISO date or datetime filter; a bare date means midnight in the current timezone."""
+    moment = parse_datetime(value)
+    if moment is None:
+        day = parse_date(value)
+        if day is None:
+            raise ValueError(f"{name} must be an ISO date or datetime, got {value!r}")
+        moment = datetime.combine(day, dt_time.min)
+    if timezone.is_naive(moment):
+        moment = timezone.make_aware(moment)
+    return moment
+
+
+def parse_export_filters(params):
+    """
+    Validate export filters given as strings (query parameters or command options).
+
+    Recognised keys: batch, status, subject, created_after (inclusive),
+    created_before (exclusive) and after_id. Missing or empty keys are ignored.
+
+    Returns:
+        dict: Keyword arguments for problem_export_queryset
+    """
+    from ..models import Problem
+
+    filters = {}
+    for name in ('batch', 'after_id'):
+        value = params.get(name)
+        if value not in (None, ''):
+            if not str(value).isdigit():
+                raise ValueError(f"{name} must be a problem or batch id, got {value!r}")
+            filters[name] = int(value)
+    status = params.get('status')
+    if status:
+        statuses = dict(Problem.STATUS_CHOICES)
+        if status not in statuses:
+            raise ValueError(f"status must be one of {', '.join(statuses)}, got {status!r}")
+        filters['status'] = status
+    if params.get('subject'):
+        filters['subject'] = params['subject']
+    for name in ('created_after', 'created_before'):
+        if params.get(name):
+            filters[name] = _parse_moment(params[name], name)
+    return filters
+
+
+def problem_export_queryset(batch=None, status=None, subject=None, created_after=None, created_before=None,
+                            after_id=None):
+    """Problems matching the export filters in id order, so an export can resume after its last id."""
+    from ..models import Problem
+
+    queryset = Problem.objects.all()
+    if batch is not None:
+        queryset = queryset.filter(batch_id=batch)
+    if status:
+        queryset = queryset.filter(status=status)
+    if subject:
+        queryset = queryset.filter(subject=subject)
+    if created_after:
+        queryset = queryset.filter(created_at__gte=created_after)
+    if created_before:
+        queryset = queryset.filter(created_at__lt=created_before)
+    if after_id:
+        queryset = queryset.filter(id__gt=after_id)
+    return queryset.order_by('id')
+
+
+def export_row_chunks(queryset, chunk_size=None, embeddings=False):
+    """
+    Yield lists of export rows, `chunk_size` problems at a time.
+
+    Problems are read with `QuerySet.iterator(chunk_size=...)` over `values()`
+    and each chunk's similarity edges with one extra query, so memory stays
+    bounded by the chunk size however many rows are exported.
+    """
+    from ..models import Problem, ProblemSimilarity
+
+    chunk_size = chunk_size or export_chunk_size()
+    fields = EXPORT_FIELDS + (EMBEDDING_FIELDS if embeddings else [])
+    rows = queryset.values(*fields).iterator(chunk_size=chunk_size)
+    while True:
+        chunk = list(islice(rows, chunk_size))
+        if not chunk:
+            return
+
+        similar = {row['id']: [] for row in chunk}
+        edges = (ProblemSimilarity.objects.filter(src_id__in=list(similar))
+                 .order_by('src_id', '-score').values_list('src_id', 'dst_id', 'score', 'jaccard'))
+        for src_id, dst_id, score, jaccard in edges:
+            similar[src_id].append({'id': dst_id, 'score': score, 'jaccard': jaccard})
+
+        for row in chunk:
+            row['batch_name'] = row.pop('batch__name')
+            row['similar'] = similar[row['id']]
+            if embeddings:
+                embedding = Problem.decode_embedding(row.pop('embedding_vector'), row.pop('problem_embedding'))
+                row['embedding'] = embedding.tolist() if embedding is not None else None
+        yield chunk
+
+
+def ndjson_chunks(row_chunks):
+    """Encode each chunk of rows as NDJSON bytes (one JSON object per line)."""
+    for rows in row_chunks:
+        yield b''.join(
+            json.dumps({**row, 'created_at': row['created_at'].isoformat()}, ensure_ascii=False).encode('utf-8') + b'\n'
+            for row in rows
+        )
+
+
+def _zstd():
+    try:
+        import zstandard
+    except ImportError:
+        raise Exception("Error exporting problems: zstd compression needs the zstandard package (pip install zstandard)")
+    return zstandard
+
+
+def compressed_chunks(chunks, compression):
+    """
+    Compress each chunk as its own gzip member or zstd frame.
+
+    Concatenated members/frames are still one valid .gz/.zst file, and a file
+    cut off mid-write can be resumed from its last complete member (see
+    export_resume_point).
+    """
+    if not compression:
+        yield from chunks
+    elif compression == 'gzip':
+        for chunk in chunks:
+            yield gzip.compress(chunk, compresslevel=6, mtime=0)
+    elif compression == 'zstd':
+        compressor = _zstd().ZstdCompressor(level=3)
+        for chunk in chunks:
+            yield compressor.compress(chunk)
+    else:
+        raise ValueError(f"compression must be one of gzip, zstd, got {compression!r}")
+
+
+class _ChunkSink:
+    """Write-only file object that hands back whatever was written since the last take()."""
+
+    def __init__(self):
+        self._parts = []
+        self._position = 0
+        self.closed = False
+
+    def write(self, data):
+        self._parts.append(bytes(data))
+        self._position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self._position
+
+    def flush(self):
+        pass
+
+    def writable(self):
+        return True
+
+    def close(self):
+        self.closed = True
+
+    def take(self):
+        data, self._parts = b''.join(self._parts), []
+        return data
+
+
+def _pyarrow():
+    try:
+        import pyarrow
+        import pyarrow.parquet
+    except ImportError:
+        raise Exception("Error exporting problems: Parquet export needs the pyarrow package (pip install pyarrow)")
+    return pyarrow, pyarrow.parquet
+
+
+def parquet_chunks(row_chunks, embeddings=False):
+    """
+    Encode row chunks as one Parquet file, one row group per chunk.
+
+    Bytes are yielded as each row group is written, so the file never sits in
+    memory. Hints are stored as JSON strings since their keys vary per problem.
+    """
+    pa, pq = _pyarrow()
+    columns = [
+        ('id', pa.int64()), ('batch_id', pa.int64()), ('batch_name', pa.string()), ('subject', pa.string()),
+        ('topic', pa.string()), ('question', pa.string()), ('answer', pa.string()), ('hints', pa.string()),
+        ('status', pa.string()), ('rejection_reason', pa.string()), ('created_at', pa.timestamp('us', tz='UTC')),
+        ('similar', pa.list_(pa.struct([('id', pa.int64()), ('score', pa.float64()), ('jaccard', pa.float64())])))
+    ]
+    if embeddings:
+        columns.append(('embedding', pa.list_(pa.float32())))
+    schema = pa.schema(columns)
+
+    sink = _ChunkSink()
+    writer = pq.ParquetWriter(sink, schema, compression='zstd')
+    for rows in row_chunks:
+        for row in rows:
+            row['hints'] = json.dumps(row['hints'], ensure_ascii=False)
+        writer.write_table(pa.Table.from_pylist(rows, schema=schema))
+        data = sink.take()
+        if data:
+            yield data
+    writer.close()
+    yield sink.take()
+
+
+def export_stream(queryset, format='ndjson', compression='', chunk_size=None, embeddings=False):
+    """Bytes of a whole export, produced chunk by chunk."""
+    if format not in EXPORT_FORMATS:
+        raise ValueError(f"format must be one of {', '.join(EXPORT_FORMATS)}, got {format!r}")
+    if compression not in EXPORT_COMPRESSIONS:
+        raise ValueError(f"compression must be one of gzip, zstd, got {compression!r}")
+    # Fail before the first byte is sent if an optional package is missing
+    if format == 'parquet':
+        _pyarrow()
+    elif compression == 'zstd':
+        _zstd()
+    row_chunks = export_row_chunks(queryset, chunk_size=chunk_size, embeddings=embeddings)
+    if format == 'parquet':
+        # Parquet compresses its column chunks itself
+        return parquet_chunks(row_chunks, embeddings=embeddings)
+    return compressed_chunks(ndjson_chunks(row_chunks), compression)
+
+
+def file_type_from_name(path):
+    """
+    The format and compression a file name implies, e.g. ('ndjson', 'gzip') for problems.ndjson.gz.
+
+    Returns:
+        tuple: (format or None when the suffix is not a known one, compression or '')
+    """
+    root, ext = os.path.splitext(os.path.basename(path).lower())
+    compression = SUFFIX_COMPRESSIONS.get(ext, '')
+    if compression:
+        ext = os.path.splitext(root)[1]
+    return SUFFIX_FORMATS.get(ext), compression
+
+
+def export_file_type(path, format=None, compression=None):
+    """
+    Settle the format and compression of an export written to `path`.
+
+    A known suffix decides both; explicit `format` / `compression` must agree
+    with it, so a file is never named for one encoding and written in another.
+    Names without a known suffix use the explicit values (default NDJSON).
+
+    Returns:
+        tuple: (format, compression)
+    """
+    suffix_format, suffix_compression = file_type_from_name(path)
+    if suffix_format is None:
+        if suffix_compression:
+            raise ValueError(f"{path} ends in {FILE_EXTENSIONS[suffix_compression]} but not .ndjson/.jsonl; "
+                             f"name it like problems.ndjson{FILE_EXTENSIONS[suffix_compression]}")
+        format = format or 'ndjson'
+        compression = compression or ''
+    else:
+        if suffix_format not in EXPORT_FORMATS:
+            raise ValueError(f"{path} names a {suffix_format} file; exports are {', '.join(EXPORT_FORMATS)}")
+        if format and format != suffix_format:
+            raise ValueError(f"--format {format} contradicts the {suffix_format} suffix of {path}")
+        if compression is not None and compression != suffix_compression:
+            expected = f"a {compression} suffix ({FILE_EXTENSIONS[compression]})" if compression else "no compression suffix"
+            raise ValueError(f"--compression {compression or 'none'} needs {expected} on {path}")
+        format, compression = suffix_format, suffix_compression
+    if format == 'parquet' and compression:
+        raise ValueError("Parquet output is compressed internally; drop the compression suffix/option")
+    return format, compression
+
+
+def export_filename(format='ndjson', compression=''):
+    """Default export file name, e.g. problems_20250101_120000.ndjson.gz."""
+    name = f"problems_{timezone.now().strftime('%Y%m%d_%H%M%S')}{FILE_EXTENSIONS[format]}"
+    if format == 'ndjson' and compression:
+        name += FILE_EXTENSIONS[compression]
+    return name
+
+
+def export_resume_point(path, compression=''):
+    """
+    Find where an interrupted NDJSON export can continue.
+
+    Scans the file (decompressing gzip members or zstd frames one at a time)
+    for the last complete line.
+
+    Returns:
+        tuple: (byte offset to truncate the file to, id of the last exported problem or None)
+    """
+    if compression == 'gzip':
+        new_decompressor = lambda: zlib.decompressobj(wbits=31)
+    elif compression == 'zstd':
+        zstandard = _zstd()
+        new_decompressor = lambda: zstandard.ZstdDecompressor().decompressobj()
+    else:
+        new_decompressor = None
+
+    good_offset, last_line = 0, b''
+    with open(path, 'rb') as f:
+        if new_decompressor is None:
+            offset, line = 0, b''
+            for line in f:
+                if not line.endswith(b'\n'):
+                    break
+                offset += len(line)
+                good_offset, last_line = offset, line
+        else:
+            read, pending, tail = 0, b'', b''
+            decompressor = new_decompressor()
+            while True:
+                block = pending or f.read(1 << 20)
+                if not pending:
+                    read += len(block)
+                pending = b''
+                if not block:
+                    break
+                try:
+                    tail += decompressor.decompress(block)
+                except Exception:
+                    break  # A corrupt trailing member: keep what came before it
+                cut = tail.rfind(b'\n', 0, len(tail) - 1)
+                if cut >= 0:
+                    tail = tail[cut + 1:]
+                if decompressor.eof:
+                    pending = decompressor.unused_data
+                    good_offset, last_line = read - len(pending), tail
+                    decompressor, tail = new_decompressor(), b''
+
+    last_id = json.loads(last_line)['id'] if last_line.strip() else None
+    return good_offset, last_id
+
+
+def write_export(path, queryset, format='ndjson', compression='', chunk_size=None, embeddings=False,
+                 append=False, progress_callback=None):
+    """
+    Write an export to a file with constant memory.
+
+    Args:
+        path (str): Output file
+        queryset (QuerySet): Problems to export, from problem_export_queryset
+        append (bool): Append to an existing NDJSON export (after truncating it with export_resume_point)
+        progress_callback (callable, optional): Called as progress_callback(bytes_written) after each chunk
+
+    Returns:
+        int: Bytes written
+    """
+    written = 0
+    with open(path, 'ab' if append else 'wb') as f:
+        for data in export_stream(queryset, format, compression, chunk_size=chunk_size, embeddings=embeddings):
+            f.write(data)
+            written += len(data)
+            if progress_callback:
+                progress_callback(written)
+    return written
+
+
+def export_root():
+    return str(getattr(settings, 'EXPORT_ROOT', os.path.join(settings.BASE_DIR, 'exports')))
+
+
+def export_file_path(name):
+    """Path of an export file served from EXPORT_ROOT, or None if the name is not a plain existing file."""
+    if not re.fullmatch(r'[\w.-]+', name) or name.startswith('.'):
+        return None
+    path = os.path.join(export_root(), name)
+    return path if os.path.isfile(path) else None
+
+
+def content_type_for(name):
+    return CONTENT_TYPES.get(os.path.splitext(name)[1], 'application/octet-stream')
+
+
+def parse_range(header, size):
+    """
+    Parse a single-range "bytes=" Range header.
+
+    Returns:
+        tuple or None: (start, end) inclusive, None for a header to ignore
+    Raises:
+        ValueError: If the range cannot be satisfied
+    """
+    match = re.fullmatch(r'bytes=(\d*)-(\d*)', header.strip())
+    if not match or match.group(1) == match.group(2) == '':
+        return None  # Malformed or multi-range: serve the whole file
+    first, last = match.groups()
+    if first == '':
+        length = int(last)
+        if length == 0:
+            raise ValueError("empty suffix range")
+        return max(0, size - length), size - 1
+    start = int(first)
+    end = min(int(last), size - 1) if last else size - 1
+    if start >= size or start > end:
+        raise ValueError("range starts past the end of the file")
+    return start, end
+
+
+def file_range_chunks(path, start, end, block_size=1 << 16):
+    """Yield bytes start..end (inclusive) of a file in blocks."""
+    with open(path, 'rb') as f:
+        f.seek(start)
+        remaining = end - start + 1
+        while remaining > 0:
+            block = f.read(min(block_size, remaining))
+            if not block:
+                return
+            remaining -= len(block)
+            yield block
@@ -0,0 +1,157 @@
+import hashlib
+import math
+import re
+import threading
+import logging
+
+logger = logging.getLogger(__name__)
+
+BLOOM_CAPACITY = 100000  # fingerprints in the first filter before a larger one is chained on
+BLOOM_ERROR_RATE = 0.001
+
+
+def normalize_text(text):
+    """Lowercase, mask numbers and collapse whitespace so template variations compare equal."""
+    if not text:
+        return ""
+    normalized = re.sub(r'-?\d+\.?\d*', '[NUM]', text.lower())
+    return re.sub(r'\s+', ' ', normalized).strip()
+
+
+def problem_fingerprint(question, subject, topic):
+    """MD5 of subject, topic and normalized question, stored in Problem.fingerprint."""
+    return hashlib.md5(f"{subject}|{topic}|{normalize_text(question)}".encode()).hexdigest()
+
+
+class BloomFilter:
+    """Fixed-size Bloom filter over strings, using double hashing of one blake2b digest."""
+
+    def __init__(self, capacity, error_rate=BLOOM_ERROR_RATE):
+        self.capacity = max(1, capacity)
+        self.error_rate = error_rate
+        self.size = max(8, math.ceil(-self.capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.hash_count = max(1, round(self.size / self.capacity * math.log(2)))
+        self.bits = bytearray((self.size + 7) // 8)
+        self.count = 0
+
+    def _positions(self, key):
+        digest = hashlib.blake2b(key.encode('utf-8'), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], 'little')
+        h2 = int.from_bytes(digest[8:], 'little') | 1
+        return ((h1 + i * h2) % self.size for i in range(self.hash_count))
+
+    def add(self, key):
+        for position in self._positions(key):
+            self.bits[position >> 3] |= 1 << (position & 7)
+        self.count += 1
+
+    def __contains__(self, key):
+        return all(self.bits[position >> 3] & (1 << (position & 7)) for position in self._positions(key))
+
+    @property
+    def nbytes(self):
+        return len(self.bits)
+
+
+class FingerprintFilter:
+    """
+    In-process Bloom filter over every stored problem fingerprint.
+
+    The filter only knows the rows up to its last load or refresh and those
+    added through post_save in this process; problems stored by other workers
+    or an import process since are picked up by `refresh()`, which reads rows
+    past the highest id seen. `contains()` refreshes before trusting a miss,
+    so a negative is never stale; a hit only means "maybe" and is confirmed
+    against the indexed Problem.fingerprint column. When a filter fills up,
+    one with twice the capacity and half the error rate is chained on (a
+    scalable Bloom filter), so the overall false positive rate stays below
+    twice error_rate without a reload. Deleted problems stay in the filter and only cost an extra query.
+    """
+
+    def __init__(self, capacity=BLOOM_CAPACITY, error_rate=BLOOM_ERROR_RATE):
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self._lock = threading.Lock()
+        self._refresh_lock = threading.Lock()
+        self._filters = [BloomFilter(capacity, error_rate)]
+        self._last_id = 0
+
+    def __len__(self):
+        return sum(bloom.count for bloom in self._filters)
+
+    @property
+    def nbytes(self):
+        return sum(bloom.nbytes for bloom in self._filters)
+
+    def load(self):
+        """(Re)build the filter from every stored fingerprint."""
+        with self._lock:
+            self._filters = [BloomFilter(self.capacity, self.error_rate)]
+            self._last_id = 0
+        self.refresh()
+        logger.info(f"Fingerprint filter loaded with {len(self)} fingerprints ({self.nbytes} bytes)")
+
+    def refresh(self):
+        """
+        Add the fingerprints of problems stored since the last load or refresh, by any process.
+
+        Returns:
+            int: Number of fingerprints added
+        """
+        from ..models import Problem
+
+        added = 0
+        with self._refresh_lock:
+            rows = (Problem.objects.filter(id__gt=self._last_id).exclude(fingerprint='')
+                    .order_by('id').values_list('id', 'fingerprint'))
+            for problem_id, fingerprint in rows.iterator(chunk_size=5000):
+                self.add(fingerprint)
+                self._last_id = problem_id
+                added += 1
+        return added
+
+    def add(self, fingerprint):
+        if not fingerprint:
+            return
+        with self._lock:
+            last = self._filters[-1]
+            if last.count >= last.capacity:
+                self._filters.append(BloomFilter(last.capacity * 2, last.error_rate / 2))
+            self._filters[-1].add(fingerprint)
+
+    def might_contain(self, fingerprint):
+        return any(fingerprint in bloom for bloom in self._filters)
+
+    def contains(self, fingerprint):
+        """Like might_contain, but catches up on rows stored elsewhere before reporting a miss."""
+        if self.might_contain(fingerprint):
+            return True
+        return bool(self.refresh()) and self.might_contain(fingerprint)
+
+
+_filter = None
+_filter_lock = threading.Lock()
+
+
+def get_fingerprint_filter():
+    """Return the process-wide fingerprint filter, loading it from the database on first use."""
+    global _filter
+    if _filter is None:
+        with _filter_lock:
+            if _filter is None:
+                fingerprint_filter = FingerprintFilter()
+                fingerprint_filter.load()
+                _filter = fingerprint_filter
+    return _filter
+
+
+def peek_fingerprint_filter():
+    """Return the process-wide fingerprint filter if it has been loaded, without loading it."""
+    return _filter
+
+
+def reset_fingerprint_filter():
+    """Forget the process-wide filter so the next get_fingerprint_filter() reloads it."""
+    global _filter
+    with _filter_lock:
+        _filter = None
@@ -1,20 +1,22 @@
 import json
+import threading
+from collections import deque
 from django.conf import settings
-from .system_messages import GENERATOR_MESSAGE
+from .system_messages import GENERATOR_MESSAGE, GENERATOR_BATCH_MESSAGE
 from .call_llm_clients import call_llm
 from .similarity_utils import find_similar_problems
 
-def generate_problem(pipeline_config, taxonomy=None):
+def generate_problem_text(pipeline_config, taxonomy=None):
     """
-    Generate a math problem using the specified model.
-    
+    Generate a math problem without embedding it.
+
     Args:
         pipeline_config (dict): Configuration containing provider and model information
             Example: {"provider": "openai", "model": "o3-mini"}
         taxonomy (dict, optional): Dictionary containing subject and topic
         
     Returns:
-        tuple: (question, answer, hints, embedding, similar_problems)
+        tuple: (question, answer, hints)
     """
     try:
         # Prepare the prompt based on taxonomy
@@ -30,7 +32,7 @@ def generate_problem(pipeline_config, taxonomy=None):
         ]
         
         # Call the model using our centralized client
-        data = call_llm(pipeline_config, messages)
+        data = call_llm(pipeline_config, messages, stage='generator', required_fields=['problem', 'answer', 'hints'])
         
         # Extract question, answer, and hints
         question = data.get('problem', '')
@@ -40,10 +42,149 @@ def generate_problem(pipeline_config, taxonomy=None):
         if not question or not answer or not hints:
             raise ValueError("Invalid response: missing problem, answer, or hints")
         
-        # Similarity check
-        similar_problems, embedding = find_similar_problems(question)
+        return question, answer, hints
         
-        return question, answer, hints, embedding, similar_problems
+    except Exception as e:
+        raise Exception(f"Error generating problem: {str(e)}")
+
+def parse_generated_problem(item, taxonomies, index):
+    """
+    Validate one item of a multi-problem response.
+
+    The item keeps its own subject/topic when they match a requested entry;
+    otherwise it is attributed to the entry at its position.
+
+    Returns:
+        tuple: (subject, topic, question, answer, hints)
+    """
+    if not isinstance(item, dict):
+        raise ValueError("item is not an object")
+    question = item.get('problem', '')
+    answer = item.get('answer', '')
+    hints = item.get('hints', {})
+    if not isinstance(question, str) or not question.strip() or answer in (None, ''):
+        raise ValueError("missing problem or answer")
+    if not isinstance(hints, dict) or not hints:
+        raise ValueError("missing hints")
+
+    requested = (item.get('subject'), item.get('topic'))
+    subject, topic = requested if requested in taxonomies else taxonomies[min(index, len(taxonomies) - 1)]
+    return subject, topic, question, str(answer), hints
+
+
+def generate_problems_text(pipeline_config, taxonomies):
+    """
+    Generate several math problems with a single generator call.
+
+    Each item of the response is validated on its own, so a malformed item
+    is skipped without discarding the others.
+
+    Args:
+        pipeline_config (dict): Configuration containing provider and model information
+        taxonomies (list): (subject, topic) pairs, one per requested problem (entries may repeat)
+
+    Returns:
+        list: (subject, topic, question, answer, hints) for every well-formed item
+    """
+    try:
+        entries = "\n".join(
+            f"{number}. {subject} under the topic '{topic}'" for number, (subject, topic) in enumerate(taxonomies, 1)
+        )
+        user_prompt = f"Generate {len(taxonomies)} distinct math problems, one for each taxonomy entry:\n{entries}"
+        messages = [
+            {"role": "system", "content": GENERATOR_BATCH_MESSAGE},
+            {"role": "user", "content": user_prompt}
+        ]
+
+        # Reserve completion tokens for every problem, not just one
+        per_problem = pipeline_config.get('expected_completion_tokens', 1000)
+        config = {**pipeline_config, 'expected_completion_tokens': per_problem * len(taxonomies)}
+        data = call_llm(config, messages, stage='generator', required_fields=['problems'])
+
+        items = data.get('problems')
+        if not isinstance(items, list):
+            raise ValueError("Invalid response: missing problems list")
+    except Exception as e:
+        raise Exception(f"Error generating problems: {str(e)}")
+
+    problems = []
+    for index, item in enumerate(items):
+        try:
+            problems.append(parse_generated_problem(item, taxonomies, index))
+        except ValueError as e:
+            print(f"Skipping malformed generated problem {index + 1}/{len(items)}: {e}")
+    return problems
+
+
+class GeneratedProblemQueue:
+    """
+    Hands generated problems to attempts one at a time.
+
+    With `problems_per_call` K > 1 in the generator config, an attempt that
+    finds the queue empty asks the generator for K problems and leaves the
+    other K - 1 for the next attempts. With `mix_topics` the extra problems get
+    their own taxonomy entries from `pick_taxonomy`; otherwise they share the
+    attempt's. The generator call runs outside the lock, so concurrent
+    attempts can refill in parallel.
+    """
+
+    def __init__(self, pipeline_config, pick_taxonomy):
+        self.pipeline_config = pipeline_config
+        self.problems_per_call = max(1, int(pipeline_config.get('problems_per_call') or 1))
+        self.mix_topics = bool(pipeline_config.get('mix_topics', False))
+        self.pick_taxonomy = pick_taxonomy
+        self._pending = deque()
+        self._lock = threading.Lock()
+
+    def next(self, subject, topic):
+        """
+        Return the next generated problem, generating for (subject, topic) if none is queued.
+
+        Returns:
+            tuple: (subject, topic, question, answer, hints)
+        """
+        with self._lock:
+            if self._pending:
+                return self._pending.popleft()
+
+        if self.problems_per_call == 1:
+            question, answer, hints = generate_problem_text(
+                self.pipeline_config, taxonomy={"subject": subject, "topic": topic}
+            )
+            return subject, topic, question, answer, hints
+
+        taxonomies = [(subject, topic)] + [
+            self.pick_taxonomy() if self.mix_topics else (subject, topic) for _ in range(self.problems_per_call - 1)
+        ]
+        problems = generate_problems_text(self.pipeline_config, taxonomies)
+        if not problems:
+            raise Exception("Error generating problems: no well-formed problem in the response")
+        with self._lock:
+            self._pending.extend(problems[1:])
+        return problems[0]
+
+    def __len__(self):
+        return len(self._pending)
+
+
+def generate_problem(pipeline_config, taxonomy=None):
+    """
+    Generate a math problem using the specified model.
+    
+    Args:
+        pipeline_config (dict): Configuration containing provider and model information
+            Example: {"provider": "openai", "model": "o3-mini"}
+        taxonomy (dict, optional): Dictionary containing subject and topic
         
+    Returns:
+        tuple: (question, answer, hints, embedding, similar_problems)
+    """
+    question, answer, hints = generate_problem_text(pipeline_config, taxonomy=taxonomy)
+    
+    try:
+        # Similarity check
+        similar_problems, embedding = find_similar_problems(question)
     except Exception as e:
-        raise Exception(f"Error generating problem: {str(e)}") 
\ No newline at end of file
+        raise Exception(f"Error generating problem: {str(e)}")
+    
+    return question, answer, hints, embedding, similar_problems
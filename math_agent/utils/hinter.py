@@ -38,7 +38,7 @@ def generate_hints(question, answer, pipeline_config):
         while True:
             retries += 1
             try:
-                result = call_llm(pipeline_config, messages)
+                result = call_llm(pipeline_config, messages, stage='hinter')
                 hints = result.get("hints", {})
 
                 if isinstance(hints, list):  # sanitize if needed
@@ -0,0 +1,499 @@
+import csv
+import gzip
+import io
+import json
+import os
+import time
+from contextlib import contextmanager
+from itertools import islice
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+from .export import file_type_from_name
+from .fingerprints import peek_fingerprint_filter, problem_fingerprint
+from .minhash import decode_signature, encode_signature, estimated_jaccard, minhash_signature, peek_minhash_index
+from .similarity_utils import SIMILARITY_THRESHOLD, fetch_embeddings
+from .vector_index import get_vector_index, peek_vector_index
+
+IMPORT_FORMATS = ('ndjson', 'csv')
+LOOKUP_CHUNK = 500  # ids/fingerprints per IN (...) query, well under SQLite's variable limit
+
+
+def import_chunk_size():
+    return getattr(settings, 'IMPORT_CHUNK_SIZE', 1000)
+
+
+def import_file_type(path, format=None):
+    """
+    Work out the format and compression of an import file from its name.
+
+    Uses the same suffix rules as export_problems --output, so an export
+    file is read back the way it was written.
+
+    Returns:
+        tuple: (format, compression), e.g. ('ndjson', 'gzip') for problems.ndjson.gz
+    """
+    suffix_format, compression = file_type_from_name(path)
+    format = format or suffix_format
+    if format not in IMPORT_FORMATS:
+        raise ValueError(f"Cannot import {path} as {format or 'an unknown format'}; use one of {', '.join(IMPORT_FORMATS)}")
+    if format == 'csv' and compression:
+        raise ValueError("Compressed CSV is not supported; decompress it or use NDJSON")
+    return format, compression
+
+
+def _zstd():
+    try:
+        import zstandard
+    except ImportError:
+        raise Exception("Error importing problems: zstd files need the zstandard package (pip install zstandard)")
+    return zstandard
+
+
+@contextmanager
+def open_import_file(path, compression=''):
+    """Open an import file as text, decompressing gzip members or zstd frames on the fly."""
+    if compression == 'gzip':
+        f = gzip.open(path, 'rt', encoding='utf-8', newline='')
+    elif compression == 'zstd':
+        raw = open(path, 'rb')
+        # Exports write one frame per chunk, so keep reading across frame boundaries
+        reader = _zstd().ZstdDecompressor().stream_reader(raw, read_across_frames=True)
+        f = io.TextIOWrapper(reader, encoding='utf-8', newline='')
+    else:
+        f = open(path, 'r', encoding='utf-8', newline='')
+    try:
+        yield f
+    finally:
+        f.close()
+
+
+def read_import_rows(f, format):
+    """Yield (line number, raw row dict or error message) for each record of an open import file."""
+    if format == 'csv':
+        reader = csv.DictReader(f)
+        for row in reader:
+            yield reader.line_num, row
+        return
+    for number, line in enumerate(f, 1):
+        if not line.strip():
+            continue
+        try:
+            row = json.loads(line)
+        except ValueError as e:
+            yield number, f"invalid JSON ({e})"
+            continue
+        yield number, row if isinstance(row, dict) else "not a JSON object"
+
+
+def _json_field(value):
+    """CSV cells hold hints and embeddings as JSON text; NDJSON already decoded them."""
+    if isinstance(value, str):
+        value = value.strip()
+        if not value:
+            return None
+        try:
+            return json.loads(value)
+        except ValueError:
+            return value
+    return value
+
+
+def parse_import_row(row, default_status='valid'):
+    """
+    Validate one import record and map it onto Problem fields.
+
+    Accepts the rows written by export_problems as well as hand-made files:
+    `question` (or `problem`), `answer`, `subject` and `topic` are required;
+    `hints` may be a dict, a list or plain text; `status` defaults to
+    `default_status`; `embedding` is an optional list of floats.
+
+    Returns:
+        dict: subject, topic, question, answer, hints, status, rejection_reason and embedding
+    """
+    from ..models import Problem
+
+    if not isinstance(row, dict):
+        raise ValueError(row)
+    fields = {}
+    for name, aliases in (('question', ('question', 'problem')), ('answer', ('answer',)),
+                          ('subject', ('subject',)), ('topic', ('topic',))):
+        value = next((row[alias] for alias in aliases if row.get(alias) not in (None, '')), None)
+        if value is None:
+            raise ValueError(f"missing {name}")
+        fields[name] = str(value).strip()
+
+    hints = _json_field(row.get('hints'))
+    if isinstance(hints, list):
+        hints = {str(i): hint for i, hint in enumerate(hints)}
+    elif hints is not None and not isinstance(hints, dict):
+        hints = {"0": str(hints)}
+    fields['hints'] = hints or {}
+
+    status = row.get('status') or default_status
+    if status not in dict(Problem.STATUS_CHOICES):
+        raise ValueError(f"unknown status {status!r}")
+    fields['status'] = status
+    fields['rejection_reason'] = row.get('rejection_reason') or None
+
+    embedding = _json_field(row.get('embedding'))
+    if embedding is not None:
+        if not isinstance(embedding, list) or not embedding:
+            raise ValueError("embedding must be a non-empty list of numbers")
+        try:
+            embedding = [float(x) for x in embedding]
+        except (TypeError, ValueError):
+            raise ValueError("embedding must be a non-empty list of numbers")
+    fields['embedding'] = embedding
+    return fields
+
+
+def import_batch(path, batch_id=None):
+    """
+    The batch imported problems are stored under.
+
+    Without `batch_id`, the batch of an earlier import of the same file is
+    reused, so rerunning an interrupted import continues filling it;
+    otherwise a new import batch is created.
+    """
+    from ..models import Batch
+
+    if batch_id is not None:
+        batch = Batch.objects.filter(id=batch_id).first()
+        if batch is None:
+            raise Exception(f"Error importing problems: batch {batch_id} does not exist")
+        return batch
+
+    path = os.path.abspath(path)
+    batch = Batch.objects.filter(pipeline__source='import', pipeline__path=path).order_by('-id').first()
+    if batch is None:
+        batch = Batch.objects.create(
+            name=f"Import_{os.path.basename(path)}_{timezone.now().strftime('%Y%m%d_%H%M%S')}",
+            taxonomy_json={},
+            pipeline={'source': 'import', 'path': path},
+            number_of_valid_needed=1
+        )
+    return batch
+
+
+def finish_import_batch(batch):
+    """Fill an import batch's taxonomy and quota from what it now holds, so it reads as complete."""
+    from ..models import Batch
+
+    if not batch.is_import:
+        return
+    taxonomy = {}
+    for subject, topic in batch.problems.values_list('subject', 'topic').distinct().order_by('subject', 'topic'):
+        taxonomy.setdefault(subject, []).append(topic)
+    valid_count = Batch.objects.filter(id=batch.id).values_list('valid_count', flat=True).first() or 0
+    Batch.objects.filter(id=batch.id).update(taxonomy_json=taxonomy, number_of_valid_needed=max(1, valid_count))
+
+
+def content_key(record):
+    """Exact identity of an imported problem: subject, topic and question text as given."""
+    return record['subject'], record['topic'], record['question']
+
+
+def stored_contents(records):
+    """
+    The content keys of `records` (content_key -> record) already stored on some problem.
+
+    The fingerprint masks numbers, so it only narrows the lookup through its
+    index; problems that differ in their constants are told apart by the
+    exact text.
+    """
+    from ..models import Problem
+
+    fingerprints = list({record['fingerprint'] for record in records.values()})
+    found = set()
+    for start in range(0, len(fingerprints), LOOKUP_CHUNK):
+        candidates = (Problem.objects.filter(fingerprint__in=fingerprints[start:start + LOOKUP_CHUNK])
+                      .values_list('subject', 'topic', 'question'))
+        found.update(key for key in candidates if key in records)
+    return found
+
+
+def stored_embedding_dimension():
+    """Dimension of the embeddings already stored, or None for an empty corpus."""
+    from ..models import Problem
+
+    index = peek_vector_index()
+    if index is not None and index.dimension:
+        return index.dimension
+    embedding_vector = (Problem.objects.filter(embedding_vector__isnull=False)
+                        .values_list('embedding_vector', flat=True).first())
+    if embedding_vector is None:
+        return None
+    return len(Problem.decode_embedding(embedding_vector))
+
+
+def seed_dedupe_indexes(problems):
+    """
+    Add stored problems to whichever in-process dedupe structures are loaded.
+
+    bulk_create skips the post_save signals that normally keep the vector
+    index, MinHash LSH index and fingerprint Bloom filter current, so bulk
+    inserts call this once per chunk instead.
+    """
+    vector_index = peek_vector_index()
+    minhash_index = peek_minhash_index()
+    fingerprint_filter = peek_fingerprint_filter()
+    for problem in problems:
+        if vector_index is not None:
+            vector_index.add(problem.id, problem.embedding)
+        if minhash_index is not None:
+            minhash_index.add(problem.id, problem.subject, problem.topic, decode_signature(problem.minhash_signature))
+        if fingerprint_filter is not None:
+            fingerprint_filter.add(problem.fingerprint)
+
+
+def seed_imported_problems(after_id=0):
+    """
+    Catch a long-running process up on problems imported by another one.
+
+    Returns:
+        int: Highest problem id seen, to pass as `after_id` next time
+    """
+    from ..models import Problem
+
+    problems = (Problem.objects.filter(batch__pipeline__source='import', id__gt=after_id).order_by('id')
+                .only('id', 'subject', 'topic', 'fingerprint', 'minhash_signature', 'embedding_vector',
+                      'problem_embedding'))
+    for problem in problems.iterator(chunk_size=2000):
+        seed_dedupe_indexes([problem])
+        after_id = problem.id
+    return after_id
+
+
+def link_imported_problems(problems, threshold=SIMILARITY_THRESHOLD, top_k=10):
+    """
+    Record similarity edges between newly imported problems and the rest of the corpus.
+
+    Each problem is searched in the vector index (which already holds the
+    chunk, so near-duplicates inside the file are linked too), neighbour
+    signatures are read in one query per LOOKUP_CHUNK ids and every edge,
+    in both directions, goes into a single bulk_create.
+
+    Returns:
+        int: Edges written
+    """
+    from ..models import Problem, ProblemSimilarity
+
+    index = get_vector_index()
+    matches = {}
+    for problem in problems:
+        embedding = problem.embedding
+        if embedding is not None:
+            matches[problem.id] = index.search(embedding, threshold=threshold, top_k=top_k, exclude_ids=[problem.id])
+
+    own = {problem.id: problem.minhash_signature for problem in problems}
+    neighbour_ids = list({sim_id for scores in matches.values() for sim_id in scores} - set(own))
+    signatures = dict(own)
+    for start in range(0, len(neighbour_ids), LOOKUP_CHUNK):
+        signatures.update(Problem.objects.filter(id__in=neighbour_ids[start:start + LOOKUP_CHUNK])
+                          .values_list('id', 'minhash_signature'))
+
+    edges = {}  # (src, dst) -> edge; pairs inside the chunk are found from both ends
+    for problem_id, scores in matches.items():
+        signature = decode_signature(signatures[problem_id])
+        for sim_id, score in scores.items():
+            if sim_id not in signatures or (problem_id, sim_id) in edges:
+                continue  # Deleted since the index was loaded, or already linked from the other end
+            jaccard = estimated_jaccard(signature, decode_signature(signatures[sim_id]))
+            edges[(problem_id, sim_id)] = ProblemSimilarity(src_id=problem_id, dst_id=sim_id, score=score, jaccard=jaccard)
+            edges[(sim_id, problem_id)] = ProblemSimilarity(src_id=sim_id, dst_id=problem_id, score=score, jaccard=jaccard)
+    if edges:
+        ProblemSimilarity.objects.bulk_create(list(edges.values()), batch_size=LOOKUP_CHUNK, ignore_conflicts=True)
+    return len(edges)
+
+
+class ImportStats:
+    """Counters and per-phase wall time of one import run."""
+
+    PHASES = ('read', 'dedupe', 'embed', 'insert', 'index', 'link')
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.rows = 0
+        self.imported = 0
+        self.duplicates = 0
+        self.invalid = 0
+        self.embedded = 0
+        self.file_embeddings = 0
+        self.edges = 0
+        self.chunks = 0
+        self.errors = []  # first few (line, message) pairs
+        self.seconds = dict.fromkeys(self.PHASES, 0.0)
+
+    @contextmanager
+    def phase(self, name):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.seconds[name] += time.perf_counter() - started
+
+    @property
+    def elapsed(self):
+        return time.perf_counter() - self.started
+
+    @property
+    def rows_per_second(self):
+        return self.rows / self.elapsed if self.elapsed else 0.0
+
+    def add_error(self, line, message):
+        self.invalid += 1
+        if len(self.errors) < 20:
+            self.errors.append((line, message))
+
+    def summary(self):
+        return {
+            'rows': self.rows, 'imported': self.imported, 'duplicates': self.duplicates, 'invalid': self.invalid,
+            'embedded': self.embedded, 'file_embeddings': self.file_embeddings, 'edges': self.edges,
+            'chunks': self.chunks, 'seconds': round(self.elapsed, 3), 'rows_per_second': round(self.rows_per_second, 1),
+            'phase_seconds': {name: round(seconds, 3) for name, seconds in self.seconds.items()}
+        }
+
+
+def import_problem_chunk(batch, records, stats, embed=True, link_similar=True, threshold=SIMILARITY_THRESHOLD):
+    """
+    Store one chunk of parsed records.
+
+    Records whose exact subject, topic and question are already stored
+    (including by earlier chunks) or repeat within the chunk are skipped;
+    this is also what makes a rerun after a crash pick up where the last
+    committed chunk left off. Problems that only differ in their numbers are
+    all kept, although they share a fingerprint. Missing embeddings are fetched
+    in one fetch_embeddings call (cached and packed into as few provider
+    requests as its limits allow), the rows go in with one bulk_create and
+    the batch counters with one UPDATE inside a transaction, and the dedupe
+    indexes are seeded and the similarity edges written afterwards.
+
+    Returns:
+        list: The created Problem objects
+    """
+    from ..models import Batch, Problem
+
+    with stats.phase('dedupe'):
+        fresh = {}
+        for record in records:
+            key = content_key(record)
+            if key in fresh:
+                stats.duplicates += 1
+                continue
+            record['fingerprint'] = problem_fingerprint(record['question'], record['subject'], record['topic'])
+            fresh[key] = record
+        for key in stored_contents(fresh):
+            del fresh[key]
+            stats.duplicates += 1
+
+    if embed:
+        with stats.phase('embed'):
+            missing = [record for record in fresh.values() if record['embedding'] is None]
+            stats.file_embeddings += len(fresh) - len(missing)
+            if missing:
+                vectors = fetch_embeddings([record['question'] for record in missing])
+                for record, vector in zip(missing, vectors):
+                    record['embedding'] = vector
+                stats.embedded += len(missing)
+
+    problems = [
+        Problem(
+            batch=batch,
+            subject=record['subject'],
+            topic=record['topic'],
+            question=record['question'],
+            answer=record['answer'],
+            hints=record['hints'],
+            status=record['status'],
+            rejection_reason=record['rejection_reason'],
+            embedding=record['embedding'],
+            fingerprint=record['fingerprint'],
+            minhash_signature=encode_signature(minhash_signature(record['question']))
+        )
+        for record in fresh.values()
+    ]
+    if not problems:
+        return problems
+
+    with stats.phase('insert'), transaction.atomic():
+        # SQLite and PostgreSQL return the new primary keys, which the indexes need
+        Problem.objects.bulk_create(problems, batch_size=LOOKUP_CHUNK)
+        counts = {}
+        for problem in problems:
+            counts[problem.status] = counts.get(problem.status, 0) + 1
+        Batch.record_problems(batch.id, counts)
+    stats.imported += len(problems)
+
+    with stats.phase('index'):
+        seed_dedupe_indexes(problems)
+    if link_similar:
+        with stats.phase('link'):
+            stats.edges += link_imported_problems(problems, threshold=threshold)
+    return problems
+
+
+def import_problems(path, batch=None, format=None, chunk_size=None, default_status='valid', embed=True,
+                    link_similar=True, threshold=SIMILARITY_THRESHOLD, progress_callback=None):
+    """
+    Bulk-load a curated corpus of problems so generation will not repeat it.
+
+    The file is read `chunk_size` rows at a time, so memory stays flat
+    however large it is, and each chunk is committed on its own: an
+    interrupted import is resumed by running it again, which skips every
+    problem whose exact text is already stored.
+
+    Args:
+        path (str): NDJSON (optionally .gz/.zst, e.g. an export_problems file) or CSV file
+        batch (Batch, optional): Batch to add the problems to (default: the import batch of this file)
+        format (str, optional): 'ndjson' or 'csv' (default: from the file extension)
+        default_status (str): Status of rows that do not carry one
+        embed (bool): Fetch embeddings for rows without an `embedding`
+        link_similar (bool): Write ProblemSimilarity edges at `threshold` to the rest of the corpus
+        progress_callback (callable, optional): Called as progress_callback(stats) after each chunk
+
+    Returns:
+        ImportStats: Counters and per-phase timings
+    """
+    format, compression = import_file_type(path, format)
+    if compression == 'zstd':
+        _zstd()
+    chunk_size = chunk_size or import_chunk_size()
+    batch = batch or import_batch(path)
+    if link_similar:
+        # Load before the first insert so the similarity search never misses stored embeddings
+        get_vector_index()
+
+    stats = ImportStats()
+    # File vectors must be comparable with the stored ones (same embedding model)
+    dimension = stored_embedding_dimension()
+    with open_import_file(path, compression) as f:
+        rows = read_import_rows(f, format)
+        while True:
+            with stats.phase('read'):
+                raw_rows = list(islice(rows, chunk_size))
+                records = []
+                for line, row in raw_rows:
+                    stats.rows += 1
+                    try:
+                        record = parse_import_row(row, default_status)
+                    except ValueError as e:
+                        stats.add_error(line, str(e))
+                        continue
+                    if record['embedding'] is not None:
+                        dimension = dimension or len(record['embedding'])
+                        if len(record['embedding']) != dimension:
+                            stats.add_error(line, f"embedding has {len(record['embedding'])} dimensions, "
+                                                  f"expected {dimension}")
+                            continue
+                    records.append(record)
+            if not raw_rows:
+                break
+            import_problem_chunk(batch, records, stats, embed=embed, link_similar=link_similar,
+                                 threshold=threshold)
+            stats.chunks += 1
+            if progress_callback:
+                progress_callback(stats)
+
+    finish_import_batch(batch)
+    return stats
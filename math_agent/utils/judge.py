@@ -1,12 +1,26 @@
 import json
 from django.conf import settings
 from .system_messages import JUDGE_MESSAGE
-from .call_llm_clients import call_llm
+from .call_llm_clients import call_llm, current_llm_context
+from .answer_equivalence import compare_answers
+
+
+def record_judge_decision(decided_by):
+    """Count how an answer was judged ('local.equal', 'local.different' or 'llm.called') against the current batch."""
+    batch_id = current_llm_context().get('batch_id')
+    if batch_id is None:
+        return
+    from ..models import BatchCounter
+    BatchCounter.increment(batch_id, f"judge.{decided_by}")
 
 def judge_solution(target_solution, true_answer, pipeline_config):
     """
     Judge if the target model's solution is correct by comparing it with the true answer.
     
+    Answers that canonicalize to the same or to certainly different values
+    (integers, rationals, decimals, simple radicals, intervals, sets) are
+    decided locally; only ambiguous ones go to the judge LLM.
+    
     Args:
         target_solution (str): The target model's solution attempt
         true_answer (str): The correct answer that passed the checker
@@ -16,7 +30,14 @@ def judge_solution(target_solution, true_answer, pipeline_config):
     Returns:
         bool: True if the solution is correct, False otherwise
     """
+    verdict = compare_answers(target_solution, true_answer)
+    if verdict is not None:
+        record_judge_decision('local.equal' if verdict else 'local.different')
+        print(f"Judge skipped: answers are {'equivalent' if verdict else 'different'} (local check)")
+        return verdict
+    
     try:
+        record_judge_decision('llm.called')
         # Prepare the input for the model
         input_data = {
             "true_answer": true_answer,
@@ -28,7 +49,7 @@ def judge_solution(target_solution, true_answer, pipeline_config):
             {"role": "user", "content": json.dumps(input_data)}
         ]
         
-        data = call_llm(pipeline_config, messages)
+        data = call_llm(pipeline_config, messages, stage='judge')
         
         # Extract validation result
         is_valid = data.get('valid', False)
@@ -0,0 +1,115 @@
+import hashlib
+import json
+import logging
+import sqlite3
+import threading
+import time
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+
+def cache_key(provider, model, temperature, messages):
+    """Content address of a request: SHA-256 over its provider, model, temperature and messages."""
+    payload = json.dumps(
+        {"provider": provider, "model": model, "temperature": temperature, "messages": messages},
+        sort_keys=True, ensure_ascii=False
+    )
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+class LLMResponseCache:
+    """
+    Disk-backed cache of raw LLM responses stored in a standalone SQLite file.
+
+    Entries expire after `ttl` seconds, and once the stored responses exceed
+    `max_bytes` the least recently read entries are evicted first.
+    """
+
+    EVICTION_CHECK_INTERVAL = 100  # writes between size checks
+
+    def __init__(self, path, max_bytes, ttl):
+        self.path = str(path)
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self._local = threading.local()
+        self._writes = 0
+        self._writes_lock = threading.Lock()
+        with self._connection() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS responses ("
+                " key TEXT PRIMARY KEY, value TEXT NOT NULL, size INTEGER NOT NULL,"
+                " created_at REAL NOT NULL, accessed_at REAL NOT NULL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS responses_accessed_at ON responses (accessed_at)")
+
+    def _connection(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            self._local.conn = conn
+        return conn
+
+    def get(self, key):
+        """Return the cached response for a key, or None if missing or expired."""
+        now = time.time()
+        conn = self._connection()
+        row = conn.execute("SELECT value, created_at FROM responses WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            return None
+        value, created_at = row
+        with conn:
+            if now - created_at > self.ttl:
+                conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+                return None
+            conn.execute("UPDATE responses SET accessed_at = ? WHERE key = ?", (now, key))
+        return value
+
+    def set(self, key, value):
+        now = time.time()
+        conn = self._connection()
+        with conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO responses (key, value, size, created_at, accessed_at) VALUES (?, ?, ?, ?, ?)",
+                (key, value, len(value.encode('utf-8')), now, now)
+            )
+        with self._writes_lock:
+            self._writes += 1
+            check = self._writes % self.EVICTION_CHECK_INTERVAL == 1
+        if check:
+            self.evict()
+
+    def evict(self):
+        """Drop expired entries, then least recently used ones until the cache fits in max_bytes."""
+        conn = self._connection()
+        with conn:
+            conn.execute("DELETE FROM responses WHERE created_at < ?", (time.time() - self.ttl,))
+            total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+            while total > self.max_bytes:
+                rows = conn.execute(
+                    "SELECT key, size FROM responses ORDER BY accessed_at LIMIT 100"
+                ).fetchall()
+                if not rows:
+                    break
+                conn.executemany("DELETE FROM responses WHERE key = ?", [(key,) for key, _ in rows])
+                total -= sum(size for _, size in rows)
+        logger.debug(f"LLM cache holds {total} bytes")
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_llm_cache():
+    """Return the process-wide response cache configured in settings."""
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = LLMResponseCache(
+                    path=settings.LLM_CACHE_PATH,
+                    max_bytes=settings.LLM_CACHE_MAX_BYTES,
+                    ttl=settings.LLM_CACHE_TTL
+                )
+    return _cache
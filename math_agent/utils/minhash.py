@@ -0,0 +1,194 @@
+import hashlib
+import re
+import sys
+import threading
+import logging
+from collections import defaultdict
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+NUM_PERM = 128
+BANDS = 32
+ROWS_PER_BAND = NUM_PERM // BANDS
+SHINGLE_SIZE = 2
+SIGNATURE_DTYPE = np.dtype('<u4')
+LEXICAL_THRESHOLD = 0.7  # estimated Jaccard at which two questions count as near-duplicates
+
+_PRIME = np.uint64(4294967311)  # smallest prime above 2**32
+_rng = np.random.default_rng(20240601)  # fixed seed: signatures are persisted and must stay comparable
+_A = _rng.integers(1, 2**31, size=NUM_PERM, dtype=np.uint64)
+_B = _rng.integers(0, 2**32, size=NUM_PERM, dtype=np.uint64)
+
+
+def normalize_question(text):
+    """Lowercase, mask numbers and keep word tokens, mirroring fingerprints.normalize_text."""
+    normalized = re.sub(r'-?\d+\.?\d*', ' num ', (text or '').lower())
+    return re.findall(r'\w+', normalized)
+
+
+def shingles(text):
+    """Word n-grams of the normalized question."""
+    tokens = normalize_question(text)
+    if len(tokens) < SHINGLE_SIZE:
+        return {' '.join(tokens)} if tokens else set()
+    return {' '.join(tokens[i:i + SHINGLE_SIZE]) for i in range(len(tokens) - SHINGLE_SIZE + 1)}
+
+
+def minhash_signature(text):
+    """
+    MinHash signature of a question: NUM_PERM uint32 minima of universal hashes over its shingles.
+
+    Returns:
+        np.ndarray or None: Signature, or None for text without any words
+    """
+    grams = shingles(text)
+    if not grams:
+        return None
+    hashes = np.fromiter(
+        (int.from_bytes(hashlib.blake2b(g.encode('utf-8'), digest_size=4).digest(), 'little') for g in grams),
+        dtype=np.uint64, count=len(grams)
+    )
+    # (a * x + b) mod p for every permutation and shingle; a < 2**31 and x < 2**32 keep it inside uint64
+    permuted = (np.outer(_A, hashes) + _B[:, None]) % _PRIME
+    return (permuted.min(axis=1) & np.uint64(0xFFFFFFFF)).astype(SIGNATURE_DTYPE)
+
+
+def encode_signature(signature):
+    return None if signature is None else np.asarray(signature, dtype=SIGNATURE_DTYPE).tobytes()
+
+
+def decode_signature(data):
+    return None if data is None else np.frombuffer(data, dtype=SIGNATURE_DTYPE)
+
+
+def estimated_jaccard(signature, other):
+    """Share of matching MinHash slots, an unbiased estimate of the shingle-set Jaccard similarity."""
+    if signature is None or other is None:
+        return None
+    return float(np.count_nonzero(signature == other)) / NUM_PERM
+
+
+class MinHashLSHIndex:
+    """
+    Banded LSH index over MinHash signatures, scoped by (subject, topic).
+
+    Each signature is split into BANDS bands of ROWS_PER_BAND slots; problems
+    sharing any band bucket in the same scope become candidates, which are then
+    ranked by estimated Jaccard. A query is BANDS dict lookups plus a compare
+    per candidate, so it stays sub-millisecond and needs no network.
+    """
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._buckets = defaultdict(set)  # (scope, band, band bytes) -> problem ids
+        self._entries = {}  # problem id -> (scope, signature)
+        self.loaded = False
+
+    def __len__(self):
+        return len(self._entries)
+
+    @property
+    def nbytes(self):
+        """Approximate memory held by the signatures, bucket sets and lookup tables."""
+        with self._lock:
+            signature_bytes = sum(signature.nbytes for _, signature in self._entries.values())
+            bucket_bytes = sum(sys.getsizeof(bucket) for bucket in self._buckets.values())
+            return signature_bytes + bucket_bytes + sys.getsizeof(self._entries) + sys.getsizeof(self._buckets)
+
+    @staticmethod
+    def _bands(signature):
+        for band in range(BANDS):
+            yield band, signature[band * ROWS_PER_BAND:(band + 1) * ROWS_PER_BAND].tobytes()
+
+    def load(self):
+        """(Re)build the index from every stored signature."""
+        from math_agent.models import Problem
+
+        with self._lock:
+            self._buckets.clear()
+            self._entries.clear()
+            rows = Problem.objects.filter(minhash_signature__isnull=False).values_list(
+                'id', 'subject', 'topic', 'minhash_signature'
+            )
+            for problem_id, subject, topic, data in rows.iterator(chunk_size=5000):
+                self.add(problem_id, subject, topic, decode_signature(data))
+            self.loaded = True
+            logger.info(f"MinHash LSH index loaded with {len(self._entries)} signatures")
+
+    def add(self, problem_id, subject, topic, signature):
+        """Insert or replace a problem's signature."""
+        if signature is None:
+            return
+        scope = (subject, topic)
+        with self._lock:
+            self.remove(problem_id)
+            self._entries[problem_id] = (scope, signature)
+            for band, key in self._bands(signature):
+                self._buckets[(scope, band, key)].add(problem_id)
+
+    def remove(self, problem_id):
+        with self._lock:
+            entry = self._entries.pop(problem_id, None)
+            if entry is None:
+                return
+            scope, signature = entry
+            for band, key in self._bands(signature):
+                bucket = self._buckets.get((scope, band, key))
+                if bucket is not None:
+                    bucket.discard(problem_id)
+                    if not bucket:
+                        del self._buckets[(scope, band, key)]
+
+    def signature(self, problem_id):
+        entry = self._entries.get(problem_id)
+        return entry[1] if entry else None
+
+    def query(self, signature, subject, topic, threshold=LEXICAL_THRESHOLD):
+        """
+        Find near-duplicates of a signature within a subject/topic.
+
+        Returns:
+            dict: {problem_id: estimated_jaccard, ...} at or above threshold, ordered by descending similarity
+        """
+        if signature is None:
+            return {}
+        scope = (subject, topic)
+        with self._lock:
+            candidates = set()
+            for band, key in self._bands(signature):
+                candidates |= self._buckets.get((scope, band, key), set())
+            scores = {}
+            for problem_id in candidates:
+                score = estimated_jaccard(signature, self._entries[problem_id][1])
+                if score >= threshold:
+                    scores[problem_id] = score
+        return dict(sorted(scores.items(), key=lambda item: -item[1]))
+
+
+_index = None
+_index_lock = threading.Lock()
+
+
+def get_minhash_index():
+    """Return the process-wide LSH index, loading it from the database on first use."""
+    global _index
+    if _index is None:
+        with _index_lock:
+            if _index is None:
+                index = MinHashLSHIndex()
+                index.load()
+                _index = index
+    return _index
+
+
+def peek_minhash_index():
+    """Return the process-wide LSH index if it has been loaded, without loading it."""
+    return _index
+
+
+def reset_minhash_index():
+    """Forget the process-wide index so the next get_minhash_index() reloads it."""
+    global _index
+    with _index_lock:
+        _index = None
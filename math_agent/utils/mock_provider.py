@@ -0,0 +1,227 @@
+import asyncio
+import hashlib
+import json
+import math
+import random
+import re
+import threading
+import numpy as np
+from django.conf import settings
+from .system_messages import GENERATOR_MESSAGE, GENERATOR_BATCH_MESSAGE, HINT_ONLY_MESSAGE, CHECKER_MESSAGE, TARGET_MESSAGE, JUDGE_MESSAGE
+
+# Behaviour of the offline "mock" provider. settings.LLM_MOCK overrides these
+# defaults and a stage's pipeline config can override them again under "mock".
+MOCK_DEFAULTS = {
+    'latency': 0.5,             # median seconds per request
+    'latency_sigma': 0.5,       # lognormal spread; 0 gives a fixed latency
+    'rate_limit_rate': 0.0,     # share of requests rejected with a 429
+    'retry_after': None,        # Retry-After seconds sent with injected 429s
+    'error_rate': 0.0,          # share of requests failing with a transient error
+    'duplicate_rate': 0.0,      # share of generated problems repeating an earlier one
+    'malformed_rate': 0.0,      # share of items in multi-problem responses missing their answer
+    'pass_rate': 0.8,           # share of problems the checker accepts
+    'solve_rate': 0.5,          # share of problems the target answers correctly
+    'completion_tokens': 300,   # tokens reported as used per response
+    'token_latency': 0.0,       # seconds per streamed token (four characters of response text)
+    'runaway_rate': 0.0,        # share of responses that ramble on after their JSON fields
+    'runaway_tokens': 2000,     # length of that rambling "working" field in tokens
+    'embedding_latency': 0.05,  # median seconds per embedding request
+    'embedding_dimension': 256
+}
+
+WORDS = (
+    "prime lattice sequence integral polynomial matrix graph vertex chord circle "
+    "triangle permutation divisor modulus series limit function root coefficient"
+).split()
+
+
+class MockUsage:
+    def __init__(self, prompt_tokens, completion_tokens):
+        self.prompt_tokens = prompt_tokens
+        self.completion_tokens = completion_tokens
+        self.total_tokens = prompt_tokens + completion_tokens
+
+
+class MockResponse:
+    """Raw response text plus the usage the rate limiter settles against."""
+
+    def __init__(self, text, prompt_tokens, completion_tokens):
+        self.text = text
+        self.usage = MockUsage(prompt_tokens, completion_tokens)
+
+
+class MockStream:
+    """
+    A MockResponse delivered in chunks of CHUNK_CHARS characters, each after
+    `token_latency` seconds per token. Iterate it with `async for`; `usage`
+    is only set once the whole response has been read, as with provider
+    streams.
+    """
+
+    CHUNK_CHARS = 16
+
+    def __init__(self, response, token_latency):
+        self.response = response
+        self.chunk_delay = token_latency * self.CHUNK_CHARS / 4
+        self.usage = None
+        self.closed = False
+
+    def _chunks(self):
+        text = self.response.text
+        for start in range(0, len(text), self.CHUNK_CHARS):
+            if self.closed:
+                return
+            yield text[start:start + self.CHUNK_CHARS]
+        self.usage = self.response.usage
+
+    async def __aiter__(self):
+        for chunk in self._chunks():
+            if self.chunk_delay:
+                await asyncio.sleep(self.chunk_delay)
+            yield chunk
+
+    def close(self):
+        self.closed = True
+
+
+def estimate_prompt_tokens(messages):
+    return sum(len(msg.get("content") or "") for msg in messages) // 4 + 1
+
+
+def mock_options(pipeline_config=None):
+    """Merge the mock defaults, settings.LLM_MOCK and a stage's "mock" overrides."""
+    options = {**MOCK_DEFAULTS, **getattr(settings, 'LLM_MOCK', {})}
+    if pipeline_config:
+        options.update(pipeline_config.get('mock') or {})
+    return options
+
+
+def sample_latency(median, sigma):
+    """Draw a request latency from a lognormal distribution with the given median."""
+    if not median or median <= 0:
+        return 0.0
+    if not sigma:
+        return median
+    return random.lognormvariate(math.log(median), sigma)
+
+
+class MockLLM:
+    """
+    Offline stand-in for a chat and embedding provider.
+
+    Chat responses are schema-valid JSON for whichever pipeline system message
+    the request carries. Generated answers are remembered so the target can
+    answer correctly at `solve_rate` and the judge compares answers exactly.
+    Embeddings are deterministic pseudo-random unit vectors seeded by the text,
+    so repeated questions embed identically.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._answers = {}
+        self._questions = []
+        self._counter = 0
+
+    def reset(self):
+        with self._lock:
+            self._answers.clear()
+            self._questions.clear()
+            self._counter = 0
+
+    def _inject_failures(self, options):
+        from .call_llm_clients import RateLimitError, TransientProviderError
+
+        roll = random.random()
+        if roll < options['rate_limit_rate']:
+            raise RateLimitError("Mock provider rate limit exceeded", retry_after=options['retry_after'])
+        if roll < options['rate_limit_rate'] + options['error_rate']:
+            raise TransientProviderError("Mock provider internal error")
+
+    def _generate(self, options):
+        with self._lock:
+            if self._questions and random.random() < options['duplicate_rate']:
+                question = random.choice(self._questions)
+                return {"problem": question, "answer": self._answers[question], "hints": self._hints()}
+            self._counter += 1
+            words = " ".join(random.sample(WORDS, 6))
+            question = f"Problem {self._counter}: determine the {words} invariant for n = {random.randint(2, 10**6)}."
+            answer = str(random.randint(1, 10**9))
+            self._answers[question] = answer
+            self._questions.append(question)
+        return {"problem": question, "answer": answer, "hints": self._hints()}
+
+    @staticmethod
+    def _hints():
+        return {str(i): f"Consider step {i + 1}." for i in range(3)}
+
+    def respond(self, messages, options):
+        """Return the JSON payload for a chat request."""
+        system = messages[0]["content"] if messages else ""
+        user = messages[-1]["content"] if messages else ""
+
+        if system == GENERATOR_MESSAGE:
+            return self._generate(options)
+        if system == GENERATOR_BATCH_MESSAGE:
+            match = re.search(r'Generate (\d+)', user)
+            problems = [self._generate(options) for _ in range(int(match.group(1)) if match else 1)]
+            for problem in problems:
+                if random.random() < options['malformed_rate']:
+                    del problem["answer"]
+            return {"problems": problems}
+        if system == HINT_ONLY_MESSAGE:
+            return {"hints": self._hints()}
+        if system == CHECKER_MESSAGE:
+            valid = random.random() < options['pass_rate']
+            return {"valid": valid, "reason": "" if valid else "Mock checker rejection", "corrected_hints": {}}
+        if system == TARGET_MESSAGE:
+            question = json.loads(user).get("problem", "")
+            with self._lock:
+                answer = self._answers.get(question)
+            if answer is None or random.random() >= options['solve_rate']:
+                answer = str(random.randint(1, 10**9))
+            return {"answer": answer}
+        if system == JUDGE_MESSAGE:
+            data = json.loads(user)
+            valid = str(data.get("true_answer", "")).strip() == str(data.get("model_answer", "")).strip()
+            return {"valid": valid, "reason": "Answers match" if valid else "Answers differ"}
+        return {"response": "mock"}
+
+    @staticmethod
+    def _response(payload, messages, options):
+        # Multi-problem responses use completion tokens for every problem
+        items = len(payload.get("problems", ())) or 1
+        completion_tokens = options['completion_tokens'] * items
+        if options['runaway_rate'] and random.random() < options['runaway_rate']:
+            # A runaway response keeps writing after the fields the pipeline reads
+            payload = {**payload, "working": " ".join(random.choices(WORDS, k=options['runaway_tokens']))}
+            completion_tokens += options['runaway_tokens']
+        return MockResponse(json.dumps(payload), estimate_prompt_tokens(messages), completion_tokens)
+
+    async def acomplete(self, messages, options):
+        """Chat request: wait for the sampled latency, maybe fail, then answer."""
+        await asyncio.sleep(sample_latency(options['latency'], options['latency_sigma']))
+        self._inject_failures(options)
+        response = self._response(self.respond(messages, options), messages, options)
+        await asyncio.sleep(options['token_latency'] * len(response.text) / 4)
+        return response
+
+    async def astream(self, messages, options):
+        """Streaming chat request: wait for the first token, maybe fail, then return a MockStream."""
+        await asyncio.sleep(sample_latency(options['latency'], options['latency_sigma']))
+        self._inject_failures(options)
+        return MockStream(self._response(self.respond(messages, options), messages, options), options['token_latency'])
+
+    @staticmethod
+    def _vector(text, dimension):
+        seed = int.from_bytes(hashlib.sha256(text.encode('utf-8')).digest()[:8], 'little')
+        vector = np.random.default_rng(seed).standard_normal(dimension)
+        return (vector / np.linalg.norm(vector)).tolist()
+
+    async def aembed(self, texts, options):
+        """Embedding request: one deterministic vector per text."""
+        await asyncio.sleep(sample_latency(options['embedding_latency'], options['latency_sigma']))
+        self._inject_failures(options)
+        return [self._vector(text, options['embedding_dimension']) for text in texts]
+
+
+mock_llm = MockLLM()
@@ -0,0 +1,63 @@
+from django.db import transaction
+from ..models import Batch, Problem, ProblemSimilarity
+from .fingerprints import problem_fingerprint
+from .minhash import decode_signature, encode_signature, estimated_jaccard, minhash_signature
+from .tracing import current_trace, trace_span
+
+
+def link_similar_problems(problem, similar_problems):
+    """
+    Record similarity edges between a problem and its neighbours.
+
+    Both directions are written with a single bulk_create, so a neighbour sees
+    the new problem without a read-modify-write of its own row. Each edge also
+    carries the MinHash Jaccard estimate next to the embedding score.
+    """
+    scores = {int(sim_id): score for sim_id, score in (similar_problems or {}).items() if int(sim_id) != problem.id}
+    if not scores:
+        return
+    # Neighbours deleted since the similarity search must not break the insert
+    existing = Problem.objects.filter(id__in=scores).values_list('id', 'minhash_signature')
+    signature = decode_signature(problem.minhash_signature)
+
+    edges = []
+    for sim_id, other in existing:
+        score = scores[sim_id]
+        jaccard = estimated_jaccard(signature, decode_signature(other))
+        edges.append(ProblemSimilarity(src_id=problem.id, dst_id=sim_id, score=score, jaccard=jaccard))
+        edges.append(ProblemSimilarity(src_id=sim_id, dst_id=problem.id, score=score, jaccard=jaccard))
+    if edges:
+        ProblemSimilarity.objects.bulk_create(edges, ignore_conflicts=True)
+
+
+def save_problem(batch, subject, topic, question, answer, hints, status, embedding, similar_problems,
+                 rejection_reason=None):
+    """
+    Store a generated problem together with its similarity edges and bump
+    the batch's counter for its status.
+
+    Returns:
+        Problem: The created problem
+    """
+    with trace_span('db_write'), transaction.atomic():
+        problem = Problem.objects.create(
+            subject=subject,
+            topic=topic,
+            question=question,
+            answer=answer,
+            hints=hints,
+            rejection_reason=rejection_reason,
+            status=status,
+            batch=batch,
+            embedding=embedding,
+            similar_problems=similar_problems,
+            fingerprint=problem_fingerprint(question, subject, topic),
+            minhash_signature=encode_signature(minhash_signature(question))
+        )
+        link_similar_problems(problem, similar_problems)
+        Batch.record_problem(batch.id, status)
+
+    trace = current_trace()
+    if trace is not None:
+        trace.problem_id = problem.id
+    return problem
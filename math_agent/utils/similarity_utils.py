@@ -1,28 +1,165 @@
+import hashlib
+import re
+import time
+import unicodedata
 import numpy as np
 import requests
 from django.conf import settings
-from .call_llm_clients import call_llm
-from math_agent.models import Problem
+from .call_llm_clients import (
+    anotify_llm_observers, get_async_openai_client, rate_limiter, estimate_tokens, run_blocking, run_sync
+)
+from .mock_provider import mock_llm, mock_options
+from .vector_index import get_vector_index
+from .tracing import trace_span
 
-EMBEDDING_MODEL = 'text-embedding-3-small'  # or make configurable
+EMBEDDING_PROVIDER = 'openai'
+EMBEDDING_MODEL = 'text-embedding-3-small'  # defaults; settings.EMBEDDING_PROVIDER / EMBEDDING_MODEL override
 SIMILARITY_THRESHOLD = 0.82
+EMBEDDING_PROVIDERS = ('openai', 'mock')
 
 
-def fetch_embedding(text, provider='openai', model=EMBEDDING_MODEL):
+def embedding_backend(provider=None, model=None):
+    """Resolve the embedding provider and model, falling back to settings and then the module defaults."""
+    provider = provider or getattr(settings, 'EMBEDDING_PROVIDER', EMBEDDING_PROVIDER)
+    model = model or getattr(settings, 'EMBEDDING_MODEL', EMBEDDING_MODEL)
+    if provider not in EMBEDDING_PROVIDERS:
+        # Add other providers if needed
+        raise NotImplementedError(f"Embedding provider {provider} not implemented.")
+    return provider, model
+
+
+def normalize_embedding_text(text):
+    """Canonical form of a text for embedding and caching (NFC, collapsed whitespace)."""
+    return re.sub(r'\s+', ' ', unicodedata.normalize('NFC', text or '')).strip()
+
+
+def embedding_text_hash(text):
+    return hashlib.sha256(normalize_embedding_text(text).encode('utf-8')).hexdigest()
+
+
+def embedding_request_batches(texts_by_key):
+    """
+    Pack texts into request-sized groups under the provider's input limits.
+
+    Args:
+        texts_by_key (dict): {key: text} to embed
+
+    Yields:
+        list: Keys whose texts fit in one request by count and estimated tokens
+    """
+    max_inputs = getattr(settings, 'EMBEDDING_BATCH_MAX_INPUTS', 2048)
+    max_tokens = getattr(settings, 'EMBEDDING_BATCH_MAX_TOKENS', 250000)
+    batch, batch_tokens = [], 0
+    for key, text in texts_by_key.items():
+        tokens = estimate_tokens([{"content": text}])
+        if batch and (len(batch) >= max_inputs or batch_tokens + tokens > max_tokens):
+            yield batch
+            batch, batch_tokens = [], 0
+        batch.append(key)
+        batch_tokens += tokens
+    if batch:
+        yield batch
+
+
+def load_cached_embeddings(model, hashes):
+    """Return {text_hash: vector} for the hashes already in the embedding cache."""
+    from math_agent.models import CachedEmbedding, Problem
+
+    found = {}
+    hashes = list(hashes)
+    for start in range(0, len(hashes), 500):
+        rows = CachedEmbedding.objects.filter(model=model, text_hash__in=hashes[start:start + 500])
+        for text_hash, vector in rows.values_list('text_hash', 'vector'):
+            found[text_hash] = Problem.decode_embedding(vector).tolist()
+    return found
+
+
+def store_cached_embeddings(model, embeddings_by_hash):
+    from math_agent.models import CachedEmbedding, Problem
+
+    CachedEmbedding.objects.bulk_create(
+        [CachedEmbedding(model=model, text_hash=text_hash, vector=Problem.encode_embedding(vector))
+         for text_hash, vector in embeddings_by_hash.items()],
+        batch_size=500,
+        ignore_conflicts=True
+    )
+
+
+def missing_embedding_texts(texts, hashes, cached):
+    """Return {text_hash: normalized text} for the unique texts not found in the cache."""
+    missing = {}
+    for text, text_hash in zip(texts, hashes):
+        if text_hash not in cached and text_hash not in missing:
+            missing[text_hash] = normalize_embedding_text(text)
+    return missing
+
+
+async def arequest_embeddings(provider, model, inputs, stats=None):
+    """Send one embedding request through the rate limiter and return the vectors in input order."""
+    tokens = estimate_tokens([{"content": t} for t in inputs])
+    if provider == 'mock':
+        options = mock_options()
+        return await rate_limiter.arun(provider, model, tokens, lambda: mock_llm.aembed(inputs, options),
+                                       stats=stats)
+
+    client = get_async_openai_client()
+    response = await rate_limiter.arun(provider, model, tokens,
+                                       lambda: client.embeddings.create(input=inputs, model=model), stats=stats)
+    vectors = [None] * len(inputs)
+    for item in response.data:
+        vectors[item.index] = item.embedding
+    return vectors
+
+
+async def afetch_embeddings(texts, provider=None, model=None):
+    """
+    Fetch embeddings for many texts, reusing cached vectors and batching the rest.
+
+    Texts are cached by (model, hash of normalized text), so retries, imports
+    and regenerated questions never pay for the same embedding twice. Misses are
+    deduplicated and packed into as few provider requests as the input limits allow.
+
+    Returns:
+        list: One embedding (list of floats) per input text, in input order
+    """
+    provider, model = embedding_backend(provider, model)
+    started = time.perf_counter()
+    stats = {}
+
+    hashes = [embedding_text_hash(text) for text in texts]
+    cached = await run_blocking(load_cached_embeddings, model, set(hashes))
+    missing = missing_embedding_texts(texts, hashes, cached)
+
+    if missing:
+        fetched = {}
+        for group in embedding_request_batches(missing):
+            vectors = await arequest_embeddings(provider, model, [missing[text_hash] for text_hash in group],
+                                                stats=stats)
+            fetched.update(zip(group, vectors))
+        await run_blocking(store_cached_embeddings, model, fetched)
+        cached.update(fetched)
+
+    await anotify_llm_observers(stage='embed', provider=provider, model=model,
+                                elapsed=time.perf_counter() - started, cached=not missing, error=None, **stats)
+    return [cached[text_hash] for text_hash in hashes]
+
+
+async def afetch_embedding(text, provider=None, model=None):
+    """Fetch the embedding of one text (see afetch_embeddings)."""
+    return (await afetch_embeddings([text], provider=provider, model=model))[0]
+
+
+def fetch_embeddings(texts, provider=None, model=None):
+    """Synchronous wrapper around afetch_embeddings (see run_sync)."""
+    return run_sync(afetch_embeddings, texts, provider=provider, model=model)
+
+
+def fetch_embedding(text, provider=None, model=None):
     """
     Fetch embedding for the given text using the specified provider/model.
     Updated for openai>=1.0.0
     """
-    if provider == 'openai':
-        import openai
-        client = openai.OpenAI(api_key=settings.OPENAI_API_KEY)
-        response = client.embeddings.create(
-            input=text,
-            model=model
-        )
-        return response.data[0].embedding
-    # Add other providers if needed
-    raise NotImplementedError(f"Embedding provider {provider} not implemented.")
+    return fetch_embeddings([text], provider=provider, model=model)[0]
 
 
 def cosine_similarity(vec1, vec2):
@@ -33,17 +170,12 @@ def cosine_similarity(vec1, vec2):
     return float(np.dot(v1, v2) / (np.linalg.norm(v1) * np.linalg.norm(v2)))
 
 
-def find_similar_problems(problem_text, exclude_ids=None, threshold=SIMILARITY_THRESHOLD):
+def find_similar_problems(problem_text, exclude_ids=None, threshold=SIMILARITY_THRESHOLD, top_k=None):
     """
     Given a problem text, fetch its embedding and compare to all existing problems.
     Returns a dict: {problem_id: similarity_score, ...} for all above threshold.
     """
-    if exclude_ids is None:
-        exclude_ids = []
     embedding = fetch_embedding(problem_text)
-    similars = {}
-    for prob in Problem.objects.exclude(id__in=exclude_ids).exclude(problem_embedding=None):
-        sim = cosine_similarity(embedding, prob.problem_embedding)
-        if sim >= threshold:
-            similars[prob.id] = sim
-    return similars, embedding 
\ No newline at end of file
+    with trace_span('similarity'):
+        similars = get_vector_index().search(embedding, threshold=threshold, top_k=top_k, exclude_ids=exclude_ids)
+    return similars, embedding
@@ -1,143 +1,324 @@
+import math
 import random
+import threading
 from collections import Counter, defaultdict
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
 import logging
+from django.conf import settings
+from django.db import connections
 from .duplicate_detection import EnhancedSimilarityChecker
-from .generator import generate_problem
-from .checker import check_problem
+from .generator import GeneratedProblemQueue
+from .cascade import screen_problem
 from .target import test_with_target
 from .judge import judge_solution
+from .call_llm_clients import llm_context
+from .problem_store import save_problem
+from .tracing import attempt_trace
+from .checkpoints import load_checkpoint, save_checkpoint, stored_topic_distribution, stored_valid_count
 
 logger = logging.getLogger(__name__)
 
+PRIOR_WEIGHT = 5  # Finished attempts the prior yield is worth before real outcomes outweigh it
+MIN_YIELD = 0.01  # Floor for the yield estimate so a run of failures cannot plan an unbounded wave
+
+class AttemptCancelled(Exception):
+    """Raised inside an in-flight attempt once the batch has reached its target."""
+    attempt_status = 'cancelled'
+
+
 class SmartGenerationController:
-    def __init__(self):
+    def __init__(self, concurrency=None, planning=None, overprovision=None, max_concurrency=None,
+                 max_attempts_per_valid=None):
         self.similarity_checker = EnhancedSimilarityChecker()
         self.generation_stats = defaultdict(lambda: {'attempts': 0, 'successes': 0, 'duplicates': 0})
         self.variation_intensity = 1.0
+        self.concurrency = max(1, concurrency or getattr(settings, 'GENERATION_CONCURRENCY', 1))
+        # Yield-aware planning sizes each wave of attempts from the running yield (see planned_in_flight)
+        self.planning = getattr(settings, 'GENERATION_PLANNING', False) if planning is None else planning
+        self.overprovision = overprovision or getattr(settings, 'GENERATION_OVERPROVISION', 1.3)
+        self.max_concurrency = max(1, max_concurrency or getattr(settings, 'GENERATION_MAX_CONCURRENCY', 64))
+        self.prior_yield = getattr(settings, 'GENERATION_PRIOR_YIELD', 0.2)
+        # Cost cap: attempts a batch may spend per valid problem it needs
+        self.max_attempts_per_valid = max_attempts_per_valid or getattr(
+            settings, 'GENERATION_MAX_ATTEMPTS_PER_VALID', 15
+        )
+        # Guards every piece of shared state below while attempts run on worker threads
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
         
-    def generate_problems_intelligently(self, number_of_valid_needed, pipeline, taxonomy_file, batch):
-        """Intelligent generation that integrates with your existing system"""
-        
-        valid_count = 0
-        attempt_count = 0
-        max_attempts = number_of_valid_needed * 15  # Prevent infinite loops
-        consecutive_failures = 0
+    def generate_problems_intelligently(self, number_of_valid_needed, pipeline, taxonomy_file, batch, progress_callback=None):
+        """
+        Intelligent generation that keeps up to `self.concurrency` attempts in flight.
+
+        Each attempt (generate -> embed -> check -> target -> judge) runs on a
+        worker thread. Shared counters are only touched under `self._lock`, and
+        once `number_of_valid_needed` is reached the stop event makes in-flight
+        attempts bail out before their next paid stage. An attempt already past
+        the judge still stores its problem, so a valid one can land over quota.
+
+        In planning mode the number of attempts in flight follows
+        planned_in_flight() instead of the fixed `self.concurrency`.
+
+        Controller state is checkpointed after every finished attempt; if the
+        batch has a checkpoint, generation resumes from it (see restore_checkpoint).
+
+        Returns:
+            tuple: (valid_count, attempt_count)
+        """
+        self.number_of_valid_needed = number_of_valid_needed
+        self.valid_count = 0
+        self.attempt_count = 0
+        self.completed_count = 0
+        self.consecutive_failures = 0
+        self.outcomes = Counter()
+        self.peak_in_flight = 0
+        self._planned = None
         
         # Track topic distribution for diversity
-        topic_distribution = Counter()
+        self.topic_distribution = Counter()
+        self.restore_checkpoint(batch)
+        # Prevent infinite loops; a resumed batch gets a fresh budget for what it still needs
+        max_attempts = self.attempt_count + max(0, number_of_valid_needed - self.valid_count) * self.max_attempts_per_valid
+        if self.valid_count >= number_of_valid_needed:
+            self._stop.set()
+        else:
+            self._stop.clear()
+        self.problem_queue = GeneratedProblemQueue(pipeline['generator'], lambda: self._pick_topic(taxonomy_file))
         
-        logger.info(f"Starting intelligent generation of {number_of_valid_needed} problems")
+        pool_size = self.max_concurrency if self.planning else self.concurrency
+        if self.planning:
+            logger.info(f"Starting planned generation of {number_of_valid_needed} problems "
+                        f"(over-provisioning x{self.overprovision}, up to {pool_size} concurrent attempts)")
+        else:
+            logger.info(f"Starting intelligent generation of {number_of_valid_needed} problems "
+                        f"with {self.concurrency} concurrent attempts")
         
-        while valid_count < number_of_valid_needed and attempt_count < max_attempts:
-            attempt_count += 1
-            
-            # Break if too many consecutive failures
-            if consecutive_failures > 20:
-                logger.warning("Too many consecutive failures, adjusting strategy")
-                self.variation_intensity *= 1.5
-                consecutive_failures = 0
-            
-            try:
-                # Smart topic selection for diversity
-                subject, topic = self.select_diverse_topic(
-                    taxonomy_file, topic_distribution, number_of_valid_needed
-                )
-                
-                # Create taxonomy dict for generator
-                taxonomy = {"subject": subject, "topic": topic}
-                
-                # Generate problem with your existing system
-                print(f"\nAttempt {attempt_count} - Generating {subject} - {topic}...")
-                question, answer, hints, embedding, similar_problems = generate_problem(
-                    pipeline['generator'], taxonomy=taxonomy
-                )
-                
-                # Enhanced similarity check
-                is_duplicate, dup_type, similarity_score, enhanced_similar = self.similarity_checker.enhanced_similarity_check(
-                    question, subject, topic, embedding, similar_problems
-                )
-                
-                if is_duplicate:
-                    consecutive_failures += 1
-                    self.generation_stats[f"{subject}|{topic}"]['duplicates'] += 1
-                    logger.warning(f"Duplicate detected: {dup_type} (similarity: {similarity_score:.3f})")
-                    continue
-                
-                # Continue with your existing validation pipeline
-                print("Calling checker...")
-                is_valid, rejection_reason, corrected_hints = check_problem(
-                    question, answer, hints, pipeline['checker']
-                )
-                
-                if not is_valid:
-                    consecutive_failures += 1
-                    print(f"Rejection reason: {rejection_reason}")
-                    
-                    # Create discarded problem (your existing logic)
-                    from ..models import Problem
-                    problem = Problem.objects.create(
-                        subject=subject,
-                        topic=topic,
-                        question=question,
-                        answer=answer,
-                        hints=hints,
-                        rejection_reason=rejection_reason,
-                        status='discarded',
-                        batch=batch,
-                        problem_embedding=embedding,
-                        similar_problems=similar_problems
-                    )
-                    self.update_similar_problems(problem, similar_problems)
-                    continue
-                
-                # Use corrected hints if provided
-                if corrected_hints:
-                    hints = corrected_hints
-                
-                # Test with target (your existing logic)
-                print("Calling target...")
-                target_result = test_with_target(question, pipeline['target'])
-                
-                # Judge the solution (your existing logic)
-                print("Calling judge...")
-                is_solved = judge_solution(target_result, answer, pipeline['judge'])
-                
-                # Create successful problem
-                status = 'solved' if is_solved else 'valid'
-                from ..models import Problem
-                problem = Problem.objects.create(
-                    subject=subject,
-                    topic=topic,
-                    question=question,
-                    answer=answer,
-                    hints=hints,
-                    status=status,
-                    batch=batch,
-                    problem_embedding=embedding,
-                    similar_problems=similar_problems
-                )
-                self.update_similar_problems(problem, similar_problems)
-                
-                # Update counters
-                topic_distribution[f"{subject}|{topic}"] += 1
-                self.generation_stats[f"{subject}|{topic}"]['successes'] += 1
-                consecutive_failures = 0
-                
-                if status == 'valid':
-                    valid_count += 1
-                    print(f"Valid problem count: {valid_count}/{number_of_valid_needed}")
-                    
-            except Exception as e:
-                consecutive_failures += 1
-                logger.error(f"Error in attempt {attempt_count}: {e}")
-                continue
+        with ThreadPoolExecutor(max_workers=pool_size, thread_name_prefix='attempt') as executor:
+            in_flight = set()
+            while True:
+                with self._lock:
+                    planned = self.planned_in_flight()
+                    while (not self._stop.is_set() and len(in_flight) < planned
+                           and self.attempt_count < max_attempts):
+                        in_flight.add(self._submit_attempt(executor, pipeline, taxonomy_file, batch))
+                    self.peak_in_flight = max(self.peak_in_flight, len(in_flight))
+                    attempt_count, valid_count = self.attempt_count, self.valid_count
+                    state = self.checkpoint_state()
+
+                # Saved after submitting, so a resumed batch never reuses an attempt number
+                save_checkpoint(batch.id, 'smart', **state)
+
+                if progress_callback:
+                    progress_callback(attempt_count, valid_count)
+                if not in_flight:
+                    break
+
+                done, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+                with self._lock:
+                    for future in done:
+                        self.outcomes[future.result()] += 1
+                        self.completed_count += 1
+                        # Adaptive strategy adjustment
+                        if self.completed_count % 50 == 0:
+                            self.adjust_generation_strategy(self.valid_count, self.completed_count)
+        
+        logger.info(f"Generation completed: {self.valid_count}/{number_of_valid_needed} in {self.attempt_count} attempts")
+        if progress_callback:
+            progress_callback(self.attempt_count, self.valid_count)
+        return self.valid_count, self.attempt_count
+
+    def checkpoint_state(self):
+        """GenerationCheckpoint fields for the current state. Caller must hold self._lock."""
+        return {
+            'attempt_count': self.attempt_count,
+            'completed_count': self.completed_count,
+            'consecutive_failures': self.consecutive_failures,
+            'variation_intensity': self.variation_intensity,
+            'outcomes': dict(self.outcomes),
+            'generation_stats': {key: dict(stats) for key, stats in self.generation_stats.items()}
+        }
+
+    def restore_checkpoint(self, batch):
+        """
+        Rebuild controller state from the batch's checkpoint and stored problems.
+
+        Counters that only live in memory (attempts, outcomes, per-topic
+        duplicate stats, variation intensity) come from the checkpoint; the
+        valid count and topic distribution are rebuilt from Problem rows, which
+        also covers attempts that stored a problem after the last checkpoint.
+
+        Returns:
+            bool: True if a checkpoint was found
+        """
+        checkpoint = load_checkpoint(batch)
+        if checkpoint is None:
+            return False
+
+        self.attempt_count = checkpoint.attempt_count
+        self.completed_count = checkpoint.completed_count
+        self.consecutive_failures = checkpoint.consecutive_failures
+        self.variation_intensity = checkpoint.variation_intensity
+        self.outcomes = Counter(checkpoint.outcomes)
+        for key, stats in checkpoint.generation_stats.items():
+            self.generation_stats[key].update(stats)
+        self.valid_count = stored_valid_count(batch)
+        self.topic_distribution = stored_topic_distribution(batch)
+        logger.info(f"Resuming batch {batch.id} from attempt {self.attempt_count} with "
+                    f"{self.valid_count}/{self.number_of_valid_needed} valid problems (resume {checkpoint.resume_count})")
+        return True
+
+    def running_yield(self):
+        """
+        Valid problems per finished attempt, smoothed toward `self.prior_yield`
+        while few attempts have finished. Caller must hold self._lock.
+        """
+        finished = sum(self.outcomes.values()) - self.outcomes['cancelled']
+        return (self.valid_count + self.prior_yield * PRIOR_WEIGHT) / (finished + PRIOR_WEIGHT)
+
+    def planned_in_flight(self):
+        """
+        Number of attempts to keep in flight. Caller must hold self._lock.
+
+        Without planning this is the fixed `self.concurrency`. With planning it
+        is the remaining quota divided by the running yield, times the
+        over-provisioning factor, so one wave of attempts is expected to fill
+        the quota; the wave is capped by `self.max_concurrency` and, through
+        the attempt budget, by the cost cap.
+        """
+        if not self.planning:
+            return self.concurrency
+        remaining = self.number_of_valid_needed - self.valid_count
+        if remaining <= 0:
+            return 0
+        expected_yield = max(MIN_YIELD, self.running_yield())
+        planned = min(self.max_concurrency, math.ceil(remaining * self.overprovision / expected_yield))
+        if planned != self._planned:
+            logger.info(f"Planning {planned} attempts in flight for {remaining} remaining "
+                        f"(running yield {expected_yield:.1%})")
+            self._planned = planned
+        return planned
+
+    def _submit_attempt(self, executor, pipeline, taxonomy_file, batch):
+        """Pick a topic and start one attempt. Caller must hold self._lock."""
+        self.attempt_count += 1
+        
+        # Break if too many consecutive failures
+        if self.consecutive_failures > 20:
+            logger.warning("Too many consecutive failures, adjusting strategy")
+            self.variation_intensity *= 1.5
+            self.consecutive_failures = 0
+        
+        # Smart topic selection for diversity
+        subject, topic = self.select_diverse_topic(
+            taxonomy_file, self.topic_distribution, self.number_of_valid_needed
+        )
+        self.generation_stats[f"{subject}|{topic}"]['attempts'] += 1
+        return executor.submit(self._run_attempt, self.attempt_count, subject, topic, pipeline, batch)
+
+    def _pick_topic(self, taxonomy_file):
+        """Pick a topic for an extra problem of a multi-problem generator call."""
+        with self._lock:
+            return self.select_diverse_topic(taxonomy_file, self.topic_distribution, self.number_of_valid_needed)
+
+    def _check_cancelled(self):
+        if self._stop.is_set():
+            raise AttemptCancelled()
+
+    def _record_failure(self):
+        with self._lock:
+            self.consecutive_failures += 1
+
+    def _run_attempt(self, attempt_number, subject, topic, pipeline, batch):
+        """Run one attempt on a worker thread and return its outcome."""
+        try:
+            with llm_context(batch_id=batch.id), attempt_trace(batch.id, attempt_number) as trace:
+                status = self._attempt(attempt_number, subject, topic, pipeline, batch)
+                trace.finish(status)
+                return status
+        except AttemptCancelled:
+            print(f"Attempt {attempt_number} cancelled: target already reached")
+            return 'cancelled'
+        except Exception as e:
+            self._record_failure()
+            logger.error(f"Error in attempt {attempt_number}: {e}")
+            return 'error'
+        finally:
+            # Worker threads hold their own database connections
+            connections.close_all()
+
+    def _attempt(self, attempt_number, subject, topic, pipeline, batch):
+        self._check_cancelled()
+        
+        # Generate problem with your existing system (or take one left over from a multi-problem call)
+        print(f"\nAttempt {attempt_number} - Generating {subject} - {topic}...")
+        subject, topic, question, answer, hints = self.problem_queue.next(subject, topic)
+        
+        # Cheap-first dedupe and validation cascade (fingerprint -> lexical -> embedding -> checker)
+        screened = screen_problem(
+            self.similarity_checker, batch, subject, topic, question, answer, hints, pipeline['checker'],
+            checkpoint=self._check_cancelled
+        )
+        embedding, similar_problems = screened.embedding, screened.similar_problems
+        
+        if screened.is_duplicate:
+            with self._lock:
+                self.consecutive_failures += 1
+                self.generation_stats[f"{subject}|{topic}"]['duplicates'] += 1
+            logger.warning(screened.reason)
+            return 'duplicate'
+        
+        if screened.rejected_by:
+            print(f"Attempt {attempt_number} - Rejection reason: {screened.reason}")
             
-            # Adaptive strategy adjustment
-            if attempt_count % 50 == 0:
-                self.adjust_generation_strategy(valid_count, attempt_count)
+            # Create discarded problem (your existing logic)
+            save_problem(
+                batch, subject, topic, question, answer, hints, 'discarded', embedding, similar_problems,
+                rejection_reason=screened.reason
+            )
+            self._record_failure()
+            return 'discarded'
+        
+        hints = screened.hints
         
-        logger.info(f"Generation completed: {valid_count}/{number_of_valid_needed} in {attempt_count} attempts")
-        return valid_count, attempt_count
+        # Test with target (your existing logic)
+        self._check_cancelled()
+        print(f"Attempt {attempt_number} - Calling target...")
+        target_result = test_with_target(question, pipeline['target'])
+        
+        # Judge the solution (your existing logic)
+        self._check_cancelled()
+        print(f"Attempt {attempt_number} - Calling judge...")
+        is_solved = judge_solution(target_result, answer, pipeline['judge'])
+        
+        # Create successful problem
+        status = 'solved' if is_solved else 'valid'
+        if status == 'valid':
+            # Only the quota check-and-increment needs the lock. A valid problem that lands
+            # after another attempt filled the quota is fully paid for, so it is kept (over quota).
+            with self._lock:
+                self.valid_count += 1
+                if self.valid_count >= self.number_of_valid_needed:
+                    self._stop.set()
+                over_quota = self.valid_count > self.number_of_valid_needed
+                print(f"Valid problem count: {self.valid_count}/{self.number_of_valid_needed}"
+                      f"{' (over quota)' if over_quota else ''}")
+
+        # Stored outside the lock so attempts write to the database in parallel
+        try:
+            save_problem(batch, subject, topic, question, answer, hints, status, embedding, similar_problems)
+        except Exception:
+            if status == 'valid':
+                with self._lock:
+                    self.valid_count -= 1
+                    if self.valid_count < self.number_of_valid_needed:
+                        self._stop.clear()
+            raise
+
+        with self._lock:
+            self.topic_distribution[f"{subject}|{topic}"] += 1
+            self.generation_stats[f"{subject}|{topic}"]['successes'] += 1
+            self.consecutive_failures = 0
+        return status
     
     def select_diverse_topic(self, taxonomy_file, current_distribution, target_count):
         """Select topic to maintain diversity"""
@@ -166,19 +347,6 @@ class SmartGenerationController:
         selected_idx = random.choices(range(len(all_combinations)), weights=weights)[0]
         return all_combinations[selected_idx]
     
-    def update_similar_problems(self, problem, similar_problems):
-        """Update similar problems' relationships (your existing logic)"""
-        for sim_id, sim_score in similar_problems.items():
-            try:
-                from ..models import Problem
-                sim_prob = Problem.objects.get(id=sim_id)
-                sim_dict = sim_prob.similar_problems or {}
-                sim_dict[str(problem.id)] = sim_score
-                sim_prob.similar_problems = sim_dict
-                sim_prob.save(update_fields=['similar_problems'])
-            except Problem.DoesNotExist:
-                continue
-    
     def adjust_generation_strategy(self, valid_count, total_attempts):
         """Adjust strategy based on success rate"""
         success_rate = valid_count / total_attempts if total_attempts > 0 else 0
@@ -0,0 +1,174 @@
+import json
+import re
+import time
+
+
+class StreamBudgetExceeded(Exception):
+    """A streamed response ran past its token or time budget before the needed fields were complete."""
+
+
+def fix_latex_escapes(raw_text):
+    """Double lone backslashes (LaTeX) so the text is valid JSON, as safe_json_parse does."""
+    return re.sub(r'(?<!\\)\\(?![\\nt"\\/bfr])', r'\\\\', raw_text)
+
+
+class IncrementalJSONObject:
+    """
+    Incremental parser for the top-level fields of a streamed JSON object.
+
+    Text is fed in chunks and scanned once. Anything before the first "{"
+    (such as a ```json fence) is skipped. Each top-level value is decoded as
+    soon as it ends, so `fields` holds every completed field while the rest
+    of the object is still streaming, and `complete` turns True at the
+    closing brace.
+    """
+
+    def __init__(self):
+        self.text = ''
+        self.fields = {}
+        self.complete = False
+        self.malformed = False
+        self._pos = 0
+        self._depth = 0
+        self._in_string = False
+        self._escape = False
+        self._expect = 'object'  # object, key, in_key, colon, value, in_value, comma
+        self._key = None
+        self._start = None
+
+    def feed(self, chunk):
+        """Consume one chunk of text and return the fields completed so far."""
+        self.text += chunk
+        text = self.text
+        for i in range(self._pos, len(text)):
+            if self.complete:
+                break
+            c = text[i]
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif c == '\\':
+                    self._escape = True
+                elif c == '"':
+                    self._in_string = False
+                    if self._depth == 1 and self._expect == 'in_key':
+                        self._key = self._decode(text[self._start:i + 1])
+                        self._expect = 'colon'
+                    elif self._depth == 1 and self._expect == 'in_value':
+                        self._finish_value(i + 1)
+                continue
+
+            if c.isspace():
+                continue
+            if self._expect == 'object':
+                if c == '{':
+                    self._depth = 1
+                    self._expect = 'key'
+                continue
+            if c == '"':
+                self._in_string = True
+                if self._depth == 1 and self._expect == 'key':
+                    self._start = i
+                    self._expect = 'in_key'
+                elif self._depth == 1 and self._expect == 'value':
+                    self._start = i
+                    self._expect = 'in_value'
+            elif c in '{[':
+                if self._depth == 1 and self._expect == 'value':
+                    self._start = i
+                    self._expect = 'in_value'
+                self._depth += 1
+            elif c in '}]':
+                if self._depth == 1:
+                    if self._expect == 'in_value':
+                        self._finish_value(i)
+                    self.complete = True
+                    self._depth = 0
+                    continue
+                self._depth -= 1
+                if self._depth == 1 and self._expect == 'in_value':
+                    self._finish_value(i + 1)
+            elif self._depth == 1:
+                if c == ':' and self._expect == 'colon':
+                    self._expect = 'value'
+                elif c == ',':
+                    if self._expect == 'in_value':
+                        self._finish_value(i)
+                    self._expect = 'key'
+                elif self._expect == 'value':
+                    # Number, true, false or null; it ends at the next "," or "}"
+                    self._start = i
+                    self._expect = 'in_value'
+        self._pos = len(text)
+        return self.fields
+
+    def _decode(self, raw):
+        try:
+            return json.loads(fix_latex_escapes(raw.strip()))
+        except ValueError:
+            self.malformed = True
+            return None
+
+    def _finish_value(self, end):
+        self.fields[self._key] = self._decode(self.text[self._start:end])
+        self._expect = 'comma'
+
+
+class StreamReader:
+    """
+    Reads a streamed JSON response and decides when to stop.
+
+    `feed` returns True once every required field is complete (or the object
+    has closed), and raises StreamBudgetExceeded when the completion passes
+    `max_tokens` (estimated at four characters per token) or the request
+    has been open for `max_seconds` before that happens.
+    """
+
+    def __init__(self, required_fields=None, max_tokens=None, max_seconds=None, started=None):
+        self.parser = IncrementalJSONObject()
+        self.required_fields = list(required_fields or [])
+        self.max_tokens = max_tokens
+        self.max_seconds = max_seconds
+        self.started = started if started is not None else time.monotonic()
+        self.stopped_early = False
+
+    @property
+    def tokens(self):
+        return len(self.parser.text) // 4
+
+    @property
+    def text(self):
+        return self.parser.text
+
+    def has_required_fields(self):
+        fields = self.parser.fields
+        return bool(self.required_fields) and all(fields.get(name) not in (None, '') for name in self.required_fields)
+
+    def feed(self, chunk):
+        if not chunk:
+            return False
+        self.parser.feed(chunk)
+        if self.parser.complete:
+            return True
+        if not self.parser.malformed and self.has_required_fields():
+            self.stopped_early = True
+            return True
+        if self.max_tokens and self.tokens > self.max_tokens:
+            raise StreamBudgetExceeded(f"Response passed {self.max_tokens} tokens before {self.missing()} arrived")
+        if self.max_seconds and time.monotonic() - self.started > self.max_seconds:
+            raise StreamBudgetExceeded(f"Response took over {self.max_seconds}s before {self.missing()} arrived")
+        return False
+
+    def missing(self):
+        missing = [name for name in self.required_fields if self.parser.fields.get(name) in (None, '')]
+        return ', '.join(missing) if missing else 'the end of the object'
+
+    def result(self):
+        """
+        The parsed response: the completed fields after an early stop, otherwise
+        the whole text parsed as JSON (raising ValueError like safe_json_parse).
+        """
+        if self.stopped_early:
+            return dict(self.parser.fields)
+        from .call_llm_clients import safe_json_parse
+        return safe_json_parse(self.text)
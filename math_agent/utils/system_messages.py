@@ -80,6 +80,26 @@ Instructions:
 - Ensure the problem requires genuine mathematical sophistication that challenges even experts in the field, but is phrased simply.
 """
 
+# Same instructions as GENERATOR_MESSAGE, so the shared prefix is reused, but
+# asking for several problems per request
+GENERATOR_BATCH_MESSAGE = GENERATOR_MESSAGE + """
+---
+### PART 5: SEVERAL PROBLEMS PER REQUEST
+---
+
+When the user asks for several problems, return one JSON object with a key "problems" mapped to a list, with one
+object per requested taxonomy entry in the order given. Each object uses exactly the format of PART 4:
+{
+  "problems": [
+    {"subject": "string", "topic": "string", "problem": "string", "answer": "string", "hints": {"0": "...", "1": "..."}},
+    ...
+  ]
+}
+
+- Every problem must be self-contained and must not share its central trick with another problem in the list.
+- Do NOT include markdown syntax (e.g., ```), code blocks, or non-JSON commentary.
+"""
+
 HINT_ONLY_MESSAGE = """
 You are an expert tutor specializing in advanced mathematical problem solving. Given a sophisticated math problem and its correct answer, your task is to generate a helpful, logically sound, step-by-step dictionary of hints that guide a student through the complex reasoning required.
 
@@ -26,7 +26,7 @@ def test_with_target(question, pipeline_config):
             {"role": "user", "content": json.dumps(input_data)}
         ]
         
-        data = call_llm(pipeline_config, messages)
+        data = call_llm(pipeline_config, messages, stage='target', required_fields=['answer'])
         
         # Extract the answer from the JSON response
         answer = data.get('answer', '')
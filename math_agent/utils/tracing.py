@@ -0,0 +1,139 @@
+import contextvars
+import logging
+import time
+from contextlib import contextmanager
+from django.conf import settings
+from .call_llm_clients import add_llm_observer
+from .events import record_attempt_event
+
+logger = logging.getLogger(__name__)
+
+_current_trace = contextvars.ContextVar('attempt_trace', default=None)
+
+
+class AttemptTrace:
+    """
+    Stage spans and outcome of one generation attempt. When the attempt ends
+    the spans are written as StageTrace rows and the outcome as a BatchEvent.
+    """
+
+    def __init__(self, batch_id, attempt):
+        self.batch_id = batch_id
+        self.attempt = attempt
+        self.problem_id = None
+        self.spans = []
+        self.status = ''
+        self.reason = ''
+        self.rejected_by = ''
+
+    def finish(self, status, reason=None):
+        """Set the attempt's outcome ('duplicate', 'discarded', 'solved', 'valid', 'cancelled' or 'error')."""
+        self.status = status
+        if reason:
+            self.reason = reason
+
+    @property
+    def stage_reached(self):
+        """The cascade stage that rejected the attempt, or the last pipeline stage it ran."""
+        if self.rejected_by:
+            return self.rejected_by
+        stages = [span['stage'] for span in self.spans if span['stage'] != 'db_write']
+        return stages[-1] if stages else ''
+
+    def record(self, stage, elapsed, provider='', model='', prompt_tokens=None, completion_tokens=None,
+               retries=0, outcome='ok'):
+        self.spans.append({
+            'stage': stage,
+            'elapsed_ms': elapsed * 1000,
+            'provider': provider or '',
+            'model': model or '',
+            'prompt_tokens': prompt_tokens,
+            'completion_tokens': completion_tokens,
+            'retries': retries or 0,
+            'outcome': outcome
+        })
+
+    def save(self):
+        from ..models import StageTrace
+
+        if not self.spans:
+            return
+        StageTrace.objects.bulk_create([
+            StageTrace(batch_id=self.batch_id, problem_id=self.problem_id, attempt=self.attempt, **span)
+            for span in self.spans
+        ])
+
+
+def current_trace():
+    """The AttemptTrace of the attempt running in this context, or None."""
+    return _current_trace.get()
+
+
+def note_rejection(stage, reason):
+    """Record on the current attempt which cascade stage rejected it and why."""
+    trace = _current_trace.get()
+    if trace is not None:
+        trace.rejected_by = stage
+        trace.reason = reason
+
+
+@contextmanager
+def attempt_trace(batch_id, attempt):
+    """
+    Trace the stages of one generation attempt and publish its outcome as a BatchEvent.
+
+    Callers report the outcome with trace.finish(status). An exception leaving
+    the block finishes the attempt as its `attempt_status` attribute, or as
+    'error'. Stage spans are only saved when settings.STAGE_TRACING is on.
+
+    Like llm_context, the trace lives in a context variable, so it must be
+    entered on the thread that runs the attempt.
+    """
+    trace = AttemptTrace(batch_id, attempt)
+    token = _current_trace.set(trace)
+    try:
+        yield trace
+    except Exception as e:
+        status = getattr(e, 'attempt_status', 'error')
+        trace.finish(status, str(e) if status == 'error' else None)
+        raise
+    finally:
+        _current_trace.reset(token)
+        if getattr(settings, 'STAGE_TRACING', True):
+            try:
+                trace.save()
+            except Exception as e:
+                # Tracing must never fail an attempt
+                logger.warning(f"Could not save stage traces for attempt {attempt}: {e}")
+        record_attempt_event(trace)
+
+
+@contextmanager
+def trace_span(stage):
+    """Time a non-LLM stage (similarity search, db_write) of the current attempt, if one is traced."""
+    trace = _current_trace.get()
+    if trace is None:
+        yield
+        return
+
+    started = time.perf_counter()
+    outcome = 'error'
+    try:
+        yield
+        outcome = 'ok'
+    finally:
+        trace.record(stage, time.perf_counter() - started, outcome=outcome)
+
+
+def record_llm_span(stage, provider, model, elapsed, cached, error, prompt_tokens=None, completion_tokens=None,
+                    retries=0, **kwargs):
+    """LLM observer adding every call_llm / embedding request to the current attempt's trace."""
+    trace = _current_trace.get()
+    if trace is None:
+        return
+    outcome = 'error' if error is not None else 'cached' if cached else 'ok'
+    trace.record(stage or provider, elapsed, provider=provider, model=model, prompt_tokens=prompt_tokens,
+                 completion_tokens=completion_tokens, retries=retries, outcome=outcome)
+
+
+add_llm_observer(record_llm_span)
@@ -0,0 +1,179 @@
+import sys
+import threading
+import logging
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+
+class VectorIndex:
+    """
+    In-memory index of problem embeddings.
+
+    Embeddings are stored L2-normalized in one contiguous float32 matrix so a
+    query is a single matrix-vector product instead of a Python loop over rows.
+    Rows are keyed by problem id and the index can be extended or shrunk one
+    problem at a time.
+    """
+
+    INITIAL_CAPACITY = 1024
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._matrix = None
+        self._ids = np.empty(0, dtype=np.int64)
+        self._positions = {}
+        self._size = 0
+        self.dimension = None
+        self.loaded = False
+
+    def __len__(self):
+        return self._size
+
+    @property
+    def nbytes(self):
+        """Approximate memory held by the index arrays and id lookup table."""
+        matrix_bytes = self._matrix.nbytes if self._matrix is not None else 0
+        return matrix_bytes + self._ids.nbytes + sys.getsizeof(self._positions)
+
+    @staticmethod
+    def normalize(embedding):
+        """Return the embedding as a unit-length float32 vector (zeros stay zeros)."""
+        vector = np.asarray(embedding, dtype=np.float32).ravel()
+        norm = np.linalg.norm(vector)
+        if norm == 0:
+            return np.zeros_like(vector)
+        return vector / norm
+
+    def load(self):
+        """(Re)build the index from every stored problem embedding."""
+        from django.db import models
+        from math_agent.models import Problem
+
+        with self._lock:
+            self._matrix = None
+            self._ids = np.empty(0, dtype=np.int64)
+            self._positions = {}
+            self._size = 0
+            self.dimension = None
+
+            rows = Problem.objects.filter(
+                models.Q(embedding_vector__isnull=False) | models.Q(problem_embedding__isnull=False)
+            ).values_list('id', 'embedding_vector', 'problem_embedding')
+            for problem_id, embedding_vector, problem_embedding in rows.iterator(chunk_size=2000):
+                self.add(problem_id, Problem.decode_embedding(embedding_vector, problem_embedding))
+
+            self.loaded = True
+            logger.info(f"Vector index loaded with {self._size} embeddings")
+
+    def _grow(self, minimum):
+        capacity = max(self.INITIAL_CAPACITY, minimum, 2 * len(self._ids))
+        matrix = np.zeros((capacity, self.dimension), dtype=np.float32)
+        ids = np.zeros(capacity, dtype=np.int64)
+        if self._size:
+            matrix[:self._size] = self._matrix[:self._size]
+            ids[:self._size] = self._ids[:self._size]
+        self._matrix = matrix
+        self._ids = ids
+
+    def add(self, problem_id, embedding):
+        """Insert or replace the embedding stored for a problem."""
+        if embedding is None:
+            return
+        vector = self.normalize(embedding)
+
+        with self._lock:
+            if self.dimension is None:
+                self.dimension = vector.shape[0]
+            if vector.shape[0] != self.dimension:
+                logger.warning(
+                    f"Skipping embedding for problem {problem_id}: dimension {vector.shape[0]} != {self.dimension}"
+                )
+                return
+
+            position = self._positions.get(problem_id)
+            if position is None:
+                if self._matrix is None or self._size >= len(self._ids):
+                    self._grow(self._size + 1)
+                position = self._size
+                self._size += 1
+                self._positions[problem_id] = position
+                self._ids[position] = problem_id
+            self._matrix[position] = vector
+
+    def remove(self, problem_id):
+        """Drop a problem from the index, moving the last row into its slot."""
+        with self._lock:
+            position = self._positions.pop(problem_id, None)
+            if position is None:
+                return
+            last = self._size - 1
+            if position != last:
+                moved_id = int(self._ids[last])
+                self._matrix[position] = self._matrix[last]
+                self._ids[position] = moved_id
+                self._positions[moved_id] = position
+            self._size = last
+
+    def search(self, embedding, threshold=None, top_k=None, exclude_ids=None):
+        """
+        Find the stored problems most similar to an embedding.
+
+        Args:
+            embedding (list): Query embedding
+            threshold (float, optional): Minimum cosine similarity to include
+            top_k (int, optional): Maximum number of results to return
+            exclude_ids (iterable, optional): Problem ids to leave out
+
+        Returns:
+            dict: {problem_id: similarity_score, ...} ordered by descending score
+        """
+        query = self.normalize(embedding)
+
+        with self._lock:
+            if not self._size:
+                return {}
+            if query.shape[0] != self.dimension:
+                raise ValueError(f"Query dimension {query.shape[0]} does not match index dimension {self.dimension}")
+
+            scores = self._matrix[:self._size] @ query
+            candidates = np.arange(self._size)
+            if threshold is not None:
+                candidates = np.flatnonzero(scores >= threshold)
+            if exclude_ids:
+                excluded = np.fromiter((int(i) for i in exclude_ids), dtype=np.int64)
+                candidates = candidates[~np.isin(self._ids[candidates], excluded)]
+            if top_k is not None and len(candidates) > top_k:
+                best = np.argpartition(-scores[candidates], top_k - 1)[:top_k]
+                candidates = candidates[best]
+
+            order = candidates[np.argsort(-scores[candidates], kind='stable')]
+            return {int(self._ids[i]): float(scores[i]) for i in order}
+
+
+_index = None
+_index_lock = threading.Lock()
+
+
+def get_vector_index():
+    """Return the process-wide vector index, loading it from the database on first use."""
+    global _index
+    if _index is None:
+        with _index_lock:
+            if _index is None:
+                index = VectorIndex()
+                index.load()
+                _index = index
+    return _index
+
+
+def peek_vector_index():
+    """Return the process-wide vector index if it has been loaded, without loading it."""
+    return _index
+
+
+def reset_vector_index():
+    """Forget the process-wide index so the next get_vector_index() reloads it (e.g. after switching databases)."""
+    global _index
+    with _index_lock:
+        _index = None
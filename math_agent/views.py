@@ -1,21 +1,69 @@
-from django.shortcuts import render, get_object_or_404
+from django.shortcuts import render, get_object_or_404, redirect
+from django.contrib import messages
 from django.views import View
 from django.views.generic import ListView, DetailView
-from django.http import JsonResponse
-from .models import Batch, Problem
-from .utils.generator import generate_problem
-from .utils.hinter import generate_hints
-from .utils.checker import check_problem
-from .utils.target import test_with_target
-from .utils.judge import judge_solution
-from .utils.smart_generator import SmartGenerationController
+from django.http import JsonResponse, StreamingHttpResponse, HttpResponse, Http404
+from django.conf import settings
+from django.urls import reverse
+from django.db.models import Q, Count, Sum, Avg
+from django.utils.dateparse import parse_datetime
+from .models import Batch, Problem, GenerationJob, GenerationCheckpoint, BatchCounter, BatchEvent, ProblemSimilarity, StageTrace
+from .utils.cascade import CASCADE_STAGES
+from .utils.events import events_after, format_sse
+from .utils.batch_runner import resume_batch
+from .utils.export import (
+    content_type_for, export_file_path, export_filename, export_stream, file_range_chunks, parse_export_filters,
+    parse_range, problem_export_queryset
+)
 from datetime import datetime
 import json
-import random
-from .utils.similarity_utils import SIMILARITY_THRESHOLD
+import os
+import time
+import numpy as np
 
 # Create your views here.
 
+class KeysetPaginationMixin:
+    """
+    Paginate a list view by (created_at, id) instead of OFFSET.
+
+    Each page is fetched with a `WHERE (created_at, id) < cursor` range scan on
+    the composite indexes, so deep pages cost the same as the first one. The
+    cursor of the next page is exposed as `next_cursor` and read back from the
+    `after` query parameter.
+    """
+    page_size = 50
+    cursor_param = 'after'
+
+    def parse_cursor(self):
+        cursor = self.request.GET.get(self.cursor_param)
+        if not cursor:
+            return None
+        created_at, _, problem_id = cursor.rpartition('_')
+        created_at = parse_datetime(created_at)
+        if created_at is None or not problem_id.isdigit():
+            return None
+        return created_at, int(problem_id)
+
+    def paginate_keyset(self, queryset):
+        cursor = self.parse_cursor()
+        if cursor:
+            created_at, problem_id = cursor
+            queryset = queryset.filter(
+                Q(created_at__lt=created_at) | Q(created_at=created_at, id__lt=problem_id)
+            )
+        rows = list(queryset.order_by('-created_at', '-id')[:self.page_size + 1])
+        page, has_next = rows[:self.page_size], len(rows) > self.page_size
+        self.next_cursor = f"{page[-1].created_at.isoformat()}_{page[-1].id}" if has_next else None
+        self.is_first_page = cursor is None
+        return page
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        context['next_cursor'] = self.next_cursor
+        context['is_first_page'] = self.is_first_page
+        return context
+
 class GenerateView(View):
     def get(self, request):
         return render(request, 'math_agent/generate.html')
@@ -35,24 +83,16 @@ class GenerateView(View):
                 number_of_valid_needed=number_of_valid_needed
             )
 
-            # Choose generation method based on batch size
-            if number_of_valid_needed > 10:  # Use smart generation for larger batches
-                print(f"Using SMART generation for {number_of_valid_needed} problems")
-                controller = SmartGenerationController()
-                valid_count, attempt_count = controller.generate_problems_intelligently(
-                    number_of_valid_needed, pipeline, taxonomy_file, batch
-                )
-            else:
-                # Use your existing method for small batches
-                print(f"Using TRADITIONAL generation for {number_of_valid_needed} problems")
-                valid_count, attempt_count = self.generate_problems_traditional(
-                    number_of_valid_needed, pipeline, taxonomy_file, batch
-                )
+            # Queue the batch; a run_generation_worker process picks it up
+            GenerationJob.objects.create(batch=batch)
 
             return JsonResponse({
                 'status': 'success',
                 'batch_id': batch.id,
-                'message': f'Successfully generated batch with {valid_count} valid problems in {attempt_count} attempts'
+                'progress_url': reverse('math_agent:batch_progress', args=[batch.id]),
+                'events_url': reverse('math_agent:batch_events', args=[batch.id]),
+                'detail_url': reverse('math_agent:batch_detail', args=[batch.id]),
+                'message': f'Queued batch for {number_of_valid_needed} valid problems'
             })
 
         except Exception as e:
@@ -61,137 +101,246 @@ class GenerateView(View):
                 'status': 'error',
                 'message': str(e)
             }, status=400)
-    
-    def generate_problems_traditional(self, number_of_valid_needed, pipeline, taxonomy_file, batch):
-        """Your existing generation method"""
-        valid_count = 0
-        attempt_count = 0
-        
-        while valid_count < number_of_valid_needed:
-            attempt_count += 1
-            print(f"\nAttempt {attempt_count}")
-            print("=" * 50)
-            
-            # Randomly select subject and topic from taxonomy
-            subject = random.choice(list(taxonomy_file.keys()))
-            topic = random.choice(taxonomy_file[subject])
-            
-            # Create taxonomy dict for generator
-            taxonomy = {
-                "subject": subject,
-                "topic": topic
-            }
-            
-            # Generate problem (now includes hints, embedding, similar_problems)
-            print(f"Calling generator for {subject} - {topic}...")
-            question, answer, hints, embedding, similar_problems = generate_problem(pipeline['generator'], taxonomy=taxonomy)
-            print(f"Generator result:\nQuestion: {question}\nAnswer: {answer}\nHints: {json.dumps(hints, indent=2)}\nSimilar: {similar_problems}")
-            
-            # Check problem validity
-            print("\nCalling checker...")
-            is_valid, rejection_reason, corrected_hints = check_problem(question, answer, hints, pipeline['checker'])
-            print(f"Checker result: {'Valid' if is_valid else 'Invalid'}")
-            
-            if not is_valid:
-                print(f"Rejection reason: {rejection_reason}")
-                # Create discarded problem
-                problem = Problem.objects.create(
-                    subject=subject,
-                    topic=topic,
-                    question=question,
-                    answer=answer,
-                    hints=hints,
-                    rejection_reason=rejection_reason,
-                    status='discarded',
-                    batch=batch,
-                    problem_embedding=embedding,
-                    similar_problems=similar_problems
-                )
-                # Update similar problems' similar_problems field
-                for sim_id, sim_score in similar_problems.items():
-                    try:
-                        sim_prob = Problem.objects.get(id=sim_id)
-                        sim_dict = sim_prob.similar_problems or {}
-                        sim_dict[str(problem.id)] = sim_score
-                        sim_prob.similar_problems = sim_dict
-                        sim_prob.save(update_fields=['similar_problems'])
-                    except Problem.DoesNotExist:
-                        continue
+
+def cascade_rejections(batch_id):
+    """[(stage, rejected_count)] in cascade order, or [] if the batch never ran the cascade."""
+    counters = BatchCounter.grouped(batch_id, 'cascade')
+    if not counters:
+        return []
+    return [(stage, counters.get(stage, {}).get('rejected', 0)) for stage in CASCADE_STAGES]
+
+def judge_decisions(batch_id):
+    """Answers judged locally vs by the judge LLM, with the share that skipped the LLM, or None if none were judged."""
+    counters = BatchCounter.grouped(batch_id, 'judge')
+    if not counters:
+        return None
+    local = counters.get('local', {})
+    decisions = {
+        'local_equal': local.get('equal', 0),
+        'local_different': local.get('different', 0),
+        'llm_calls': counters.get('llm', {}).get('called', 0)
+    }
+    skipped = decisions['local_equal'] + decisions['local_different']
+    total = skipped + decisions['llm_calls']
+    decisions['skip_rate'] = round(100 * skipped / total, 1) if total else 0.0
+    return decisions
+
+class BatchProgressView(View):
+    def get(self, request, pk):
+        batch = get_object_or_404(Batch.objects.select_related('job'), pk=pk)
+        stats = batch.stats
+        job = getattr(batch, 'job', None)
+        return JsonResponse({
+            'batch_id': batch.id,
+            'status': job.status if job else 'completed',
+            'number_of_valid_needed': batch.number_of_valid_needed,
+            'attempts': job.attempt_count if job else None,
+            'error': job.error if job else None,
+            'llm_cache': BatchCounter.grouped(batch.id, 'llm_cache'),
+            'llm_stream': BatchCounter.grouped(batch.id, 'llm_stream'),
+            'cascade_rejections': dict(cascade_rejections(batch.id)),
+            'judge': judge_decisions(batch.id),
+            **stats
+        })
+
+class BatchEventStreamView(View):
+    """
+    Stream a batch's BatchEvent log as server-sent events.
+
+    New events are read with an index range scan past the last id sent, so
+    every poll is cheap however long the log grows. A reconnecting EventSource
+    sends Last-Event-ID and resumes where it stopped; `?after=<id>` does the
+    same for other clients. The stream ends once the log is drained and its
+    last event is completed/failed, or right after the replay if the batch is
+    not running.
+
+    Each response is a short window: a WSGI worker is only held for
+    BATCH_EVENT_STREAM_TIMEOUT seconds, after which the browser reconnects
+    within BATCH_EVENT_RECONNECT_MS and picks up from Last-Event-ID, so open
+    tabs never pin workers for the length of a batch.
+    """
+
+    def get(self, request, pk):
+        batch = get_object_or_404(Batch.objects.select_related('job'), pk=pk)
+        last_id = request.headers.get('Last-Event-ID') or request.GET.get('after') or '0'
+        last_id = int(last_id) if last_id.isdigit() else 0
+        job = getattr(batch, 'job', None)
+        running = job is not None and job.status in ('queued', 'running')
+
+        response = StreamingHttpResponse(self.stream(batch.id, last_id, running), content_type='text/event-stream')
+        response['Cache-Control'] = 'no-cache'
+        response['X-Accel-Buffering'] = 'no'  # Keep nginx from buffering the stream
+        return response
+
+    def stream(self, batch_id, last_id, running):
+        poll_interval = getattr(settings, 'BATCH_EVENT_POLL_INTERVAL', 0.5)
+        deadline = time.monotonic() + getattr(settings, 'BATCH_EVENT_STREAM_TIMEOUT', 20)
+        yield f"retry: {getattr(settings, 'BATCH_EVENT_RECONNECT_MS', 1000)}\n\n"
+        finished = False
+        while True:
+            events = events_after(batch_id, last_id)
+            for event in events:
+                last_id = event.id
+                yield format_sse(event)
+                finished = event.kind in BatchEvent.TERMINAL_KINDS
+            if events:
                 continue
-            
-            # Use corrected hints if provided
-            if corrected_hints:
-                print("Using corrected hints from checker")
-                hints = corrected_hints
-
-            # Test with target
-            print("\nCalling target...")
-            target_result = test_with_target(question, pipeline['target'])
-            print(f"Target result:\n{target_result}")
-            
-            # Judge the solution
-            print("\nCalling judge...")
-            is_solved = judge_solution(target_result, answer, pipeline['judge'])
-            print(f"Judge result: {'Solved' if is_solved else 'Not Solved'}")
-            
-            # Create problem with appropriate status
-            status = 'solved' if is_solved else 'valid'
-            problem = Problem.objects.create(
-                subject=subject,
-                topic=topic,
-                question=question,
-                answer=answer,
-                hints=hints,
-                status=status,
-                batch=batch,
-                problem_embedding=embedding,
-                similar_problems=similar_problems
+            if not running or time.monotonic() > deadline:
+                return
+            # A resumed batch logs a new run after its earlier terminal event, so only
+            # stop on one once the job is no longer queued or running
+            if finished and not GenerationJob.objects.filter(batch_id=batch_id, status__in=('queued', 'running')).exists():
+                return
+            yield ": keepalive\n\n"
+            time.sleep(poll_interval)
+
+class ResumeBatchView(View):
+    """Requeue an interrupted batch; the worker continues it from its GenerationCheckpoint."""
+
+    def post(self, request, pk):
+        batch = get_object_or_404(Batch, pk=pk)
+        try:
+            job = resume_batch(batch, force=request.POST.get('force') == '1')
+            messages.success(request, f"Batch queued to resume (job {job.id}).")
+        except Exception as e:
+            messages.error(request, str(e))
+        return redirect('math_agent:batch_detail', pk=batch.id)
+
+class ProblemExportView(View):
+    """
+    Stream problems as NDJSON (optionally gzip/zstd) or Parquet.
+
+    Query parameters: format, compression, batch, status, subject,
+    created_after, created_before, after_id and embeddings=1. Rows come in id
+    order, so an interrupted download resumes with after_id set to the last
+    id received. Use the export_problems command plus ExportFileView for
+    byte-range downloads of very large exports.
+    """
+
+    def get(self, request):
+        try:
+            export_format = request.GET.get('format', 'ndjson')
+            compression = request.GET.get('compression', '') if export_format == 'ndjson' else ''
+            queryset = problem_export_queryset(**parse_export_filters(request.GET))
+            chunks = export_stream(
+                queryset, export_format, compression, embeddings=request.GET.get('embeddings') == '1'
             )
-            # Update similar problems' similar_problems field
-            for sim_id, sim_score in similar_problems.items():
-                try:
-                    sim_prob = Problem.objects.get(id=sim_id)
-                    sim_dict = sim_prob.similar_problems or {}
-                    sim_dict[str(problem.id)] = sim_score
-                    sim_prob.similar_problems = sim_dict
-                    sim_prob.save(update_fields=['similar_problems'])
-                except Problem.DoesNotExist:
-                    continue
-            
-            if status == 'valid':
-                valid_count += 1
-                print(f"\nValid problem count: {valid_count}/{number_of_valid_needed}")
-        
-        return valid_count, attempt_count
+        except Exception as e:
+            return JsonResponse({'status': 'error', 'message': str(e)}, status=400)
+
+        name = export_filename(export_format, compression)
+        response = StreamingHttpResponse(chunks, content_type=content_type_for(name))
+        response['Content-Disposition'] = f'attachment; filename="{name}"'
+        response['X-Accel-Buffering'] = 'no'
+        return response
+
+class ExportFileView(View):
+    """Serve a file written by export_problems from EXPORT_ROOT, honouring single byte ranges."""
+
+    def get(self, request, name):
+        path = export_file_path(name)
+        if path is None:
+            raise Http404("No such export")
+        stat = os.stat(path)
+        size = stat.st_size
+        etag = f'"{size:x}-{stat.st_mtime_ns:x}"'
+
+        byte_range = None
+        range_header = request.headers.get('Range')
+        if_range = request.headers.get('If-Range')
+        if range_header and (if_range is None or if_range == etag):
+            try:
+                byte_range = parse_range(range_header, size)
+            except ValueError:
+                response = HttpResponse(status=416)
+                response['Content-Range'] = f'bytes */{size}'
+                return response
+
+        start, end = byte_range or (0, size - 1)
+        response = StreamingHttpResponse(
+            file_range_chunks(path, start, end) if size else iter(()), content_type=content_type_for(name),
+            status=206 if byte_range else 200
+        )
+        if byte_range:
+            response['Content-Range'] = f'bytes {start}-{end}/{size}'
+        response['Content-Length'] = str(end - start + 1 if size else 0)
+        response['Accept-Ranges'] = 'bytes'
+        response['ETag'] = etag
+        response['Content-Disposition'] = f'attachment; filename="{name}"'
+        return response
 
 class BatchListView(ListView):
     model = Batch
     template_name = 'math_agent/batches.html'
     context_object_name = 'batches'
-    ordering = ['-created_at']
+    ordering = ['-created_at']  # batch.stats reads denormalized counters, so no per-batch queries
+
+class BatchDetailView(DetailView):
+    model = Batch
+    template_name = 'math_agent/batch_detail.html'
+    context_object_name = 'batch'
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-        for batch in context['batches']:
-            batch.stats = {
-                'discarded': batch.problems.filter(status='discarded').count(),
-                'solved': batch.problems.filter(status='solved').count(),
-                'valid': batch.problems.filter(status='valid').count()
-            }
+        context['stats'] = self.object.problems.aggregate(**Batch.status_counts())
+        context['cache_stats'] = BatchCounter.grouped(self.object.id, 'llm_cache')
+        context['cascade_stats'] = cascade_rejections(self.object.id)
+        context['judge_stats'] = judge_decisions(self.object.id)
+        context['checkpoint'] = GenerationCheckpoint.objects.filter(batch=self.object).first()
+        job = getattr(self.object, 'job', None)
+        context['can_resume'] = (
+            not self.object.is_import
+            and context['stats']['valid'] < self.object.number_of_valid_needed
+            and (job is None or job.status != 'queued')
+        )
         return context
 
-class BatchDetailView(DetailView):
+class BatchPerformanceView(DetailView):
     model = Batch
-    template_name = 'math_agent/batch_detail.html'
+    template_name = 'math_agent/batch_performance.html'
     context_object_name = 'batch'
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-        context['stats'] = {
-            'discarded': self.object.problems.filter(status='discarded').count(),
-            'solved': self.object.problems.filter(status='solved').count(),
-            'valid': self.object.problems.filter(status='valid').count()
-        }
+        traces = StageTrace.objects.filter(batch=self.object)
+
+        stages = list(
+            traces.values('stage', 'provider', 'model').annotate(
+                calls=Count('id'),
+                total_ms=Sum('elapsed_ms'),
+                avg_ms=Avg('elapsed_ms'),
+                prompt_tokens=Sum('prompt_tokens'),
+                completion_tokens=Sum('completion_tokens'),
+                retries=Sum('retries'),
+                errors=Count('id', filter=Q(outcome='error')),
+                cached=Count('id', filter=Q(outcome='cached'))
+            ).order_by('-total_ms')
+        )
+        # Percentiles are not portable SQL aggregates, so compute them from the raw timings
+        timings = {}
+        for stage, provider, model, elapsed_ms in traces.values_list('stage', 'provider', 'model', 'elapsed_ms'):
+            timings.setdefault((stage, provider, model), []).append(elapsed_ms)
+        total_ms = sum(row['total_ms'] for row in stages) or 1
+        for row in stages:
+            values = timings[(row['stage'], row['provider'], row['model'])]
+            row['p50_ms'] = float(np.percentile(values, 50))
+            row['p95_ms'] = float(np.percentile(values, 95))
+            row['share'] = 100 * row['total_ms'] / total_ms
+
+        context['stages'] = stages
+        context['totals'] = traces.aggregate(
+            attempts=Count('attempt', distinct=True),
+            total_ms=Sum('elapsed_ms'),
+            prompt_tokens=Sum('prompt_tokens'),
+            completion_tokens=Sum('completion_tokens'),
+            retries=Sum('retries')
+        )
+        context['outcomes'] = traces.values('problem__status').annotate(
+            attempts=Count('attempt', distinct=True),
+            total_ms=Sum('elapsed_ms'),
+            prompt_tokens=Sum('prompt_tokens'),
+            completion_tokens=Sum('completion_tokens')
+        ).order_by('-total_ms')
         return context
 
 class ProblemDetailView(DetailView):
@@ -203,19 +352,22 @@ class ProblemDetailView(DetailView):
         context = super().get_context_data(**kwargs)
         # Add batch information
         context['batch'] = self.object.batch
-        # Add similar problems queryset
-        similar_ids = list(map(int, self.object.similar_problems.keys())) if self.object.similar_problems else []
-        context['similar_problems'] = Problem.objects.filter(id__in=similar_ids) if similar_ids else []
-        context['similarity_scores'] = self.object.similar_problems if self.object.similar_problems else {}
+        # Neighbours and scores come from the similarity edge table in one join
+        context['similar_problems'] = (
+            ProblemSimilarity.objects.filter(src=self.object)
+            .select_related('dst')
+            .only('score', 'jaccard', 'dst__id', 'dst__subject', 'dst__topic')
+            .order_by('-score')
+        )
         return context
 
-class ProblemListView(ListView):
+class ProblemListView(KeysetPaginationMixin, ListView):
     model = Problem
     template_name = 'math_agent/problems.html'
     context_object_name = 'problems'
 
     def get_queryset(self):
-        queryset = Problem.objects.all()
+        queryset = Problem.objects.only('id', 'subject', 'topic', 'question', 'status', 'created_at')
         batch_id = self.kwargs.get('batch_id')
         status = self.request.GET.get('status')
 
@@ -224,7 +376,7 @@ class ProblemListView(ListView):
         if status:
             queryset = queryset.filter(status=status)
 
-        return queryset.order_by('-created_at')
+        return self.paginate_keyset(queryset)
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
@@ -232,19 +384,21 @@ class ProblemListView(ListView):
         context['status'] = self.request.GET.get('status')
         return context
 
-class AllProblemsView(ListView):
+class AllProblemsView(KeysetPaginationMixin, ListView):
     model = Problem
     template_name = 'math_agent/all_problems.html'
     context_object_name = 'problems'
 
     def get_queryset(self):
-        queryset = Problem.objects.all()
+        queryset = Problem.objects.select_related('batch').only(
+            'id', 'subject', 'topic', 'question', 'status', 'created_at', 'batch__name'
+        )
         status = self.request.GET.get('status')
         
         if status:
             queryset = queryset.filter(status=status)
             
-        return queryset.order_by('-created_at')
+        return self.paginate_keyset(queryset)
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
@@ -39,6 +39,64 @@ GOOGLE_API_KEY = os.getenv('GOOGLE_API_KEY')
 # DeepSeek Key
 DEEPSEEK_KEY = os.getenv('DEEPSEEK_KEY')
 
+# Number of generation attempts SmartGenerationController keeps in flight
+GENERATION_CONCURRENCY = int(os.getenv('GENERATION_CONCURRENCY', '8'))
+
+# Yield-aware planning: size each wave of attempts from the running valid-per-attempt
+# yield so the remaining quota is expected to fill in one wave
+GENERATION_PLANNING = os.getenv('GENERATION_PLANNING', 'False').lower() == 'true'
+GENERATION_OVERPROVISION = float(os.getenv('GENERATION_OVERPROVISION', '1.3'))  # attempts per expected valid problem
+GENERATION_MAX_CONCURRENCY = int(os.getenv('GENERATION_MAX_CONCURRENCY', '64'))
+GENERATION_PRIOR_YIELD = 0.2  # assumed yield until attempts finish
+# Cost cap: attempts a batch may spend per valid problem it needs
+GENERATION_MAX_ATTEMPTS_PER_VALID = int(os.getenv('GENERATION_MAX_ATTEMPTS_PER_VALID', '15'))
+# A running job that has not reported progress for this many seconds can be resumed (its worker died)
+GENERATION_JOB_STALE_AFTER = int(os.getenv('GENERATION_JOB_STALE_AFTER', '600'))
+
+# Per-provider (or "provider:model") request and token budgets enforced by call_llm.
+# Set them a little below the quotas of your API tier.
+LLM_RATE_LIMITS = {
+    'openai': {'rpm': 500, 'tpm': 200000},
+    'google': {'rpm': 150, 'tpm': 2000000},
+}
+LLM_MAX_RETRIES = int(os.getenv('LLM_MAX_RETRIES', '6'))
+
+# Budgets for stages streamed with "stream": true (overridable per stage as
+# "max_completion_tokens" / "max_seconds"); unset means no limit
+LLM_STREAM_MAX_COMPLETION_TOKENS = int(os.getenv('LLM_STREAM_MAX_COMPLETION_TOKENS', '0')) or None
+LLM_STREAM_MAX_SECONDS = float(os.getenv('LLM_STREAM_MAX_SECONDS', '0')) or None
+
+# Opt-in LLM response cache (enable per pipeline stage with "cache": true)
+LLM_CACHE_PATH = os.getenv('LLM_CACHE_PATH', os.path.join(BASE_DIR, 'llm_cache.sqlite3'))
+LLM_CACHE_MAX_BYTES = int(os.getenv('LLM_CACHE_MAX_BYTES', str(256 * 1024 * 1024)))
+LLM_CACHE_TTL = int(os.getenv('LLM_CACHE_TTL', str(7 * 24 * 3600)))  # seconds
+
+# Limits for packing texts into one batched embeddings request
+EMBEDDING_BATCH_MAX_INPUTS = 2048
+EMBEDDING_BATCH_MAX_TOKENS = 250000
+
+# Embedding backend used by similarity search ("mock" answers offline)
+EMBEDDING_PROVIDER = os.getenv('EMBEDDING_PROVIDER', 'openai')
+EMBEDDING_MODEL = os.getenv('EMBEDDING_MODEL', 'text-embedding-3-small')
+
+# Overrides for the offline "mock" LLM provider (see math_agent/utils/mock_provider.py)
+LLM_MOCK = {}
+
+# Record per-stage wall time, tokens and retries of every generation attempt (StageTrace)
+STAGE_TRACING = os.getenv('STAGE_TRACING', 'true').lower() == 'true'
+
+# Bulk problem export (export_problems command and /export/problems/)
+EXPORT_ROOT = os.getenv('EXPORT_ROOT', os.path.join(BASE_DIR, 'exports'))  # files served at /exports/<name>
+EXPORT_CHUNK_SIZE = 2000  # rows fetched, encoded and written at a time
+
+# Bulk corpus import (import_problems command)
+IMPORT_CHUNK_SIZE = 1000  # rows embedded and inserted per transaction
+
+# Live batch progress stream (BatchEvent log served as server-sent events)
+BATCH_EVENT_POLL_INTERVAL = 0.5  # seconds between reads of new events
+BATCH_EVENT_STREAM_TIMEOUT = 20  # seconds a stream holds a worker before closing; EventSource reconnects and resumes
+BATCH_EVENT_RECONNECT_MS = 1000  # reconnect delay sent to EventSource as the SSE retry field
+
 # Production and development hosts
 ALLOWED_HOSTS = [
     'localhost',